@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from app import config
+from app.metrics import REGISTRY
+from app.session_registry import get_session_registry
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ACTIVE = REGISTRY.gauge("voice_agent_admission_active", "Slots in use", ["stage"])
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge("voice_agent_admission_queue_depth", "Callers waiting for a slot", ["stage"])
+ADMISSION_WAIT_SECONDS = REGISTRY.summary(
+    "voice_agent_admission_wait_seconds", "Time admitted callers waited for a slot", ["stage"]
+)
+ADMISSION_TOTAL = REGISTRY.counter("voice_agent_admission", "Admission decisions", ["stage", "result"])
+
+# WebSocket close code for rejected sessions: "Try Again Later"
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class AdmissionRejected(Exception):
+    """No slot within the queue timeout, or the queue is full."""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"{stage} saturated: {reason}")
+        self.stage = stage
+        self.reason = reason
+
+
+class Limiter:
+    """At most `limit` holders; up to `max_queue` more wait, in order, for `queue_timeout_s`.
+
+    A `limit` of 0 means unlimited.
+    """
+
+    def __init__(self, stage: str, limit: int, queue_timeout_s: float, max_queue: int):
+        self.stage = stage
+        self.limit = limit
+        self.queue_timeout_s = queue_timeout_s
+        self.max_queue = max_queue
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit) if limit > 0 else None
+
+    async def acquire(self):
+        if self._semaphore is None:
+            return
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject("queue full")
+
+        started = time.perf_counter()
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.labels(stage=self.stage).set(self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self._reject(f"no slot after [{self.queue_timeout_s}]s", result="timeout")
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.labels(stage=self.stage).set(self.waiting)
+
+        ADMISSION_WAIT_SECONDS.labels(stage=self.stage).observe(time.perf_counter() - started)
+        ADMISSION_TOTAL.labels(stage=self.stage, result="admitted").inc()
+        ADMISSION_ACTIVE.labels(stage=self.stage).inc()
+
+    async def try_acquire(self) -> bool:
+        """A slot if one is free right now, without queueing behind waiting callers."""
+        if self._semaphore is None:
+            return True
+        if self._semaphore.locked():
+            return False
+        # Free, so this takes it without suspending
+        await self._semaphore.acquire()
+        ADMISSION_TOTAL.labels(stage=self.stage, result="admitted").inc()
+        ADMISSION_ACTIVE.labels(stage=self.stage).inc()
+        return True
+
+    def release(self):
+        if self._semaphore is None:
+            return
+        self._semaphore.release()
+        ADMISSION_ACTIVE.labels(stage=self.stage).dec()
+
+    def _reject(self, reason: str, result: str = "rejected"):
+        ADMISSION_TOTAL.labels(stage=self.stage, result=result).inc()
+        raise AdmissionRejected(self.stage, reason) from None
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class AdmissionController:
+    """Process-wide caps on sessions and in-flight stage calls, so a burst of callers queues
+    briefly or is turned away instead of degrading every call and tripping provider rate limits.
+
+    - `session`: open sessions, held for the whole call
+    - `stt`: upstream transcription sessions (e.g. realtime sockets), held for the whole call
+    - `llm` / `tts`: in-flight chat and speech requests, held per request
+
+    With a shared session registry, `max_sessions_total` also caps sessions across all serving
+    processes (as of their last heartbeat, so it is approximate).
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        queue_timeout_s: float = 5,
+        max_queue: int = 100,
+        max_sessions_total: int = 0,
+    ):
+        self.limiters = {stage: Limiter(stage, limit, queue_timeout_s, max_queue) for stage, limit in limits.items()}
+        self.queue_timeout_s = queue_timeout_s
+        self.max_sessions_total = max_sessions_total
+
+    def stage(self, stage: str):
+        """Context manager holding one slot of `stage`."""
+        return self.limiters[stage].slot()
+
+    async def try_acquire(self, stage: str) -> bool:
+        """One slot of `stage` if one is free right now, to be given back with `release`."""
+        return await self.limiters[stage].try_acquire()
+
+    def release(self, stage: str):
+        self.limiters[stage].release()
+
+    @asynccontextmanager
+    async def session(self):
+        """A session slot plus an STT slot, for the lifetime of the call."""
+        async with self.stage("session"):
+            await self._wait_global_capacity()
+            async with self.stage("stt"):
+                yield
+
+    async def _wait_global_capacity(self):
+        registry = get_session_registry()
+        if not self.max_sessions_total or not registry.shared:
+            return
+        deadline = time.monotonic() + self.queue_timeout_s
+        while await registry.count() >= self.max_sessions_total:
+            if time.monotonic() > deadline:
+                ADMISSION_TOTAL.labels(stage="session", result="timeout").inc()
+                raise AdmissionRejected("session", f"[{self.max_sessions_total}] sessions across workers")
+            await asyncio.sleep(0.1)
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            limits={
+                "session": config.MAX_SESSIONS,
+                "stt": config.MAX_STT_SESSIONS,
+                "llm": config.MAX_LLM_REQUESTS,
+                "tts": config.MAX_TTS_REQUESTS,
+            },
+            queue_timeout_s=config.ADMISSION_QUEUE_TIMEOUT_S,
+            max_queue=config.ADMISSION_MAX_QUEUE,
+            max_sessions_total=config.MAX_SESSIONS_TOTAL,
+        )
+    return _controller
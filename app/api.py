@@ -1,20 +1,28 @@
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.websockets import WebSocketState
 import uuid
-import asyncio
-import json
-import wave
-import io
-import aiofiles
-import os
+import time
 import logging
-from openai import AsyncOpenAI
+from contextlib import asynccontextmanager
 from pathlib import Path
-from app.realtime_transcribe_client import RealtimeTranscribeClient
-from app import OPENAI_API_KEY
-from app.voice_agent import VoiceAgentOpenAI
+from app import config
+from app.job_bus import get_job_bus
+from app.hedging import HedgedLLM, HedgedTTS
+from app.providers.local import warmup_local_engine
+from app.voice_agent import VoiceAgent
+from app.session import VoiceSession
+from app.session_options import SessionOptions
+from app.recorder import get_recorder
+from app.clients import close_openai_clients, warmup_openai_client
+from app.metrics import REGISTRY, SESSIONS_ACTIVE, render_snapshots
+from app.session_registry import get_session_registry
+from app.admission import CLOSE_TRY_AGAIN_LATER, AdmissionController, AdmissionRejected, get_admission_controller
+from app.response_cache import get_response_cache
+from app.codecs import transcoding_websocket
+from app.telephony import TELEPHONY_SAMPLE_RATE, TelephonyWebSocket
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
@@ -24,7 +32,38 @@ logger = logging.getLogger(__name__)
 
 STATIC_FOLDER = Path(__file__).parent.parent / "static"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_recorder().start()
+    # Sessions may still pick another engine, they just don't get a warm start. Stages running
+    # in worker processes are warmed up there.
+    if (config.LLM_WORKERS == 0 and config.LLM_ENGINE == "openai") or (
+        config.TTS_WORKERS == 0 and config.TTS_ENGINE == "openai"
+    ):
+        await warmup_openai_client()
+    if config.STT_WORKERS == 0:
+        if config.STT_ENGINE == "openai":
+            from app.realtime_transcribe_client import API_KEY
+            from app.transcribe_pool import get_transcribe_pool
+
+            await get_transcribe_pool(API_KEY).start()
+        else:
+            await warmup_local_engine()
+    await get_job_bus().start()
+    await get_session_registry().start()
+    yield
+    await get_session_registry().stop()
+    await get_job_bus().stop()
+    # Sessions on the openai STT engine may have created it even if it wasn't warmed up
+    from app.transcribe_pool import close_transcribe_pool
+
+    await close_transcribe_pool()
+    # Flush pending recordings
+    await get_recorder().stop()
+    await close_openai_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory=STATIC_FOLDER.as_posix()), name="static")
 
@@ -38,25 +77,6 @@ app.add_middleware(
 )
 
 
-# Convert frames to WAV format in memory
-def pcm_to_wave(data):
-    # Define parameters
-    sample_rate = 24000  # Sample rate in Hz
-    num_channels = 1  # Mono
-    sample_width = 2  # 2 bytes for 16-bit audio
-
-    wav_buffer = io.BytesIO()
-    with wave.open(wav_buffer, "wb") as wf:
-        wf.setnchannels(num_channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(sample_rate)
-        wf.writeframes(data)
-
-    # Get the WAV data
-    wav_buffer.seek(0)
-    return wav_buffer.read()
-
-
 @app.websocket("/ws/audio")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -67,105 +87,117 @@ async def websocket_endpoint(websocket: WebSocket):
     audio -> stream -> client
     """
     await websocket.accept()
+    try:
+        options = SessionOptions.from_query(websocket.query_params)
+    except ValueError as e:
+        # 1008: policy violation, i.e. bad session options
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    # The pipeline sees PCM16 24kHz whatever the client sends
+    await admit_session(transcoding_websocket(websocket, options.codec, options.codec_rate), options)
+
+
+@app.websocket("/ws/telephony")
+async def telephony_endpoint(websocket: WebSocket):
+    """Phone calls over a media stream (base64 µ-law 8kHz JSON frames), see `app.telephony`.
+
+    Session options come from the query string and the stream's custom parameters, e.g.
+    `/ws/telephony?engine=local`.
+    """
+    await websocket.accept()
+    client = TelephonyWebSocket(websocket)
+    try:
+        start = await client.wait_start()
+        options = SessionOptions.from_query({**websocket.query_params, **start.get("customParameters", {})})
+    except ConnectionError as e:
+        logger.info(f"Telephony session not started, {e}")
+        return
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    # Fixed by the media stream, transcoded by `client`
+    options.codec, options.codec_rate = "mulaw", TELEPHONY_SAMPLE_RATE
+    options.egress = client.egress_settings()
+
+    await admit_session(client, options)
+
+
+async def admit_session(websocket: WebSocket, options: SessionOptions):
+    admission = get_admission_controller()
+    try:
+        # Waits briefly for a slot when saturated
+        async with admission.session():
+            await serve_session(websocket, options, admission)
+    except AdmissionRejected as e:
+        logger.warning(f"Session rejected, {e}")
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=str(e))
+
+
+async def serve_session(websocket: WebSocket, options: SessionOptions, admission: AdmissionController):
     session_id = str(uuid.uuid4())
     session_dir = f"data/{session_id}"
-    os.makedirs(session_dir, exist_ok=True)
-
-    agent = VoiceAgentOpenAI()
-
-    transcribe_client = RealtimeTranscribeClient(api_key=OPENAI_API_KEY)
-    await transcribe_client.connect()
-
-    logger.info(f"Session[{session_id}] start")
-    
-    # TODO: Refactor, move the following pipeline to the voice agent.
-    async def receive_audio_stream_from_client(websocket, transcribe_client):
-        audio_buffer = b""
-        seq = 0
-        audio_in_filepath = os.path.join(session_dir, "{}_{}_16_24kHZ_mono.wav".format(seq, "in"))
-    
-        # TODO: use  state machine to fine control
-        while True:
-            message = await websocket.receive()
-            # logger.debug(f"message: {message}")
-
-            # TODO: Validate the message
-            if "bytes" in message:
-                audio_data = message["bytes"]
-                audio_buffer += audio_buffer
-                # Write audio to file
-                # await audio_file.write(audio_buffer)
-                # 1. SST start here, use Realtime API to transcribe the ongoing audio, like
-                logger.debug(f"SST start...")
-                
-                # TODO: Should We transfer all the incoming audio to the OpenAI realtime transcription?
-                await transcribe_client.stream_audio(audio_data)
-                continue
-
-            if "text" in message:
-                data = json.loads(message["text"])
-     
-                if data.get("event") == "end":
-                    # TODO: Check input audio
-
-                    # Save input audio to file
-                    f = await aiofiles.open(audio_in_filepath, "wb")
-                    audio_buffer = pcm_to_wave(audio_buffer)
-                    await f.write(audio_buffer)
-                    await f.close()
-
-                    logger.info(
-                        f"Save audio buffer size[{len(audio_buffer)}] and audio file to [{audio_in_filepath}]"
-                    )
-                    
-                    # Create next
-                    audio_buffer =b""
-                    seq += 1
-                    audio_in_filepath = os.path.join(session_dir, "{}_{}_16_24kHZ_mono.wav".format(seq, "in"))
-        
-    async def send_audio_stream_to_client(websocket, transcribe_client):
-    
-        seq = 0
-        audio_out_filepath = os.path.join(session_dir, "{}_{}.pcm".format(seq, "out"))
-        
-        async for transcribed_text in transcribe_client.receive_messages():
-            print("transcribed_text:", transcribed_text)
-            
-            # 2 LLM
-            logging.info(f"LLM start...")
-            response_text = await agent.call_llm_async(transcribed_text)
-            logger.info(f"llm_response_text: {response_text}")
-            
-            # 3 TTS
-            logger.info(f"TTS start...")
-            await agent.text_to_speech_streaming_websocket(
-                text=response_text, ws=websocket, output_path=audio_out_filepath
-            )
-            
-            seq += 1
-            audio_out_filepath = os.path.join(session_dir, "{}_{}.pcm".format(seq, "out"))
-
-                
-    try:       
-        # await receive_audio_stream_from_client(websocket, transcribe_client)
-        # Create background task
-        # asyncio.create_task(receive_audio_stream_from_client(websocket, transcribe_client))
-        # asyncio.create_task(send_audio_stream_to_client(websocket, transcribe_client))
-        # Run send task in foreground
-        # await send_audio_stream_to_client(websocket, transcribe_client)
-        
-        await asyncio.gather(receive_audio_stream_from_client(websocket, transcribe_client), send_audio_stream_to_client(websocket, transcribe_client))
+
+    # In-process providers, or stand-ins for the stage workers
+    job_bus = get_job_bus()
+    llm, tts = job_bus.create_llm(options.llm), job_bus.create_tts(options.tts)
+    if options.hedge:
+        # A duplicate request takes a slot of its own, see `app.hedging`
+        llm, tts = HedgedLLM(llm, admission=admission), HedgedTTS(tts, admission=admission)
+    agent = VoiceAgent(
+        llm=llm,
+        tts=tts,
+        response_cache=get_response_cache(),
+        admission=admission,
+        memory_tokens=config.CONVERSATION_MAX_TOKENS,
+    )
+
+    transcribe_client = await job_bus.create_stt_session(options.stt)
+
+    logger.info(
+        f"Session[{session_id}] start, engines stt[{options.stt}] llm[{options.llm}] tts[{options.tts}], "
+        f"codec [{options.codec}@{options.codec_rate}], hedged [{options.hedge}]"
+    )
+
+    session = VoiceSession(session_id, websocket, agent, transcribe_client, session_dir, options)
+
+    registry = get_session_registry()
+    await registry.register(
+        session_id, {"started_at": time.time(), "stt": options.stt, "llm": options.llm, "tts": options.tts}
+    )
+    SESSIONS_ACTIVE.inc()
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        logger.info("Client disconnected")
+
     except Exception as e:
         # TODO: Use customized Exception for STT, LLM, or TTS failures.
         # raise HTTPException(status_code=502, detail=f"STT error: {str(e)}")
         await websocket.close(code=1003, reason=str(e))
 
-    except WebSocketDisconnect:
-        logger.info("Client disconnected")
-
     finally:
         logger.info(f"Session[{session_id}] close")
-        await websocket.close()
+        SESSIONS_ACTIVE.dec()
+        await registry.unregister(session_id)
+        await transcribe_client.close()
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: per-stage turn latency quantiles, turn and session counts.
+
+    With several serving processes, any of them reports all of them, labelled by `worker`.
+    """
+    registry = get_session_registry()
+    if registry.shared:
+        text = render_snapshots(await registry.metrics_snapshots())
+    else:
+        text = REGISTRY.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
 
 @app.get("/items/", response_class=HTMLResponse)
@@ -0,0 +1,124 @@
+from typing import Tuple
+
+
+class SessionAudioBuffer:
+    """Append-only PCM buffer for one turn, bounded to `max_duration_s`.
+
+    Storage is a single bytearray that starts at `initial_duration_s` and doubles until it reaches
+    the maximum, after which it becomes a ring that overwrites the oldest audio. Appends are
+    amortized O(1) copies of the incoming chunk only, recent audio can be read as memoryviews
+    without copying, and a contiguous view of the whole turn is produced once, at turn end.
+    """
+
+    def __init__(
+        self,
+        max_duration_s: float = 300,
+        initial_duration_s: float = 10,
+        sample_rate: int = 24000,
+        sample_width: int = 2,
+        num_channels: int = 1,
+    ):
+        self.frame_size = sample_width * num_channels
+        self.bytes_per_ms = sample_rate * self.frame_size / 1000
+        self.max_bytes = self._align(int(max_duration_s * 1000 * self.bytes_per_ms))
+        initial_bytes = self._align(int(initial_duration_s * 1000 * self.bytes_per_ms))
+
+        self._buffer = bytearray(max(self.frame_size, min(initial_bytes, self.max_bytes)))
+        # Index of the oldest byte and number of valid bytes
+        self._start = 0
+        self._size = 0
+        # Audio overwritten once the ring is full
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def duration_ms(self) -> float:
+        return self._size / self.bytes_per_ms
+
+    def append(self, data) -> None:
+        data = memoryview(data).cast("B")
+        if not data:
+            return
+
+        if len(data) >= self.max_bytes:
+            # Only the newest max_bytes survive anyway
+            self._grow(self.max_bytes)
+            self.dropped_bytes += self._size + len(data) - self.max_bytes
+            self._buffer[:] = data[len(data) - self.max_bytes :]
+            self._start, self._size = 0, self.max_bytes
+            return
+
+        if self._size + len(data) > len(self._buffer) and len(self._buffer) < self.max_bytes:
+            self._grow(self._size + len(data))
+
+        capacity = len(self._buffer)
+        overflow = self._size + len(data) - capacity
+        if overflow > 0:
+            # Ring is full: drop the oldest audio
+            self._start = (self._start + overflow) % capacity
+            self._size -= overflow
+            self.dropped_bytes += overflow
+
+        end = (self._start + self._size) % capacity
+        first = min(len(data), capacity - end)
+        self._buffer[end : end + first] = data[:first]
+        if first < len(data):
+            self._buffer[: len(data) - first] = data[first:]
+        self._size += len(data)
+
+    def tail_views(self, ms: float) -> Tuple[memoryview, ...]:
+        """The last `ms` of audio as one or two zero-copy views (two when it wraps the ring).
+
+        Views are only valid until the next `append` or `clear`.
+        """
+        size = min(self._size, self._align(int(ms * self.bytes_per_ms)))
+        if size == 0:
+            return ()
+
+        capacity = len(self._buffer)
+        view = memoryview(self._buffer)
+        begin = (self._start + self._size - size) % capacity
+        if begin + size <= capacity:
+            return (view[begin : begin + size],)
+        return (view[begin:], view[: begin + size - capacity])
+
+    def tail(self, ms: float):
+        """The last `ms` of audio, zero-copy unless it wraps the ring."""
+        views = self.tail_views(ms)
+        if len(views) == 1:
+            return views[0]
+        return b"".join(views)
+
+    def getvalue(self) -> memoryview:
+        """A single contiguous view of the buffered audio, e.g. for `pcm_to_wave` at turn end."""
+        if self._start + self._size > len(self._buffer):
+            # Wrapped: rotate once so the audio is contiguous again
+            self._buffer[:] = self._buffer[self._start :] + self._buffer[: self._start]
+            self._start = 0
+        return memoryview(self._buffer)[self._start : self._start + self._size]
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+        self.dropped_bytes = 0
+
+    def _grow(self, min_bytes: int) -> None:
+        capacity = len(self._buffer)
+        while capacity < min_bytes:
+            capacity *= 2
+        capacity = min(self._align(capacity), self.max_bytes)
+        if capacity <= len(self._buffer):
+            return
+        # Copy into a fresh array rather than resizing in place: views handed out earlier may
+        # still be alive, and bytearray cannot be resized while exported.
+        buffer = bytearray(capacity)
+        contents = self.getvalue()
+        buffer[: self._size] = contents
+        contents.release()
+        self._buffer = buffer
+        self._start = 0
+
+    def _align(self, size: int) -> int:
+        return size - size % self.frame_size
@@ -0,0 +1,154 @@
+import io
+import math
+import wave
+from typing import Tuple, Union
+
+import numpy as np
+
+# Audio helpers over PCM16 little-endian buffers. Everything is vectorized with NumPy: buffers are
+# viewed in place (`np.frombuffer` accepts bytes, bytearray and memoryview without copying), and
+# there are no per-sample Python loops.
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Level of digital silence, for meters
+SILENCE_DBFS = -120.0
+
+
+# Convert frames to WAV format in memory
+def pcm_to_wave(data, sample_rate: int = 24000, num_channels: int = 1, sample_width: int = 2) -> bytes:
+    """Wrap raw PCM (default: 24kHz, 16-bit, mono) into a WAV container."""
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wf:
+        wf.setnchannels(num_channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(data)
+
+    # Get the WAV data
+    return wav_buffer.getvalue()
+
+
+def pcm16_view(pcm: Buffer) -> np.ndarray:
+    """Read-only int16 view of `pcm`, without copying; a trailing odd byte is ignored."""
+    return np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+
+
+def pcm16_to_float32(pcm: Buffer) -> np.ndarray:
+    """PCM16 -> float32 samples in [-1, 1)."""
+    return pcm16_view(pcm).astype(np.float32) * (1 / 32768)
+
+
+def float32_to_pcm16(samples: np.ndarray) -> bytes:
+    """float32 samples -> PCM16, clipped rather than wrapped around."""
+    scaled = np.multiply(samples, 32768, dtype=np.float32)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return np.rint(scaled, out=scaled).astype("<i2").tobytes()
+
+
+def downmix(pcm: Buffer, num_channels: int) -> bytes:
+    """Interleaved PCM16 with `num_channels` channels -> mono, the average of the channels."""
+    if num_channels == 1:
+        return bytes(pcm)
+    samples = pcm16_view(pcm)
+    frames = samples[: len(samples) - len(samples) % num_channels].reshape(-1, num_channels)
+    return (frames.sum(axis=1, dtype=np.int32) // num_channels).astype("<i2").tobytes()
+
+
+def apply_gain(pcm: Buffer, gain_db: float) -> bytes:
+    """Scale PCM16 by `gain_db`, clipping at full scale."""
+    return float32_to_pcm16(pcm16_to_float32(pcm) * np.float32(10 ** (gain_db / 20)))
+
+
+def levels(pcm: Buffer) -> Tuple[float, float]:
+    """(RMS, peak) of PCM16 in dBFS, `SILENCE_DBFS` for an empty or silent buffer."""
+    samples = pcm16_view(pcm)
+    if not len(samples):
+        return SILENCE_DBFS, SILENCE_DBFS
+    # int64 sum of squares: exact, and no float copy of the buffer
+    square_sum = int(np.dot(samples.astype(np.int64), samples))
+    rms = math.sqrt(square_sum / len(samples)) / 32768
+    peak = max(int(samples.max()), -int(samples.min())) / 32768
+    return _dbfs(rms), _dbfs(peak)
+
+
+def _dbfs(value: float) -> float:
+    return 20 * math.log10(value) if value > 0 else SILENCE_DBFS
+
+
+class Resampler:
+    """Streaming polyphase resampler for mono PCM16, between any two integer rates.
+
+    A Kaiser-windowed sinc low-pass, `taps` samples long at the lower of the two rates, both
+    interpolates and, when downsampling, removes what would alias. `process` takes consecutive
+    chunks of one stream: the filter history and the output phase carry over, so chunk
+    boundaries don't click. Adds `taps / 2` samples of delay at the lower rate, 1ms at 8kHz.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int, taps: int = 16):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        divisor = math.gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        # Per phase, i.e. input samples per output sample
+        self.taps = -(-taps * max(self.up, self.down) // self.up)
+
+        # Designed at the upsampled rate; cutoff at the lower Nyquist frequency, a little under
+        length = self.taps * self.up
+        cutoff = 0.5 / max(self.up, self.down) * 0.95
+        t = np.arange(length) - (length - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(length, 8.0)
+        # Zero-stuffing divides the level by `up`
+        h *= self.up / h.sum()
+        # phases[p] is applied, as a dot product, to the `taps` input samples ending at the
+        # current one: coefficients h[p], h[p + up], ... in reverse
+        self.phases = np.ascontiguousarray(h.reshape(self.taps, self.up).T[:, ::-1], dtype=np.float32)
+
+        self.reset()
+
+    def reset(self):
+        """Start a new stream, e.g. after the current one was cut off."""
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        # Position of the next output sample at the upsampled rate, from the next chunk's start
+        self._position = 0
+
+    def process(self, pcm: Buffer) -> bytes:
+        if self.up == self.down:
+            return bytes(pcm)
+        samples = pcm16_to_float32(pcm)
+        if not len(samples):
+            return b""
+        extended = np.concatenate((self._history, samples))
+
+        end = len(samples) * self.up
+        positions = np.arange(self._position, end, self.down)
+        self._position = (positions[-1] + self.down - end) if len(positions) else self._position - end
+        # A copy, so the chunk itself isn't kept alive
+        self._history = extended[len(extended) - (self.taps - 1) :].copy()
+        if not len(positions):
+            return b""
+
+        # Window i ends at input sample i: `extended` is offset by the history
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.taps)
+        if self.up > len(positions) // 8:
+            # Many phases (e.g. 44.1kHz -> 24kHz has 80): gather each output's window and phase
+            return float32_to_pcm16(
+                np.einsum("ij,ij->i", windows[positions // self.up], self.phases[positions % self.up])
+            )
+        output = np.empty(len(positions), dtype=np.float32)
+        # Every `up`-th output has the same phase and its window `down` inputs further on, so
+        # each phase is one matrix-vector product over a strided view, without gathering copies
+        for first in range(self.up):
+            start = positions[first] // self.up
+            count = len(output[first :: self.up])
+            rows = windows[start : start + (count - 1) * self.down + 1 : self.down]
+            output[first :: self.up] = rows @ self.phases[positions[first] % self.up]
+        return float32_to_pcm16(output)
+
+
+def resample(pcm: Buffer, from_rate: int, to_rate: int) -> bytes:
+    """Resample a whole mono PCM16 buffer, see `Resampler` for streams."""
+    if from_rate == to_rate or not pcm:
+        return bytes(pcm)
+    return Resampler(from_rate, to_rate).process(pcm)
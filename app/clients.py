@@ -0,0 +1,70 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+# One client, and so one connection pool, per (api_key, base_url)
+_clients: Dict[Tuple[Optional[str], Optional[str]], AsyncOpenAI] = {}
+
+
+def _use_http2() -> bool:
+    if config.OPENAI_HTTP2 == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return config.OPENAI_HTTP2 == "1"
+
+
+def get_openai_client(api_key: str = None, base_url: str = None) -> AsyncOpenAI:
+    """The process-wide `AsyncOpenAI` client, shared by every session.
+
+    Sessions reuse its pooled keep-alive connections instead of paying a TCP+TLS handshake
+    on each chat and speech request.
+    """
+    key = (api_key, base_url)
+    if key not in _clients:
+        http2 = _use_http2()
+        http_client = DefaultAsyncHttpxClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.OPENAI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+        logger.info(f"Created shared OpenAI client, http2[{http2}]")
+    return _clients[key]
+
+
+async def warmup_openai_client(client: AsyncOpenAI = None, connections: int = None):
+    """Open pooled connections ahead of the first caller.
+
+    A cheap authenticated request (`models.list`) is enough to complete DNS, TCP and TLS; the
+    connections then stay in the pool for `OPENAI_KEEPALIVE_EXPIRY` seconds.
+    """
+    client = client or get_openai_client()
+    connections = config.OPENAI_WARMUP_CONNECTIONS if connections is None else connections
+    if connections <= 0:
+        return
+
+    # Same connection pool, but fail fast rather than hold up startup
+    probe = client.with_options(max_retries=0, timeout=10)
+    results = await asyncio.gather(*(probe.models.list() for _ in range(connections)), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        # Not fatal, sessions will just connect on demand
+        logger.warning(f"OpenAI client warmup failed: {errors[0]!r}")
+    else:
+        logger.info(f"Warmed up [{connections}] OpenAI connections")
+
+
+async def close_openai_clients():
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
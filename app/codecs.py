@@ -0,0 +1,209 @@
+import importlib.util
+import json
+import logging
+from typing import List
+
+import numpy as np
+
+from app import config
+from app.audio_utils import Resampler
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# The pipeline works in PCM16 24kHz mono. Clients may use a compressed codec on `/ws/audio`
+# instead, chosen at session start (`?codec=mulaw&codec_rate=8000`), and `TranscodingWebSocket`
+# converts at the edge. Per direction, 24kHz PCM is 48KB/s; G.711 at 8kHz is 8KB/s and Opus at
+# the default bitrate 3KB/s.
+
+PIPELINE_SAMPLE_RATE = 24000
+CODEC_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+AUDIO_WIRE_BYTES = REGISTRY.counter(
+    "voice_agent_audio_wire_bytes", "Client audio bytes on the wire by direction and codec", ["direction", "codec"]
+)
+
+
+def _g711_tables():
+    """Encode tables indexed by the uint16 view of an int16 sample, and decode tables per byte."""
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+
+    # µ-law (G.711), from the 14-bit value with a bias of 0x21
+    value = pcm >> 2
+    mask = np.where(value >= 0, 0xFF, 0x7F)
+    magnitude = np.minimum(np.where(value >= 0, value, -value), 8159) + 0x21
+    segment = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), magnitude)
+    ulaw = np.where(segment >= 8, 0x7F, (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)) ^ mask
+
+    # A-law (G.711), from the 13-bit value
+    value = pcm >> 3
+    mask = np.where(value >= 0, 0xD5, 0x55)
+    value = np.where(value >= 0, value, -value - 1)
+    segment = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), value)
+    shift = np.where(segment < 2, 1, segment)
+    alaw = np.where(segment >= 8, 0x7F, (np.minimum(segment, 7) << 4) | ((value >> np.minimum(shift, 7)) & 0x0F))
+    alaw = (alaw ^ mask) & 0xFF
+
+    # Reorder from -32768.. to the uint16 view, i.e. 0..32767 then -32768..-1
+    ulaw_encode = np.roll(ulaw.astype(np.uint8), -32768)
+    alaw_encode = np.roll(alaw.astype(np.uint8), -32768)
+
+    code = np.arange(256, dtype=np.int32)
+    u = ~code & 0xFF
+    ulaw_magnitude = ((((u & 0x0F) << 3) + 0x84) << ((u >> 4) & 0x07)) - 0x84
+    ulaw_decode = np.where(u & 0x80, -ulaw_magnitude, ulaw_magnitude).astype("<i2")
+
+    a = code ^ 0x55
+    segment = (a & 0x70) >> 4
+    t = ((a & 0x0F) << 4) + np.where(segment == 0, 8, 0x108)
+    t = np.where(segment > 1, t << np.maximum(segment - 1, 0), t)
+    alaw_decode = np.where(a & 0x80, t, -t).astype("<i2")
+
+    return ulaw_encode, ulaw_decode, alaw_encode, alaw_decode
+
+
+ULAW_ENCODE, ULAW_DECODE, ALAW_ENCODE, ALAW_DECODE = _g711_tables()
+
+
+class PCMCodec:
+    """PCM16 little-endian, as is."""
+
+    name = "pcm"
+
+    def __init__(self, sample_rate: int = PIPELINE_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+
+    def encode(self, pcm: bytes) -> List[bytes]:
+        """PCM16 at `sample_rate` -> wire messages."""
+        return [pcm] if pcm else []
+
+    def decode(self, data: bytes) -> bytes:
+        """One wire message -> PCM16 at `sample_rate`."""
+        return data
+
+    def reset_encoder(self):
+        """Drop outbound audio not yet encoded, when the client clears its playback."""
+
+
+class G711Codec(PCMCodec):
+    """One byte per sample through 64K/256-entry lookup tables."""
+
+    def __init__(self, name: str, sample_rate: int = 8000):
+        super().__init__(sample_rate)
+        self.name = name
+        if name == "mulaw":
+            self._encode, self._decode = ULAW_ENCODE, ULAW_DECODE
+        else:
+            self._encode, self._decode = ALAW_ENCODE, ALAW_DECODE
+
+    def encode(self, pcm: bytes) -> List[bytes]:
+        if not pcm:
+            return []
+        return [self._encode[np.frombuffer(pcm, dtype="<u2", count=len(pcm) // 2)].tobytes()]
+
+    def decode(self, data: bytes) -> bytes:
+        return self._decode[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+
+class OpusCodec(PCMCodec):
+    """Opus through `opuslib` (libopus), one packet per wire message.
+
+    Packets hold `frame_ms` of audio; a tail shorter than a frame waits for the next audio.
+    """
+
+    name = "opus"
+
+    def __init__(self, sample_rate: int = 24000, frame_ms: int = 20, bitrate: int = None):
+        import opuslib
+
+        super().__init__(sample_rate)
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = bitrate or config.OPUS_BITRATE
+        self.decoder = opuslib.Decoder(sample_rate, 1)
+        self._pending = bytearray()
+
+    def encode(self, pcm: bytes) -> List[bytes]:
+        self._pending += pcm
+        packets = []
+        offset = 0
+        while len(self._pending) - offset >= self.frame_bytes:
+            frame = bytes(self._pending[offset : offset + self.frame_bytes])
+            packets.append(self.encoder.encode(frame, self.frame_bytes // 2))
+            offset += self.frame_bytes
+        del self._pending[:offset]
+        return packets
+
+    def reset_encoder(self):
+        self._pending.clear()
+
+    def decode(self, data: bytes) -> bytes:
+        # Room for the longest Opus packet, 120ms
+        return self.decoder.decode(data, self.sample_rate * 120 // 1000)
+
+
+CODECS = ("pcm", "mulaw", "alaw", "opus")
+
+
+def codec_available(name: str) -> bool:
+    return name != "opus" or importlib.util.find_spec("opuslib") is not None
+
+
+def create_codec(name: str, sample_rate: int):
+    if name == "pcm":
+        return PCMCodec(sample_rate)
+    if name in ("mulaw", "alaw"):
+        return G711Codec(name, sample_rate)
+    if name == "opus":
+        return OpusCodec(sample_rate)
+    raise ValueError(f"Unknown codec [{name}]")
+
+
+class TranscodingWebSocket:
+    """A client socket whose binary messages are in `codec` on the wire and PCM16 24kHz here.
+
+    Stands in for the `WebSocket` in `VoiceSession` and `VoiceAgent`: `receive` decodes audio
+    messages, `send_bytes` encodes them, everything else goes to the socket as is. A `clear`
+    also drops the outbound audio still held by the resampler and the codec, so the tail of
+    an interrupted reply doesn't lead the next one.
+    """
+
+    def __init__(self, websocket, codec):
+        self.websocket = websocket
+        self.codec = codec
+        # One stream per direction, so the resamplers keep their state across messages
+        self._upsampler = Resampler(codec.sample_rate, PIPELINE_SAMPLE_RATE)
+        self._downsampler = Resampler(PIPELINE_SAMPLE_RATE, codec.sample_rate)
+        self._bytes_in = AUDIO_WIRE_BYTES.labels(direction="in", codec=codec.name)
+        self._bytes_out = AUDIO_WIRE_BYTES.labels(direction="out", codec=codec.name)
+
+    async def receive(self) -> dict:
+        message = await self.websocket.receive()
+        if message.get("bytes") is not None:
+            data = message["bytes"]
+            self._bytes_in.inc(len(data))
+            pcm = self._upsampler.process(self.codec.decode(data))
+            message = {**message, "bytes": pcm}
+        return message
+
+    async def send_bytes(self, data: bytes):
+        pcm = self._downsampler.process(data)
+        for packet in self.codec.encode(pcm):
+            self._bytes_out.inc(len(packet))
+            await self.websocket.send_bytes(packet)
+
+    async def send_text(self, text: str):
+        if json.loads(text).get("event") == "clear":
+            self._downsampler.reset()
+            self.codec.reset_encoder()
+        await self.websocket.send_text(text)
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+
+def transcoding_websocket(websocket, codec: str, sample_rate: int):
+    """`websocket` itself when the client speaks the pipeline's own format."""
+    if codec == "pcm" and sample_rate == PIPELINE_SAMPLE_RATE:
+        return websocket
+    return TranscodingWebSocket(websocket, create_codec(codec, sample_rate))
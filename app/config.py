@@ -0,0 +1,142 @@
+import os
+
+# Coalesce the browser's tiny mic frames (128 samples) before streaming them upstream.
+# 0 disables aggregation.
+FRAME_AGGREGATE_MS = int(os.getenv("VOICE_AGENT_FRAME_AGGREGATE_MS", "40"))
+# Upper bound on how long a partial batch may wait before it is flushed anyway
+FRAME_MAX_LATENCY_MS = int(os.getenv("VOICE_AGENT_FRAME_MAX_LATENCY_MS", "60"))
+
+# Longest turn kept in the per-session input audio buffer, older audio is overwritten
+SESSION_AUDIO_MAX_S = float(os.getenv("VOICE_AGENT_SESSION_AUDIO_MAX_S", "300"))
+
+# Session recordings (input WAV, output PCM) are written by one background task per process
+RECORDING_ENABLED = os.getenv("VOICE_AGENT_RECORDING", "1") == "1"
+RECORDER_QUEUE_SIZE = int(os.getenv("VOICE_AGENT_RECORDER_QUEUE_SIZE", "1024"))
+# "drop" never delays audio when the disk falls behind, "block" never loses recordings
+RECORDER_POLICY = os.getenv("VOICE_AGENT_RECORDER_POLICY", "drop")
+
+# Shared OpenAI HTTP connection pool
+OPENAI_MAX_CONNECTIONS = int(os.getenv("VOICE_AGENT_OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("VOICE_AGENT_OPENAI_MAX_KEEPALIVE_CONNECTIONS", "50"))
+# Seconds an idle connection is kept open; httpx closes them after 5s by default
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("VOICE_AGENT_OPENAI_KEEPALIVE_EXPIRY", "90"))
+# "auto" uses HTTP/2 when the `h2` package is installed
+OPENAI_HTTP2 = os.getenv("VOICE_AGENT_OPENAI_HTTP2", "auto")
+# Connections opened at startup so the first callers skip TCP+TLS setup
+OPENAI_WARMUP_CONNECTIONS = int(os.getenv("VOICE_AGENT_OPENAI_WARMUP_CONNECTIONS", "2"))
+
+# Pre-connected, pre-configured realtime transcription sessions kept ready for new callers.
+# 0 disables the pool.
+TRANSCRIBE_POOL_SIZE = int(os.getenv("VOICE_AGENT_TRANSCRIBE_POOL_SIZE", "2"))
+# Idle pooled sessions older than this are recycled
+TRANSCRIBE_POOL_MAX_AGE_S = float(os.getenv("VOICE_AGENT_TRANSCRIBE_POOL_MAX_AGE_S", "300"))
+TRANSCRIBE_POOL_PING_INTERVAL_S = float(os.getenv("VOICE_AGENT_TRANSCRIBE_POOL_PING_INTERVAL_S", "15"))
+# A realtime transcription socket that drops mid-call is reopened up to this many times in a row,
+# 0 ends the call instead. Attempts back off from RECONNECT_BACKOFF_MS, doubling up to the max.
+REALTIME_RECONNECT_ATTEMPTS = int(os.getenv("VOICE_AGENT_REALTIME_RECONNECT_ATTEMPTS", "5"))
+REALTIME_RECONNECT_BACKOFF_MS = float(os.getenv("VOICE_AGENT_REALTIME_RECONNECT_BACKOFF_MS", "100"))
+REALTIME_RECONNECT_MAX_BACKOFF_MS = float(os.getenv("VOICE_AGENT_REALTIME_RECONNECT_MAX_BACKOFF_MS", "2000"))
+REALTIME_CONNECT_TIMEOUT_S = float(os.getenv("VOICE_AGENT_REALTIME_CONNECT_TIMEOUT_S", "5"))
+# Audio not transcribed yet, replayed on the new socket, is bounded to this many ms (48KB/s per call)
+REALTIME_REPLAY_MAX_MS = int(os.getenv("VOICE_AGENT_REALTIME_REPLAY_MAX_MS", "10000"))
+
+# Turn-level response cache (normalized transcript -> answer text + speech), 0 disables
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("VOICE_AGENT_RESPONSE_CACHE_MAX_BYTES", str(64 * 2**20)))
+# Optional on-disk tier, e.g. "data/response_cache"
+RESPONSE_CACHE_DIR = os.getenv("VOICE_AGENT_RESPONSE_CACHE_DIR") or None
+RESPONSE_CACHE_DISK_MAX_BYTES = int(os.getenv("VOICE_AGENT_RESPONSE_CACHE_DISK_MAX_BYTES", str(2**30)))
+
+# Local VAD in front of the transcription socket: "off" (server VAD only), "gate" (server VAD,
+# long silences not sent) or "local" (local endpointing, server VAD off). Clients may override
+# per session with `?vad=`.
+LOCAL_VAD = os.getenv("VOICE_AGENT_LOCAL_VAD", "off")
+
+# Backend per stage, "openai" or "local" (in-process, CPU only). `ENGINE` sets all three; clients
+# may override per session with `?engine=` or `?stt=&llm=&tts=`.
+ENGINE = os.getenv("VOICE_AGENT_ENGINE", "openai")
+STT_ENGINE = os.getenv("VOICE_AGENT_STT_ENGINE", ENGINE)
+LLM_ENGINE = os.getenv("VOICE_AGENT_LLM_ENGINE", ENGINE)
+TTS_ENGINE = os.getenv("VOICE_AGENT_TTS_ENGINE", ENGINE)
+# Local STT: faster-whisper model, e.g. "base.en", used when the package is installed.
+# Without it every turn is transcribed as the stub text.
+LOCAL_STT_MODEL = os.getenv("VOICE_AGENT_LOCAL_STT_MODEL") or None
+LOCAL_STT_STUB_TEXT = os.getenv("VOICE_AGENT_LOCAL_STT_STUB_TEXT", "hello")
+# Local LLM stub: simulated time per token
+LOCAL_LLM_TOKEN_DELAY_MS = float(os.getenv("VOICE_AGENT_LOCAL_LLM_TOKEN_DELAY_MS", "0"))
+
+# Stage worker processes behind a local job bus; 0 runs the stage on the gateway's event loop.
+# Each stage scales on its own: e.g. 2 STT workers for the encoding-heavy realtime sockets.
+STT_WORKERS = int(os.getenv("VOICE_AGENT_STT_WORKERS", "0"))
+LLM_WORKERS = int(os.getenv("VOICE_AGENT_LLM_WORKERS", "0"))
+TTS_WORKERS = int(os.getenv("VOICE_AGENT_TTS_WORKERS", "0"))
+# Concurrent jobs per worker (for STT: sessions). Together with the worker count, the stage limit.
+STT_WORKER_CONCURRENCY = int(os.getenv("VOICE_AGENT_STT_WORKER_CONCURRENCY", "100"))
+LLM_WORKER_CONCURRENCY = int(os.getenv("VOICE_AGENT_LLM_WORKER_CONCURRENCY", "100"))
+TTS_WORKER_CONCURRENCY = int(os.getenv("VOICE_AGENT_TTS_WORKER_CONCURRENCY", "100"))
+# How long a job waits for a free worker slot before it fails
+JOB_QUEUE_TIMEOUT_S = float(os.getenv("VOICE_AGENT_JOB_QUEUE_TIMEOUT_S", "10"))
+
+# Serving processes started by `python main.py`. They share the listening socket; each WebSocket
+# session stays on the process that accepted it.
+WEB_WORKERS = int(os.getenv("VOICE_AGENT_WEB_WORKERS", "1"))
+# State shared by the serving processes (session counts, conversation state, metrics):
+# "local" (single process), "sqlite:///path" (one host) or "redis://host:port/db".
+# With several web workers it defaults to a SQLite file.
+SESSION_REGISTRY = os.getenv(
+    "VOICE_AGENT_SESSION_REGISTRY", "local" if WEB_WORKERS == 1 else "sqlite:///data/session_registry.sqlite3"
+)
+
+# Admission control, per serving process; 0 means unlimited. Callers beyond a cap queue for up
+# to ADMISSION_QUEUE_TIMEOUT_S, then sessions are closed with 1013 (try again later).
+MAX_SESSIONS = int(os.getenv("VOICE_AGENT_MAX_SESSIONS", "0"))
+# Upstream transcription sessions (realtime sockets) held open
+MAX_STT_SESSIONS = int(os.getenv("VOICE_AGENT_MAX_STT_SESSIONS", "0"))
+# In-flight chat completion and speech requests
+MAX_LLM_REQUESTS = int(os.getenv("VOICE_AGENT_MAX_LLM_REQUESTS", "0"))
+MAX_TTS_REQUESTS = int(os.getenv("VOICE_AGENT_MAX_TTS_REQUESTS", "0"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("VOICE_AGENT_ADMISSION_QUEUE_TIMEOUT_S", "5"))
+# Callers allowed to wait per cap, beyond that they are rejected at once
+ADMISSION_MAX_QUEUE = int(os.getenv("VOICE_AGENT_ADMISSION_MAX_QUEUE", "100"))
+# Sessions across all serving processes, needs a shared session registry
+MAX_SESSIONS_TOTAL = int(os.getenv("VOICE_AGENT_MAX_SESSIONS_TOTAL", "0"))
+
+# Conversation memory: earlier turns sent to the LLM, trimmed to this many tokens. 0 disables.
+CONVERSATION_MAX_TOKENS = int(os.getenv("VOICE_AGENT_CONVERSATION_MAX_TOKENS", "2000"))
+# How long a conversation can be resumed with `?conversation_id=` after its session ended
+CONVERSATION_TTL_S = float(os.getenv("VOICE_AGENT_CONVERSATION_TTL_S", "3600"))
+
+# Speculative LLM start: answer the partial transcript when speech stops (again once deltas that
+# arrive after the stop pause for SPECULATION_DEBOUNCE_MS), keep the answer if the final
+# transcript matches. Per session `?speculative=1`.
+SPECULATIVE_LLM = os.getenv("VOICE_AGENT_SPECULATIVE_LLM", "0") == "1"
+SPECULATION_DEBOUNCE_MS = float(os.getenv("VOICE_AGENT_SPECULATION_DEBOUNCE_MS", "150"))
+# Similarity (0-1) of the normalized partial and final transcripts needed to keep the answer
+SPECULATION_MIN_SIMILARITY = float(os.getenv("VOICE_AGENT_SPECULATION_MIN_SIMILARITY", "1.0"))
+
+# Hedged LLM / TTS requests (see `app.hedging`): a duplicate request is sent when the first has no
+# byte by the HEDGE_PERCENTILE of recent first byte times (HEDGE_DEFAULT_DEADLINE_MS until
+# HEDGE_MIN_SAMPLES are seen), and the slower one is cancelled. Hedges are kept under
+# HEDGE_BUDGET_RATIO of requests, in bursts of up to HEDGE_BUDGET_BURST. Per session `?hedge=1`.
+HEDGE_REQUESTS = os.getenv("VOICE_AGENT_HEDGE_REQUESTS", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("VOICE_AGENT_HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("VOICE_AGENT_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DEADLINE_MS = float(os.getenv("VOICE_AGENT_HEDGE_DEFAULT_DEADLINE_MS", "1000"))
+HEDGE_BUDGET_RATIO = float(os.getenv("VOICE_AGENT_HEDGE_BUDGET_RATIO", "0.1"))
+HEDGE_BUDGET_BURST = float(os.getenv("VOICE_AGENT_HEDGE_BUDGET_BURST", "10"))
+
+# Bitrate of the optional Opus codec on `/ws/audio` (`?codec=opus`, needs `opuslib`)
+OPUS_BITRATE = int(os.getenv("VOICE_AGENT_OPUS_BITRATE", "24000"))
+
+# `/ws/telephony` media streams (µ-law 8kHz). Inbound audio is decoded in batches of this many ms
+TELEPHONY_INBOUND_BATCH_MS = int(os.getenv("VOICE_AGENT_TELEPHONY_INBOUND_BATCH_MS", "40"))
+# Outbound media message size, and how far ahead of real time replies are sent
+TELEPHONY_FRAME_MS = int(os.getenv("VOICE_AGENT_TELEPHONY_FRAME_MS", "20"))
+TELEPHONY_PLAYOUT_LEAD_MS = int(os.getenv("VOICE_AGENT_TELEPHONY_PLAYOUT_LEAD_MS", "200"))
+
+# Reply audio to clients is paced at real time, this far ahead of playback (see `app.egress`).
+# The lead grows with the client's round trip time up to the max.
+EGRESS_LEAD_MS = float(os.getenv("VOICE_AGENT_EGRESS_LEAD_MS", "200"))
+EGRESS_MAX_LEAD_MS = float(os.getenv("VOICE_AGENT_EGRESS_MAX_LEAD_MS", "1000"))
+# Audio per message adapts to round trip time and send backpressure within this range
+EGRESS_MIN_CHUNK_MS = float(os.getenv("VOICE_AGENT_EGRESS_MIN_CHUNK_MS", "20"))
+EGRESS_MAX_CHUNK_MS = float(os.getenv("VOICE_AGENT_EGRESS_MAX_CHUNK_MS", "200"))
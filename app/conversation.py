@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token for English, close enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    # Role and framing overhead per message
+    return estimate_tokens(message["content"]) + 4
+
+
+class Conversation:
+    """The turns of one call, sent to the LLM as context within a token budget.
+
+    Messages are `[system prompt, (summary of trimmed turns), history..., user input]`. History
+    only grows at the end, so consecutive requests share their prefix and the provider's prompt
+    cache keeps first-token latency flat. When the history exceeds `max_tokens`, the oldest
+    turns are dropped down to `low_water` of the budget in one go, rather than one turn per
+    request, so the prefix stays stable until the next trim. The user side of dropped turns is
+    kept as a short extractive summary.
+
+    Replies cut short by barge-in are recorded as far as the caller heard them.
+    """
+
+    def __init__(self, system_prompt: str, max_tokens: int = 2000, low_water: float = 0.5, summary_chars: int = 600):
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.low_water = low_water
+        self.summary_chars = summary_chars
+        self.history: List[Dict[str, str]] = []
+        self.summary = ""
+        self.trims = 0
+
+    def messages(self, user_input: str) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Earlier in this call the user said: {self.summary}"})
+        return messages + self.history + [{"role": "user", "content": user_input}]
+
+    def fingerprint(self) -> str:
+        """Identifies the context a new answer depends on, e.g. for response cache keys."""
+        if not self.history and not self.summary:
+            return ""
+        payload = json.dumps([self.summary, self.history])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @property
+    def tokens(self) -> int:
+        return sum(_message_tokens(m) for m in self.history) + estimate_tokens(self.summary)
+
+    def add_turn(self, user_input: str, reply: Optional[str], interrupted: bool = False):
+        """Record a turn; `reply` is what was spoken, None or empty if nothing was."""
+        self.history.append({"role": "user", "content": user_input})
+        if reply:
+            self.history.append({"role": "assistant", "content": reply + ("..." if interrupted else "")})
+        self._trim()
+
+    def truncate_last_reply(self, heard: str):
+        """The last reply was generated in full but the caller interrupted its playback."""
+        if self.history and self.history[-1]["role"] == "assistant":
+            if heard:
+                self.history[-1] = {"role": "assistant", "content": heard + "..."}
+            else:
+                self.history.pop()
+
+    def _trim(self):
+        if self.max_tokens <= 0 or self.tokens <= self.max_tokens:
+            return
+        # Leave room for the summary to grow
+        summary_chars = min(self.summary_chars, self.max_tokens)
+        target = self.max_tokens * self.low_water - summary_chars // 4
+        history_tokens = sum(_message_tokens(m) for m in self.history)
+        dropped = []
+        # Keep whole turns: history always starts with a user message
+        while self.history and (history_tokens > target or self.history[0]["role"] != "user"):
+            message = self.history.pop(0)
+            history_tokens -= _message_tokens(message)
+            dropped.append(message)
+
+        said = [m["content"].strip() for m in dropped if m["role"] == "user"]
+        summary = "; ".join(filter(None, [self.summary, *said]))
+        if len(summary) > summary_chars:
+            # Keep the most recent part, from a whole utterance on
+            summary = summary[-summary_chars:]
+            summary = summary.split("; ", 1)[-1]
+        self.summary = summary
+        self.trims += 1
+        logger.info(f"Conversation trimmed [{len(dropped)}] messages, [{self.tokens}] tokens left")
+
+    def to_dict(self) -> dict:
+        return {"history": self.history, "summary": self.summary}
+
+    def load(self, state: dict):
+        self.history = list(state.get("history", []))
+        self.summary = state.get("summary", "")
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app import config
+from app.frame_aggregator import FrameAggregator
+from app.metrics import REGISTRY
+from app.playback import PlaybackTracker
+
+logger = logging.getLogger(__name__)
+
+EGRESS_UNDERRUNS = REGISTRY.counter("voice_agent_egress_underruns", "Reply audio that reached the client after it ran dry")
+EGRESS_UNDERRUN_SECONDS = REGISTRY.summary("voice_agent_egress_underrun_seconds", "Length of client playback gaps")
+EGRESS_BUFFERED_SECONDS = REGISTRY.summary(
+    "voice_agent_egress_buffered_seconds", "Reply audio queued at the client when a chunk is sent"
+)
+EGRESS_CHUNK_SECONDS = REGISTRY.summary("voice_agent_egress_chunk_seconds", "Reply audio per message to the client")
+EGRESS_RTT_SECONDS = REGISTRY.summary("voice_agent_egress_rtt_seconds", "Client round trip time, from ping/pong")
+
+# Weight of a new sample in the smoothed round trip and send times
+_SMOOTHING = 0.25
+
+
+@dataclass
+class EgressSettings:
+    # Reply audio is kept this far ahead of the client's playback, plus one round trip
+    lead_ms: float = field(default_factory=lambda: config.EGRESS_LEAD_MS)
+    max_lead_ms: float = field(default_factory=lambda: config.EGRESS_MAX_LEAD_MS)
+    # Audio per message: a quarter of the round trip, or 4x the time a send blocks, within range
+    min_chunk_ms: float = field(default_factory=lambda: config.EGRESS_MIN_CHUNK_MS)
+    max_chunk_ms: float = field(default_factory=lambda: config.EGRESS_MAX_CHUNK_MS)
+    # Seconds between round trip probes while audio is flowing
+    ping_interval_s: float = 2.0
+
+    @classmethod
+    def from_query(cls, params) -> "EgressSettings":
+        settings = cls()
+        for name, value in params.items():
+            if name.startswith("egress_") and hasattr(settings, name[7:]):
+                field_name = name[7:]
+                setattr(settings, field_name, type(getattr(settings, field_name))(value))
+        return settings
+
+
+class PacedWebSocket:
+    """Reply audio to the client at real time plus a lead, rather than as fast as TTS delivers.
+
+    Sending a reply in one burst piles it up in socket buffers on slow links, where a barge-in
+    can't take it back, and leaves nothing in hand when the provider stalls later. Here the
+    audio is re-chunked and each chunk waits until the client has at most `lead` queued: a
+    jitter buffer of known depth on the client side.
+
+    The lead and chunk size adapt to the client: round trip time comes from `ping`/`pong` text
+    messages (clients that don't answer keep the defaults) and backpressure from how long sends
+    block. A chunk that arrives after the client's queue ran dry mid-reply is an underrun.
+
+    Sending runs in its own task fed by a queue of up to `max_lead_ms` of audio (plus the batch
+    that crosses it), so the TTS reader keeps that far ahead of the pacer (the next sentence is
+    requested while this one plays) and `send_bytes` only blocks once it is full. The reply's
+    `PlaybackTracker` hears of audio as it is actually sent, see `begin_reply`.
+
+    Wraps the socket seen by `VoiceSession` and `VoiceAgent`, whatever its transport.
+    """
+
+    def __init__(self, websocket, settings: EgressSettings = None, sample_rate: int = 24000, sample_width: int = 2):
+        self.websocket = websocket
+        self.settings = settings or EgressSettings()
+        self.bytes_per_s = sample_rate * sample_width
+        self.sample_width = sample_width
+        self.chunk_ms = self.settings.min_chunk_ms
+        self.lead_s = self.settings.lead_ms / 1000
+        self._chunks = FrameAggregator(
+            self._enqueue,
+            target_ms=self.chunk_ms,
+            max_latency_ms=self.chunk_ms,
+            sample_rate=sample_rate,
+            sample_width=sample_width,
+        )
+        # When the audio sent so far will have played out on the client
+        self._playout_end = 0.0
+        # Whether a chunk of the current reply has been sent, gaps before it aren't underruns
+        self._replying = False
+        self.rtt_s: Optional[float] = None
+        self._send_s = 0.0
+        self._pinged_at = 0.0
+
+        # Batches waiting for the sender task; a clear bumps the generation, dropping what is left
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued_bytes = 0
+        self._queue_limit_bytes = self.bytes_per_s * self.settings.max_lead_ms / 1000
+        self._dequeued = asyncio.Condition()
+        self._playback: Optional[PlaybackTracker] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._sender_error: Optional[BaseException] = None
+        self._generation = 0
+        self._send_lock = asyncio.Lock()
+
+        self.underruns = 0
+        self.underrun_s = 0.0
+        self.chunks = 0
+        self._buffered_s_total = 0.0
+
+    def begin_reply(self, playback: PlaybackTracker = None):
+        """A new reply starts, `playback` (if any) is told of its audio as it is sent."""
+        self._replying = False
+        self._playback = playback
+
+    async def send_bytes(self, data: bytes):
+        if self._sender_error is not None:
+            # The socket failed under the sender task, fail the reply too
+            raise self._sender_error
+        await self._chunks.push(data)
+
+    async def _enqueue(self, data: bytes):
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self._run_sender())
+        async with self._dequeued:
+            # Backpressure on the TTS reader
+            await self._dequeued.wait_for(
+                lambda: self._queued_bytes < self._queue_limit_bytes or self._sender_error is not None
+            )
+        if self._sender_error is not None:
+            raise self._sender_error
+        self._queued_bytes += len(data)
+        self._queue.put_nowait((self._generation, data, self._playback))
+
+    async def _run_sender(self):
+        try:
+            while True:
+                generation, data, playback = await self._queue.get()
+                self._queued_bytes -= len(data)
+                async with self._dequeued:
+                    self._dequeued.notify_all()
+                if generation == self._generation:
+                    await self._send_chunk(data, generation, playback)
+        except Exception as e:
+            self._sender_error = e
+            logger.debug(f"Egress sender stopped: {e!r}")
+            async with self._dequeued:
+                self._dequeued.notify_all()
+
+    async def stop(self):
+        """Stop the sender task, audio still queued is dropped."""
+        if self._sender is not None:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+            self._sender = None
+
+    async def _send_chunk(self, data: bytes, generation: int, playback: Optional[PlaybackTracker]):
+        # Near-equal pieces of about `chunk_ms`, rather than full chunks and a sliver
+        pieces = max(1, round(len(data) / (self.bytes_per_s * self.chunk_ms / 1000)))
+        chunk_bytes = -(-len(data) // pieces // self.sample_width) * self.sample_width
+        for offset in range(0, len(data), chunk_bytes):
+            if generation != self._generation:
+                # Cleared by a barge-in while pacing
+                return
+            chunk = data[offset : offset + chunk_bytes]
+            now = time.perf_counter()
+            if self._playout_end < now:
+                if self._replying:
+                    self.underruns += 1
+                    self.underrun_s += now - self._playout_end
+                    EGRESS_UNDERRUNS.inc()
+                    EGRESS_UNDERRUN_SECONDS.observe(now - self._playout_end)
+                self._playout_end = now
+            elif self._playout_end - now > self.lead_s:
+                await asyncio.sleep(self._playout_end - now - self.lead_s)
+                if generation != self._generation:
+                    return
+                now = time.perf_counter()
+
+            buffered_s = self._playout_end - now
+            self._buffered_s_total += buffered_s
+            EGRESS_BUFFERED_SECONDS.observe(buffered_s)
+            EGRESS_CHUNK_SECONDS.observe(len(chunk) / self.bytes_per_s)
+            async with self._send_lock:
+                await self.websocket.send_bytes(chunk)
+            sent = time.perf_counter()
+            if playback is not None:
+                playback.on_audio_sent(len(chunk))
+            self._playout_end += len(chunk) / self.bytes_per_s
+            self._replying = True
+            self.chunks += 1
+
+            self._send_s += _SMOOTHING * (sent - now - self._send_s)
+            self._adapt()
+            if sent - self._pinged_at > self.settings.ping_interval_s:
+                self._pinged_at = sent
+                async with self._send_lock:
+                    await self.websocket.send_text(json.dumps({"event": "ping", "t": sent}))
+
+    def _adapt(self):
+        rtt_ms = (self.rtt_s or 0.0) * 1000
+        chunk_ms = min(max(rtt_ms / 4, self._send_s * 4000, self.settings.min_chunk_ms), self.settings.max_chunk_ms)
+        if chunk_ms != self.chunk_ms:
+            self.chunk_ms = chunk_ms
+            self._chunks.retarget(chunk_ms, chunk_ms)
+        self.lead_s = min(self.settings.lead_ms + rtt_ms, self.settings.max_lead_ms) / 1000
+
+    async def receive(self) -> dict:
+        while True:
+            message = await self.websocket.receive()
+            # Round trip probes are answered by the client and consumed here
+            if message.get("text") is not None and '"pong"' in message["text"]:
+                data = json.loads(message["text"])
+                if data.get("event") == "pong":
+                    self._on_pong(data)
+                    continue
+            return message
+
+    def _on_pong(self, data: dict):
+        try:
+            rtt_s = time.perf_counter() - float(data["t"])
+        except (KeyError, TypeError, ValueError):
+            return
+        EGRESS_RTT_SECONDS.observe(rtt_s)
+        self.rtt_s = rtt_s if self.rtt_s is None else self.rtt_s + _SMOOTHING * (rtt_s - self.rtt_s)
+        self._adapt()
+
+    async def send_text(self, text: str):
+        if '"clear"' in text and json.loads(text).get("event") == "clear":
+            # Barge-in: what is still held or queued here is stale too
+            self._generation += 1
+            self._chunks.discard()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queued_bytes = 0
+            async with self._dequeued:
+                self._dequeued.notify_all()
+            self._playout_end = 0.0
+            self._replying = False
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.chunks,
+            "underruns": self.underruns,
+            "underrun_ms": round(self.underrun_s * 1000),
+            "mean_buffered_ms": round(self._buffered_s_total / max(1, self.chunks) * 1000),
+            "chunk_ms": round(self.chunk_ms),
+            "lead_ms": round(self.lead_s * 1000),
+            "rtt_ms": round(self.rtt_s * 1000) if self.rtt_s is not None else None,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
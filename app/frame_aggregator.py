@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FrameAggregator:
+    """Coalesce small PCM frames into `target_ms` batches before forwarding them.
+
+    The browser worklet posts one 128-sample render quantum (~5 ms) per message; forwarding each
+    one means a base64 + JSON event per frame. Frames are appended to a buffer and flushed when it
+    holds `target_ms` of audio, or `max_latency_ms` after the first frame of a batch arrived,
+    whichever comes first, so a quiet trickle of frames is never held back for long.
+
+    A timer flush runs in its own task; if its send fails, the error is raised by the next
+    `push` or `flush`, as it would have been had that call sent the batch.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Awaitable[None]],
+        target_ms: int = 40,
+        max_latency_ms: int = 60,
+        sample_rate: int = 24000,
+        sample_width: int = 2,
+    ):
+        self.send = send
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.retarget(target_ms, max_latency_ms)
+
+        self._buffer = bytearray()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_flush: Optional[asyncio.Task] = None
+        self._timer_error: Optional[BaseException] = None
+        self._lock = asyncio.Lock()
+
+        self.frames_in = 0
+        self.messages_out = 0
+
+    def retarget(self, target_ms: int, max_latency_ms: int):
+        """Change the batch size, from the next batch on."""
+        self.target_ms = target_ms
+        self.max_latency_ms = max(max_latency_ms, target_ms)
+        self.target_bytes = int(self.sample_rate * self.sample_width * target_ms / 1000)
+        self.target_bytes -= self.target_bytes % self.sample_width
+
+    async def push(self, frame: bytes):
+        self._raise_timer_error()
+        self.frames_in += 1
+        if self.target_bytes <= 0:
+            # Aggregation disabled
+            await self._send(frame)
+            return
+
+        self._buffer += frame
+        if len(self._buffer) >= self.target_bytes:
+            await self.flush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self.max_latency_ms / 1000, self._on_timer)
+
+    async def flush(self):
+        self._raise_timer_error()
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buffer:
+                return
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            await self._send(data)
+
+    def discard(self):
+        """Drop the partial batch, e.g. audio made stale by a barge-in."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._timer_flush is not None and not self._timer_flush.done():
+            self._timer_flush.cancel()
+        self._buffer.clear()
+
+    async def close(self):
+        await self.flush()
+        if self.frames_in:
+            logger.debug(f"Aggregated [{self.frames_in}] frames into [{self.messages_out}] messages")
+
+    def _on_timer(self):
+        self._timer = None
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._timer_flush = asyncio.create_task(self.flush())
+        self._timer_flush.add_done_callback(self._on_timer_flush_done)
+
+    def _on_timer_flush_done(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.warning(f"Timed flush failed: {task.exception()!r}")
+        self._timer_error = task.exception()
+
+    def _raise_timer_error(self):
+        error, self._timer_error = self._timer_error, None
+        if error is not None:
+            raise error
+
+    async def _send(self, data: bytes):
+        self.messages_out += 1
+        await self.send(data)
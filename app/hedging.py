@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional, TypeVar
+
+from app import config
+from app.admission import AdmissionController
+from app.metrics import REGISTRY
+from app.providers.base import LLMProvider, TTSProvider
+
+logger = logging.getLogger(__name__)
+
+HEDGE_TOTAL = REGISTRY.counter(
+    "voice_agent_hedged_requests", "Requests past the hedging deadline by stage and result", ["stage", "result"]
+)
+HEDGE_FIRST_BYTE_SECONDS = REGISTRY.summary(
+    "voice_agent_hedge_first_byte_seconds", "First byte time of hedged-stage requests", ["stage"]
+)
+HEDGE_DEADLINE_SECONDS = REGISTRY.gauge(
+    "voice_agent_hedge_deadline_seconds", "Wait for a first byte before a duplicate request is sent", ["stage"]
+)
+
+T = TypeVar("T")
+# First item of a stream that ended without any
+_EMPTY = object()
+
+
+class HedgePolicy:
+    """When to hedge a stage's requests, and how many hedges it can afford.
+
+    The deadline is the `percentile` of recent first byte times (`default_deadline_ms` until
+    `min_samples` are seen). The budget is a token bucket: each request adds `budget_ratio` of a
+    token, up to `budget_burst`, and each hedge takes one, so hedges stay below that fraction of
+    requests however slow the upstream gets. One policy per stage is shared by every session.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        percentile: float = None,
+        min_samples: int = None,
+        default_deadline_ms: float = None,
+        budget_ratio: float = None,
+        budget_burst: float = None,
+    ):
+        self.stage = stage
+        self.percentile = config.HEDGE_PERCENTILE if percentile is None else percentile
+        self.min_samples = config.HEDGE_MIN_SAMPLES if min_samples is None else min_samples
+        self.default_deadline_s = (
+            config.HEDGE_DEFAULT_DEADLINE_MS if default_deadline_ms is None else default_deadline_ms
+        ) / 1000
+        self.budget_ratio = config.HEDGE_BUDGET_RATIO if budget_ratio is None else budget_ratio
+        self.budget_burst = config.HEDGE_BUDGET_BURST if budget_burst is None else budget_burst
+        self._tokens = self.budget_burst
+        self._first_byte = HEDGE_FIRST_BYTE_SECONDS.labels(stage=stage)
+        self._deadline_gauge = HEDGE_DEADLINE_SECONDS.labels(stage=stage)
+
+    def deadline(self) -> float:
+        if len(self._first_byte.window) < self.min_samples:
+            deadline = self.default_deadline_s
+        else:
+            deadline = self._first_byte.quantile(self.percentile)
+        self._deadline_gauge.set(deadline)
+        return deadline
+
+    def on_request(self):
+        self._tokens = min(self.budget_burst, self._tokens + self.budget_ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def refund(self):
+        self._tokens = min(self.budget_burst, self._tokens + 1)
+
+    def observe(self, first_byte_s: float):
+        self._first_byte.observe(first_byte_s)
+
+
+_policies: Dict[str, HedgePolicy] = {}
+
+
+def get_hedge_policy(stage: str) -> HedgePolicy:
+    """The process-wide policy of `stage`, created on first use."""
+    if stage not in _policies:
+        _policies[stage] = HedgePolicy(stage)
+    return _policies[stage]
+
+
+class _Attempt:
+    """One request of a hedged call, its first item awaited in a task."""
+
+    def __init__(self, stream: AsyncIterator, release: Callable[[], None] = None):
+        self.stream = stream
+        # Gives back the admission slot the request holds, if any
+        self.release = release
+        self.started_at = time.perf_counter()
+        self.first = asyncio.create_task(self._first_item())
+
+    async def _first_item(self):
+        try:
+            return await self.stream.__anext__()
+        except StopAsyncIteration:
+            return _EMPTY
+
+    async def close(self):
+        # The cancelled read unwinds the provider's stream, which releases its HTTP response
+        self.first.cancel()
+        await asyncio.gather(self.first, return_exceptions=True)
+        try:
+            aclose = getattr(self.stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            release, self.release = self.release, None
+            if release is not None:
+                release()
+
+
+async def hedged_stream(
+    policy: HedgePolicy, start: Callable[[], AsyncIterator[T]], admission: Optional[AdmissionController] = None
+) -> AsyncIterator[T]:
+    """Items of `start()`, or of a duplicate `start()` if the first has no item by the deadline.
+
+    Whichever request yields first is streamed and the other is cancelled. A request failing
+    before its first item leaves the other one to answer; errors after it are the caller's.
+    With `admission`, the duplicate needs a free slot of the stage on top of the caller's, and
+    is skipped rather than queued when there is none.
+    """
+    policy.on_request()
+    attempts: List[_Attempt] = [_Attempt(start())]
+    try:
+        done, _ = await asyncio.wait([attempts[0].first], timeout=policy.deadline())
+        if not done:
+            if not policy.try_spend():
+                HEDGE_TOTAL.labels(stage=policy.stage, result="over_budget").inc()
+            elif admission is not None and not await admission.try_acquire(policy.stage):
+                policy.refund()
+                HEDGE_TOTAL.labels(stage=policy.stage, result="no_slot").inc()
+            else:
+                release = None if admission is None else (lambda: admission.release(policy.stage))
+                attempts.append(_Attempt(start(), release))
+
+        winner = await _first_answered(attempts)
+        now = time.perf_counter()
+        policy.observe(now - winner.started_at)
+        if winner is not attempts[0]:
+            # A lower bound past the deadline, which keeps the slow tail in the estimate. A losing
+            # hedge's time is left out, it says nothing about the upstream's tail.
+            policy.observe(now - attempts[0].started_at)
+        for attempt in attempts:
+            if attempt is not winner:
+                await attempt.close()
+        if len(attempts) > 1:
+            result = "primary_won" if winner is attempts[0] else "hedge_won"
+            HEDGE_TOTAL.labels(stage=policy.stage, result=result).inc()
+            logger.debug(f"Hedged {policy.stage} request, {result} after [{(now - attempts[0].started_at) * 1000:.0f}]ms")
+        attempts = [winner]
+
+        item = winner.first.result()
+        if item is _EMPTY:
+            return
+        yield item
+        async for item in winner.stream:
+            yield item
+    finally:
+        for attempt in attempts:
+            await attempt.close()
+
+
+async def _first_answered(attempts: List[_Attempt]) -> _Attempt:
+    pending = list(attempts)
+    error: Optional[BaseException] = None
+    while pending:
+        await asyncio.wait([attempt.first for attempt in pending], return_when=asyncio.FIRST_COMPLETED)
+        # On a tie the earlier request wins
+        for attempt in [attempt for attempt in pending if attempt.first.done()]:
+            if attempt.first.exception() is None:
+                return attempt
+            error = error or attempt.first.exception()
+            pending.remove(attempt)
+    raise error
+
+
+class HedgedLLM:
+    """An `LLMProvider` whose chat requests are hedged, see `hedged_stream`."""
+
+    def __init__(self, llm: LLMProvider, policy: HedgePolicy = None, admission: AdmissionController = None):
+        self.llm = llm
+        # Same identity as the wrapped provider, e.g. for response cache keys
+        self.name, self.model = llm.name, llm.model
+        self.policy = policy or get_hedge_policy("llm")
+        self.admission = admission
+
+    def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        return hedged_stream(self.policy, lambda: self.llm.stream_chat(messages), self.admission)
+
+
+class HedgedTTS:
+    """A `TTSProvider` whose speech requests are hedged, see `hedged_stream`."""
+
+    def __init__(self, tts: TTSProvider, policy: HedgePolicy = None, admission: AdmissionController = None):
+        self.tts = tts
+        self.name, self.model, self.voice, self.instructions = tts.name, tts.model, tts.voice, tts.instructions
+        self.policy = policy or get_hedge_policy("tts")
+        self.admission = admission
+
+    def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        return hedged_stream(self.policy, lambda: self.tts.stream_speech(text, chunk_size), self.admission)
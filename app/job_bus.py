@@ -0,0 +1,419 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from contextlib import aclosing
+from typing import Dict, List, Optional
+
+from app import config
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+JOBS_INFLIGHT = REGISTRY.gauge("voice_agent_jobs_inflight", "Jobs running on stage workers", ["stage"])
+JOB_QUEUE_SECONDS = REGISTRY.summary(
+    "voice_agent_job_queue_seconds", "Time a job waited for a free worker slot", ["stage"]
+)
+JOBS_TOTAL = REGISTRY.counter("voice_agent_jobs", "Stage worker jobs by outcome", ["stage", "outcome"])
+
+STAGES = ("stt", "llm", "tts")
+
+# Job messages, gateway -> worker: (kind, job_id, *args)
+_LLM = "llm"
+_TTS = "tts"
+_STT_OPEN = "stt_open"
+_STT_AUDIO = "stt_audio"
+_STT_COMMIT = "stt_commit"
+_STT_TURN_DETECTION = "stt_turn_detection"
+_CANCEL = "cancel"
+
+# Results, worker -> gateway: (job_id, kind, payload)
+_DATA = "data"
+_END = "end"
+_ERROR = "error"
+
+
+class WorkerError(Exception):
+    """A stage worker failed the job, or died while running it."""
+
+
+class WorkerBusy(WorkerError):
+    """No worker slot freed up within `JOB_QUEUE_TIMEOUT_S`."""
+
+
+class Job:
+    """One job on a stage worker: messages go to the worker, results come back as an async stream.
+
+    Closing the job before the worker has ended it cancels it on the worker.
+    """
+
+    def __init__(self, pool: "StagePool", job_id: int, worker: "_WorkerHandle"):
+        self.pool = pool
+        self.id = job_id
+        self.worker = worker
+        self.results: asyncio.Queue = asyncio.Queue()
+        self.finished = False
+        self.failed = False
+        self.closed = False
+
+    def send(self, kind: str, *args):
+        if not self.closed:
+            self.worker.inbox.put((kind, self.id, *args))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        kind, payload = await self.results.get()
+        if kind == _DATA:
+            return payload
+        self.finished = True
+        if kind == _ERROR:
+            self.failed = True
+            raise WorkerError(payload)
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        self.pool._release(self)
+
+
+class _WorkerHandle:
+    def __init__(self, index: int, process, inbox):
+        self.index = index
+        self.process = process
+        self.inbox = inbox
+        self.jobs: Dict[int, Job] = {}
+
+
+class StagePool:
+    """Worker processes for one stage, as seen from the gateway.
+
+    Each worker runs jobs concurrently on its own event loop, at most `concurrency` at a time;
+    new jobs go to the least loaded worker, and wait (up to `queue_timeout_s`) for a slot once
+    every worker is full. This is the stage's concurrency limit and the gateway's backpressure.
+    STT jobs are whole sessions, so they stay on one worker.
+    """
+
+    def __init__(self, stage: str, workers: int, concurrency: int, queue_timeout_s: float = 10):
+        self.stage = stage
+        self.size = workers
+        self.concurrency = concurrency
+        self.queue_timeout_s = queue_timeout_s
+
+        self._context = multiprocessing.get_context("spawn")
+        self._outbox = None
+        self._workers: List[_WorkerHandle] = []
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.size * self.concurrency)
+        # One result queue shared by the stage's workers, drained by a thread
+        self._outbox = self._context.Queue()
+        self._workers = [self._spawn(i) for i in range(self.size)]
+        self._reader = threading.Thread(target=self._read_results, name=f"{self.stage}-results", daemon=True)
+        self._reader.start()
+        self._watcher = asyncio.create_task(self._watch())
+        logger.info(f"Started [{self.size}] {self.stage} workers, [{self.concurrency}] jobs each")
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        for worker in self._workers:
+            worker.inbox.put(None)
+        for worker in self._workers:
+            await asyncio.to_thread(worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._workers = []
+        if self._reader is not None:
+            self._outbox.put(None)
+            await asyncio.to_thread(self._reader.join, 5)
+            self._reader = None
+
+    def _spawn(self, index: int) -> _WorkerHandle:
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.stage, index, inbox, self._outbox, self.concurrency),
+            name=f"voice-agent-{self.stage}-{index}",
+            daemon=True,
+        )
+        process.start()
+        return _WorkerHandle(index, process, inbox)
+
+    async def submit(self, kind: str, *args) -> Job:
+        """Start a job on the least loaded worker, waiting for a slot if all are busy."""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            JOBS_TOTAL.labels(stage=self.stage, outcome="rejected").inc()
+            raise WorkerBusy(f"No {self.stage} worker free after [{self.queue_timeout_s}]s") from None
+        JOB_QUEUE_SECONDS.labels(stage=self.stage).observe(time.perf_counter() - started)
+
+        worker = min(self._workers, key=lambda w: len(w.jobs))
+        job = Job(self, next(self._ids), worker)
+        self._jobs[job.id] = job
+        worker.jobs[job.id] = job
+        JOBS_INFLIGHT.labels(stage=self.stage).inc()
+        job.send(kind, *args)
+        return job
+
+    def _release(self, job: Job):
+        if job.closed:
+            return
+        if not job.finished:
+            job.send(_CANCEL)
+            # Ends a consumer still iterating the results
+            job.results.put_nowait((_END, None))
+        job.closed = True
+        self._jobs.pop(job.id, None)
+        job.worker.jobs.pop(job.id, None)
+        self._slots.release()
+        JOBS_INFLIGHT.labels(stage=self.stage).dec()
+        outcome = "failed" if job.failed else "completed" if job.finished else "cancelled"
+        JOBS_TOTAL.labels(stage=self.stage, outcome=outcome).inc()
+
+    def _read_results(self):
+        while (message := self._outbox.get()) is not None:
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message):
+        job_id, kind, payload = message
+        job = self._jobs.get(job_id)
+        # Results of cancelled jobs may still be in flight
+        if job is not None:
+            job.results.put_nowait((kind, payload))
+
+    async def _watch(self):
+        """Fail the jobs of a crashed worker and replace it."""
+        while True:
+            await asyncio.sleep(1)
+            for i, worker in enumerate(self._workers):
+                if worker.process.is_alive():
+                    continue
+                logger.error(
+                    f"{self.stage} worker [{worker.index}] exited with [{worker.process.exitcode}], "
+                    f"failing [{len(worker.jobs)}] jobs"
+                )
+                for job in list(worker.jobs.values()):
+                    job.results.put_nowait((_ERROR, f"{self.stage} worker exited"))
+                self._workers[i] = self._spawn(worker.index)
+                # Jobs still hold their old handle; its inbox is not read any more
+                self._workers[i].jobs = worker.jobs
+
+
+class JobBus:
+    """Stage worker pools of the gateway process; a stage without workers runs in-process."""
+
+    def __init__(self):
+        self.pools: Dict[str, StagePool] = {}
+        for stage in STAGES:
+            workers = getattr(config, f"{stage.upper()}_WORKERS")
+            if workers > 0:
+                concurrency = getattr(config, f"{stage.upper()}_WORKER_CONCURRENCY")
+                self.pools[stage] = StagePool(stage, workers, concurrency, config.JOB_QUEUE_TIMEOUT_S)
+
+    async def start(self):
+        for pool in self.pools.values():
+            await pool.start()
+
+    async def stop(self):
+        for pool in self.pools.values():
+            await pool.stop()
+
+    def create_llm(self, engine: str):
+        from app.providers import create_llm
+        from app.providers.remote import RemoteLLM
+
+        if "llm" in self.pools:
+            return RemoteLLM(self.pools["llm"], engine)
+        return create_llm(engine)
+
+    def create_tts(self, engine: str):
+        from app.providers import create_tts
+        from app.providers.remote import RemoteTTS
+
+        if "tts" in self.pools:
+            return RemoteTTS(self.pools["tts"], engine)
+        return create_tts(engine)
+
+    async def create_stt_session(self, engine: str):
+        from app.providers import create_stt_session
+        from app.providers.remote import RemoteSTTSession
+
+        if "stt" in self.pools:
+            session = RemoteSTTSession(self.pools["stt"], engine)
+            await session.connect()
+            return session
+        return await create_stt_session(engine)
+
+
+_bus: Optional[JobBus] = None
+
+
+def get_job_bus() -> JobBus:
+    """The gateway's job bus, created on first use."""
+    global _bus
+    if _bus is None:
+        _bus = JobBus()
+    return _bus
+
+
+# Worker process side
+
+
+def _worker_main(stage: str, index: int, inbox, outbox, concurrency: int):
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s.%(msecs)03d - %(levelname)s - [{stage}-{index}] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    try:
+        asyncio.run(_StageWorker(stage, inbox, outbox, concurrency).run())
+    except KeyboardInterrupt:
+        pass
+
+
+class _StageWorker:
+    """Runs the in-process providers for jobs received from the gateway."""
+
+    def __init__(self, stage: str, inbox, outbox, concurrency: int):
+        self.stage = stage
+        self.inbox = inbox
+        self.outbox = outbox
+        self.concurrency = concurrency
+        self.tasks: Dict[int, asyncio.Task] = {}
+        # Ordered audio / commit / reconfigure operations of each STT session
+        self.stt_ops: Dict[int, asyncio.Queue] = {}
+        self.providers = {}
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        messages: asyncio.Queue = asyncio.Queue()
+
+        def read_inbox():
+            while True:
+                message = self.inbox.get()
+                loop.call_soon_threadsafe(messages.put_nowait, message)
+                if message is None:
+                    return
+
+        threading.Thread(target=read_inbox, name="inbox", daemon=True).start()
+        if self.stage == "stt" and config.STT_ENGINE == "openai":
+            from app.realtime_transcribe_client import API_KEY
+            from app.transcribe_pool import get_transcribe_pool
+
+            await get_transcribe_pool(API_KEY).start()
+        elif self.stage == "stt":
+            from app.providers.local import warmup_local_engine
+
+            await warmup_local_engine()
+        else:
+            from app.clients import warmup_openai_client
+
+            if getattr(config, f"{self.stage.upper()}_ENGINE") == "openai":
+                await warmup_openai_client()
+
+        while (message := await messages.get()) is not None:
+            kind, job_id, *args = message
+            if kind == _CANCEL:
+                if (task := self.tasks.get(job_id)) is not None:
+                    task.cancel()
+            elif kind in (_STT_AUDIO, _STT_COMMIT, _STT_TURN_DETECTION):
+                if (ops := self.stt_ops.get(job_id)) is not None:
+                    ops.put_nowait((kind, *args))
+            else:
+                if kind == _STT_OPEN:
+                    # Before the job starts, so audio sent right after the open isn't lost
+                    self.stt_ops[job_id] = asyncio.Queue()
+                self.tasks[job_id] = asyncio.create_task(self._run_job(kind, job_id, *args))
+
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def _send(self, job_id: int, kind: str, payload=None):
+        self.outbox.put((job_id, kind, payload))
+
+    def _provider(self, stage: str, engine: str):
+        from app.providers import create_llm, create_tts
+
+        key = (stage, engine)
+        if key not in self.providers:
+            self.providers[key] = create_llm(engine) if stage == "llm" else create_tts(engine)
+        return self.providers[key]
+
+    async def _run_job(self, kind: str, job_id: int, *args):
+        try:
+            if kind == _LLM:
+                engine, messages = args
+                stream = self._provider("llm", engine).stream_chat(messages)
+            elif kind == _TTS:
+                engine, text, chunk_size = args
+                stream = self._provider("tts", engine).stream_speech(text, chunk_size)
+            elif kind == _STT_OPEN:
+                stream = self._run_stt(job_id, *args)
+            else:
+                raise ValueError(f"Unknown job [{kind}]")
+
+            async with aclosing(stream) as results:
+                async for payload in results:
+                    self._send(job_id, _DATA, payload)
+            self._send(job_id, _END)
+        except asyncio.CancelledError:
+            # The gateway has already let go of the job
+            pass
+        except Exception as e:
+            logger.error(f"Job [{kind}] failed: {e!r}")
+            self._send(job_id, _ERROR, repr(e))
+        finally:
+            self.tasks.pop(job_id, None)
+
+    async def _run_stt(self, job_id: int, engine: str):
+        """An STT session; yields its transcripts and VAD events as `(event, value)`."""
+        from app.providers import create_stt_session
+
+        ops = self.stt_ops[job_id]
+        try:
+            session = await create_stt_session(engine)
+        except BaseException:
+            self.stt_ops.pop(job_id, None)
+            raise
+        session.on_speech_started = lambda: self._send(job_id, _DATA, ("speech_started", None))
+        session.on_speech_stopped = lambda: self._send(job_id, _DATA, ("speech_stopped", session.speech_stopped_at))
+        session.on_transcript_delta = lambda partial: self._send(job_id, _DATA, ("transcript_delta", partial))
+
+        async def apply_ops():
+            try:
+                while True:
+                    kind, *args = await ops.get()
+                    if kind == _STT_AUDIO:
+                        await session.stream_audio(args[0])
+                    elif kind == _STT_COMMIT:
+                        await session.commit_audio()
+                    elif kind == _STT_TURN_DETECTION:
+                        await session.set_turn_detection(args[0])
+            except Exception as e:
+                # Ends `receive_messages` below
+                logger.error(f"STT session failed: {e!r}")
+                await session.close()
+
+        feeder = asyncio.create_task(apply_ops())
+        try:
+            async for transcript in session.receive_messages():
+                yield ("transcript", transcript)
+        finally:
+            feeder.cancel()
+            self.stt_ops.pop(job_id, None)
+            await session.close()
@@ -0,0 +1,263 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # Export unlabelled metrics from the start, e.g. a gauge at 0
+            self._default()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Metric [{self.name}] expects labels {self.labelnames}")
+        with self._lock:
+            if values not in self._children:
+                self._children[values] = self._new_child()
+            return self._children[values]
+
+    def _default(self):
+        # Unlabelled metrics have a single child
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(suffix, labels, value) triples."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def samples(self):
+        return [("_total", _format_labels(self.labelnames, k), c.value) for k, c in self._children.items()]
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def samples(self):
+        return [("", _format_labels(self.labelnames, k), c.value) for k, c in self._children.items()]
+
+
+class _SummaryValue:
+    def __init__(self, window: int):
+        self.window: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.window.append(value)
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            values = sorted(self.window)
+        if not values:
+            return math.nan
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Summary(_Metric):
+    """Quantiles over the last `window` observations, plus all-time sum and count."""
+
+    type_name = "summary"
+    quantiles = (0.5, 0.95, 0.99)
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), window: int = 1024):
+        self.window = window
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _SummaryValue(self.window)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def samples(self):
+        samples = []
+        for key, child in self._children.items():
+            for q in self.quantiles:
+                samples.append(("", _format_labels(self.labelnames, key, {"quantile": str(q)}), child.quantile(q)))
+            samples.append(("_sum", _format_labels(self.labelnames, key), child.sum))
+            samples.append(("_count", _format_labels(self.labelnames, key), child.count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Modules may be reloaded (e.g. uvicorn --reload), keep the first instance
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def summary(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Summary:
+        return self.register(Summary(name, documentation, labelnames))
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+    def snapshot(self) -> list:
+        """JSON-serializable current values, e.g. to publish them for other worker processes."""
+        return [
+            [metric.name, metric.type_name, metric.documentation, [list(s) for s in metric.samples()]]
+            for metric in self._metrics.values()
+        ]
+
+
+def render_snapshots(snapshots: Dict[str, list]) -> str:
+    """Prometheus text of several processes' `snapshot()`s, each sample labelled with its `worker`.
+
+    Quantiles can't be merged exactly, so samples are kept apart and aggregated by the scraper.
+    """
+    families: Dict[str, Tuple[str, str, List[str]]] = {}
+    for worker, snapshot in sorted(snapshots.items()):
+        for name, type_name, documentation, samples in snapshot:
+            _, _, lines = families.setdefault(name, (type_name, documentation, []))
+            worker_label = _format_labels(("worker",), (worker,))
+            for suffix, labels, value in samples:
+                labels = labels[:-1] + "," + worker_label[1:] if labels else worker_label
+                lines.append(f"{name}{suffix}{labels} {_format_value(value)}")
+
+    rendered = []
+    for name, (type_name, documentation, lines) in families.items():
+        rendered += [f"# HELP {name} {documentation}", f"# TYPE {name} {type_name}", *lines]
+    return "\n".join(rendered) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SESSIONS_ACTIVE = REGISTRY.gauge("voice_agent_sessions_active", "Open /ws/audio sessions")
+TURNS_TOTAL = REGISTRY.counter("voice_agent_turns", "Agent replies by outcome", ["outcome"])
+TURN_STAGE_SECONDS = REGISTRY.summary(
+    "voice_agent_turn_stage_seconds", "Time from the end of the user's speech to each pipeline stage", ["stage"]
+)
+
+
+class TurnTimings:
+    """Stage timestamps of one turn, from end of speech to the last audio byte sent.
+
+    Stages are marked once, except `last_byte_sent` which keeps moving. Latencies are reported
+    relative to `speech_stopped` (or to `transcription_completed` if no VAD event was seen).
+    """
+
+    STAGES = (
+        "speech_stopped",
+        "transcription_completed",
+        "llm_first_token",
+        "llm_done",
+        "tts_first_byte",
+        "first_byte_sent",
+        "last_byte_sent",
+    )
+
+    def __init__(self, session_id: str = None):
+        self.session_id = session_id
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, stage: str, at: Optional[float] = None):
+        if stage in self.marks and stage != "last_byte_sent":
+            return
+        self.marks[stage] = time.perf_counter() if at is None else at
+
+    def latencies(self) -> Dict[str, float]:
+        origin = self.marks.get("speech_stopped", self.marks.get("transcription_completed"))
+        if origin is None:
+            return {}
+        return {stage: self.marks[stage] - origin for stage in self.STAGES if stage in self.marks}
+
+    def observe(self, outcome: str = "completed"):
+        """Publish this turn to the metrics registry and log a one-line summary."""
+        TURNS_TOTAL.labels(outcome=outcome).inc()
+        latencies = self.latencies()
+        for stage, seconds in latencies.items():
+            if stage != "speech_stopped":
+                TURN_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+        summary = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in latencies.items())
+        logger.info(f"Session[{self.session_id}] turn {outcome}: {summary}")
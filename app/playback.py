@@ -0,0 +1,65 @@
+import time
+from typing import List, Tuple
+
+
+class PlaybackTracker:
+    """Track how much of a spoken reply has reached, and been played by, the client.
+
+    The client plays audio in real time from the first byte it receives, so the played duration
+    is estimated as ``min(sent audio duration, wall-clock since first byte)``. Segment boundaries
+    are kept so the spoken part of the reply text can be recovered on interruption.
+
+    Audio is counted twice: queued when the reply hands it to the socket, which places segment
+    boundaries, and sent when the egress pacer (`app.egress`) actually sends it, which is what
+    the client can have played.
+    """
+
+    def __init__(self, sample_rate: int = 24000, sample_width: int = 2):
+        self.bytes_per_ms = sample_rate * sample_width / 1000
+        self.bytes_queued = 0
+        self.bytes_sent = 0
+        self.first_sent_at = None
+        # (text, bytes queued when the segment started)
+        self._segments: List[Tuple[str, int]] = []
+
+    def on_segment(self, text: str):
+        self._segments.append((text, self.bytes_queued))
+
+    def on_audio_queued(self, size: int):
+        self.bytes_queued += size
+
+    def on_audio_sent(self, size: int):
+        if self.first_sent_at is None:
+            self.first_sent_at = time.perf_counter()
+        self.bytes_sent += size
+
+    @property
+    def sent_ms(self) -> float:
+        return self.bytes_sent / self.bytes_per_ms
+
+    @property
+    def played_ms(self) -> float:
+        if self.first_sent_at is None:
+            return 0.0
+        elapsed_ms = (time.perf_counter() - self.first_sent_at) * 1000
+        return min(self.sent_ms, elapsed_ms)
+
+    def is_playing(self) -> bool:
+        # Audio still queued for sending counts too
+        return self.played_ms * self.bytes_per_ms < self.bytes_queued
+
+    def played_text(self) -> str:
+        """Best-effort estimate of the reply text the user has heard."""
+        played_bytes = self.played_ms * self.bytes_per_ms
+        spoken = []
+        for i, (text, start) in enumerate(self._segments):
+            end = self._segments[i + 1][1] if i + 1 < len(self._segments) else self.bytes_queued
+            if played_bytes >= end:
+                spoken.append(text)
+            elif played_bytes > start and end > start:
+                words = text.split()
+                spoken.append(" ".join(words[: int(len(words) * (played_bytes - start) / (end - start))]))
+                break
+            else:
+                break
+        return " ".join(s for s in spoken if s)
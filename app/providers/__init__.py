@@ -0,0 +1,74 @@
+"""Pluggable STT / LLM / TTS backends.
+
+Each stage is chosen independently per session by engine name, see `SessionOptions`:
+
+| Engine   | STT                                | LLM               | TTS                  |
+| -------- | ---------------------------------- | ----------------- | -------------------- |
+| `openai` | Realtime transcription (pooled)    | Chat Completions  | Speech API           |
+| `local`  | faster-whisper or stub, local VAD  | Echo stub         | Tone stub            |
+"""
+
+from typing import Callable, Dict
+
+from app.providers.base import LLMProvider, STTSession, TTSProvider
+from app.providers.local import LocalLLM, LocalSTTSession, LocalTTS
+from app.providers.openai import OpenAILLM, OpenAITTS
+
+ENGINES = ("openai", "local")
+
+_LLM_FACTORIES: Dict[str, Callable[[], LLMProvider]] = {
+    "openai": OpenAILLM,
+    "local": LocalLLM,
+}
+
+_TTS_FACTORIES: Dict[str, Callable[[], TTSProvider]] = {
+    "openai": OpenAITTS,
+    "local": LocalTTS,
+}
+
+
+def _check_engine(engine: str):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine [{engine}], expected one of {ENGINES}")
+
+
+def create_llm(engine: str) -> LLMProvider:
+    _check_engine(engine)
+    return _LLM_FACTORIES[engine]()
+
+
+def create_tts(engine: str) -> TTSProvider:
+    _check_engine(engine)
+    return _TTS_FACTORIES[engine]()
+
+
+async def create_stt_session(engine: str) -> STTSession:
+    """A connected STT session, the caller closes it."""
+    _check_engine(engine)
+    if engine == "openai":
+        # Imported here, so the local engine doesn't load the realtime client
+        from app.realtime_transcribe_client import API_KEY
+        from app.transcribe_pool import get_transcribe_pool
+
+        # Pre-connected and configured, unless the pool has run dry
+        return await get_transcribe_pool(API_KEY).acquire()
+
+    session = LocalSTTSession()
+    await session.connect()
+    return session
+
+
+__all__ = [
+    "ENGINES",
+    "LLMProvider",
+    "STTSession",
+    "TTSProvider",
+    "LocalLLM",
+    "LocalSTTSession",
+    "LocalTTS",
+    "OpenAILLM",
+    "OpenAITTS",
+    "create_llm",
+    "create_stt_session",
+    "create_tts",
+]
@@ -0,0 +1,66 @@
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Protocol, Union, runtime_checkable
+
+# Called without arguments, may be sync or async
+EventCallback = Callable[[], Union[None, Awaitable[None]]]
+# Called with the transcript so far of the turn being transcribed
+TranscriptCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+# Audio exchanged with every provider: PCM16, 24kHz, mono, little-endian
+SAMPLE_RATE = 24000
+
+
+@runtime_checkable
+class STTSession(Protocol):
+    """One caller's streaming speech-to-text session.
+
+    Audio is pushed with `stream_audio`; turns end either by the engine's own turn detection
+    (`turn_detection` not None) or by an explicit `commit_audio`. Transcripts of finished turns
+    are yielded by `receive_messages`, and VAD transitions are reported through the
+    `on_speech_started` / `on_speech_stopped` hooks. Engines that stream partial transcripts
+    report them through `on_transcript_delta`.
+    """
+
+    turn_detection: Optional[dict]
+    on_speech_started: Optional[EventCallback]
+    on_speech_stopped: Optional[EventCallback]
+    on_transcript_delta: Optional[TranscriptCallback]
+    # perf_counter() of the last end of speech seen by the engine
+    speech_stopped_at: Optional[float]
+
+    async def connect(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def set_turn_detection(self, turn_detection: Optional[dict]) -> None: ...
+
+    async def stream_audio(self, audio_chunk: bytes) -> None: ...
+
+    async def commit_audio(self) -> None: ...
+
+    def receive_messages(self) -> AsyncIterator[str]: ...
+
+
+@runtime_checkable
+class LLMProvider(Protocol):
+    """Streaming chat model."""
+
+    name: str
+    model: str
+
+    def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Yield text deltas of the assistant's answer to `messages`."""
+        ...
+
+
+@runtime_checkable
+class TTSProvider(Protocol):
+    """Streaming speech synthesis."""
+
+    name: str
+    model: str
+    voice: str
+    instructions: str
+
+    def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Yield PCM16 24kHz mono audio for `text` in chunks of about `chunk_size` bytes."""
+        ...
@@ -0,0 +1,214 @@
+import asyncio
+import functools
+import importlib.util
+import inspect
+import logging
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from app import config
+from app.audio_utils import pcm16_to_float32, resample
+from app.providers.base import SAMPLE_RATE, EventCallback, TranscriptCallback
+from app.vad import VadGate, VadSettings
+
+logger = logging.getLogger(__name__)
+
+# The local engine runs in-process and on CPU: faster-whisper for STT when it is installed, and
+# deterministic stand-ins otherwise. The stand-ins keep the whole pipeline (VAD, segmentation,
+# barge-in, caching, metrics) exercisable without network access or model downloads.
+
+
+class StubTranscriber:
+    """Transcribes every turn as the same text."""
+
+    def __init__(self, text: str = "hello"):
+        self.text = text
+
+    def transcribe(self, pcm: bytes) -> str:
+        return self.text
+
+
+class WhisperTranscriber:
+    """faster-whisper (CTranslate2) on CPU, int8."""
+
+    def __init__(self, model_size: str):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model_size, device="cpu", compute_type="int8")
+
+    def transcribe(self, pcm: bytes) -> str:
+        # Whisper expects 16kHz
+        audio = pcm16_to_float32(resample(pcm, SAMPLE_RATE, 16000))
+        segments, _ = self.model.transcribe(audio, language="en", beam_size=1)
+        return "".join(segment.text for segment in segments).strip()
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_transcriber():
+    """The process-wide transcriber, the model is loaded once."""
+    if config.LOCAL_STT_MODEL and importlib.util.find_spec("faster_whisper") is not None:
+        logger.info(f"Loading faster-whisper model [{config.LOCAL_STT_MODEL}]")
+        return WhisperTranscriber(config.LOCAL_STT_MODEL)
+    if config.LOCAL_STT_MODEL:
+        logger.warning("faster-whisper is not installed, local STT falls back to a stub")
+    return StubTranscriber(config.LOCAL_STT_STUB_TEXT)
+
+
+async def warmup_local_engine():
+    # Model loading takes seconds, do it before the first caller
+    await asyncio.to_thread(get_local_transcriber)
+
+
+class LocalSTTSession:
+    """In-process STT with the same surface as `RealtimeTranscribeClient`.
+
+    Turns are endpointed by a `VadGate` in "local" mode unless `turn_detection` is None, in which
+    case the caller commits them with `commit_audio`. Committed turns are transcribed one at a
+    time in a worker thread, so audio keeps flowing while a turn is being transcribed.
+    """
+
+    def __init__(self, transcriber=None, vad_settings: VadSettings = None):
+        self.transcriber = transcriber or get_local_transcriber()
+        self.vad_settings = vad_settings or VadSettings(mode="local")
+        self.turn_detection: Optional[dict] = {"type": "local_vad"}
+        self.speech_stopped_at = None
+        self.on_speech_started: Optional[EventCallback] = None
+        self.on_speech_stopped: Optional[EventCallback] = None
+        # Turns are transcribed in one go, there are no partial transcripts
+        self.on_transcript_delta: Optional[TranscriptCallback] = None
+
+        self._turn = bytearray()
+        self._vad: Optional[VadGate] = None
+        self._committed: asyncio.Queue = asyncio.Queue()
+        self._transcripts: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        self._configure()
+        self._worker = asyncio.create_task(self._transcribe_turns())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        await self._transcripts.put(None)
+
+    async def set_turn_detection(self, turn_detection: Optional[dict]):
+        self.turn_detection = turn_detection
+        self._configure()
+
+    def _configure(self):
+        self._vad = None
+        if self.turn_detection is not None:
+            self._vad = VadGate(self._append, commit=self.commit_audio, settings=self.vad_settings)
+            self._vad.on_speech_started = self._speech_started
+            self._vad.on_speech_stopped = self._speech_stopped
+
+    async def stream_audio(self, audio_chunk: bytes) -> None:
+        if self._vad is not None:
+            await self._vad.process(audio_chunk)
+        else:
+            self._turn += audio_chunk
+
+    async def _append(self, audio_chunk: bytes):
+        self._turn += audio_chunk
+
+    async def commit_audio(self) -> None:
+        if self._turn:
+            pcm, self._turn = bytes(self._turn), bytearray()
+            await self._committed.put(pcm)
+
+    async def _transcribe_turns(self):
+        while True:
+            pcm = await self._committed.get()
+            started = time.perf_counter()
+            try:
+                transcript = await asyncio.to_thread(self.transcriber.transcribe, pcm)
+            except Exception as e:
+                logger.error(f"Local transcription failed: {e!r}")
+                continue
+            logger.info(
+                f"\n[Transcription completed] [{len(pcm) / 2 / SAMPLE_RATE:.1f}]s audio in "
+                f"[{(time.perf_counter() - started) * 1000:.0f}]ms"
+            )
+            if transcript:
+                await self._transcripts.put(transcript)
+
+    async def receive_messages(self) -> AsyncIterator[str]:
+        while (transcript := await self._transcripts.get()) is not None:
+            yield transcript
+
+    async def _speech_started(self):
+        logger.info("\n[Speech detected]")
+        await self._notify(self.on_speech_started)
+
+    async def _speech_stopped(self):
+        logger.info("\n[Speech ended]")
+        self.speech_stopped_at = time.perf_counter()
+        await self._notify(self.on_speech_stopped)
+
+    @staticmethod
+    async def _notify(callback: Optional[EventCallback]):
+        if callback is None:
+            return
+        result = callback()
+        if inspect.isawaitable(result):
+            await result
+
+
+class LocalLLM:
+    """Echoes the last user message back, word by word."""
+
+    name = "local"
+
+    def __init__(self, model: str = "echo", token_delay_ms: float = None):
+        self.model = model
+        self.token_delay_ms = config.LOCAL_LLM_TOKEN_DELAY_MS if token_delay_ms is None else token_delay_ms
+
+    async def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        user_input = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        answer = f"You said: {user_input.strip()}" if user_input.strip() else "Sorry, I didn't catch that."
+        for token in re.findall(r"\S+\s*", answer):
+            # Also yields to other sessions when there is no delay
+            await asyncio.sleep(self.token_delay_ms / 1000)
+            yield token
+
+
+class LocalTTS:
+    """Speaks each word as a short tone: audible, deterministic and as long as real speech."""
+
+    name = "local"
+
+    def __init__(self, model: str = "tone", voice: str = "sine", word_ms: float = 220, gap_ms: float = 60):
+        self.model = model
+        self.voice = voice
+        self.instructions = ""
+        self.word_ms = word_ms
+        self.gap_ms = gap_ms
+
+    def synthesize(self, text: str) -> bytes:
+        word_samples = int(SAMPLE_RATE * self.word_ms / 1000)
+        gap = np.zeros(int(SAMPLE_RATE * self.gap_ms / 1000), dtype=np.float32)
+        t = np.arange(word_samples, dtype=np.float32) / SAMPLE_RATE
+        # Short fades so words don't click
+        envelope = np.minimum(1.0, np.minimum(t, t[::-1]) / 0.01)
+
+        parts = []
+        for word in text.split():
+            frequency = 180 + 20 * (len(word) % 6)
+            parts.append(0.2 * envelope * np.sin(2 * np.pi * frequency * t))
+            parts.append(gap)
+        if not parts:
+            return b""
+        return (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+
+    async def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        audio = self.synthesize(text)
+        for offset in range(0, len(audio), chunk_size):
+            yield audio[offset : offset + chunk_size]
+            # Let other sessions run between chunks
+            await asyncio.sleep(0)
@@ -0,0 +1,63 @@
+import logging
+from typing import AsyncIterator, Dict, List
+
+from openai import AsyncOpenAI
+
+from app.clients import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAILLM:
+    """Chat Completions API, streamed."""
+
+    name = "openai"
+
+    def __init__(self, model: str = "gpt-4.1-mini", client: AsyncOpenAI = None):
+        self.model = model
+        # Shared across sessions, so connections are pooled
+        self.client = client or get_openai_client()
+
+    async def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(model=self.model, messages=messages, stream=True)
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content is not None:
+                    yield content
+        finally:
+            # Release the HTTP response when the consumer stops early, e.g. on barge-in
+            await stream.close()
+
+
+class OpenAITTS:
+    """Speech API, streamed as raw PCM."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini-tts",
+        voice: str = "coral",
+        instructions: str = "Speak in a cheerful and positive tone. language English",
+        client: AsyncOpenAI = None,
+    ):
+        self.model = model
+        self.voice = voice
+        self.instructions = instructions
+        self.audio_codec = "pcm"
+        self.client = client or get_openai_client()
+
+    async def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        async with self.client.audio.speech.with_streaming_response.create(
+            model=self.model,
+            voice=self.voice,
+            input=text,
+            instructions=self.instructions,
+            response_format=self.audio_codec,
+        ) as response:
+            async for data in response.iter_bytes(chunk_size):
+                yield data
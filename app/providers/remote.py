@@ -0,0 +1,96 @@
+import inspect
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.job_bus import StagePool
+from app.providers import create_llm, create_tts
+from app.providers.base import EventCallback, TranscriptCallback
+
+# Gateway-side stand-ins for providers running in stage worker processes, see `app.job_bus`.
+# They only move messages: encoding and model work happen in the workers.
+
+
+class RemoteLLM:
+    def __init__(self, pool: StagePool, engine: str):
+        self.pool = pool
+        self.engine = engine
+        # Same identity as the worker's provider, e.g. for response cache keys
+        local = create_llm(engine)
+        self.name, self.model = local.name, local.model
+
+    async def stream_chat(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        job = await self.pool.submit("llm", self.engine, messages)
+        try:
+            async for delta in job:
+                yield delta
+        finally:
+            await job.aclose()
+
+
+class RemoteTTS:
+    def __init__(self, pool: StagePool, engine: str):
+        self.pool = pool
+        self.engine = engine
+        local = create_tts(engine)
+        self.name, self.model, self.voice, self.instructions = local.name, local.model, local.voice, local.instructions
+
+    async def stream_speech(self, text: str, chunk_size: int) -> AsyncIterator[bytes]:
+        job = await self.pool.submit("tts", self.engine, text, chunk_size)
+        try:
+            async for data in job:
+                yield data
+        finally:
+            await job.aclose()
+
+
+class RemoteSTTSession:
+    """An STT session held open on one STT worker for the whole call."""
+
+    def __init__(self, pool: StagePool, engine: str):
+        self.pool = pool
+        self.engine = engine
+        self.job = None
+        # The engine's own default until reconfigured
+        self.turn_detection: Optional[dict] = {"type": "engine_default"}
+        self.speech_stopped_at = None
+        self.on_speech_started: Optional[EventCallback] = None
+        self.on_speech_stopped: Optional[EventCallback] = None
+        self.on_transcript_delta: Optional[TranscriptCallback] = None
+
+    async def connect(self):
+        self.job = await self.pool.submit("stt_open", self.engine)
+
+    async def close(self):
+        if self.job is not None:
+            await self.job.aclose()
+
+    async def set_turn_detection(self, turn_detection: Optional[dict]):
+        self.turn_detection = turn_detection
+        self.job.send("stt_turn_detection", turn_detection)
+
+    async def stream_audio(self, audio_chunk: bytes) -> None:
+        self.job.send("stt_audio", audio_chunk)
+
+    async def commit_audio(self) -> None:
+        self.job.send("stt_commit")
+
+    async def receive_messages(self) -> AsyncIterator[str]:
+        async for event, value in self.job:
+            if event == "transcript":
+                yield value
+            elif event == "speech_started":
+                await self._notify(self.on_speech_started)
+            elif event == "speech_stopped":
+                # perf_counter() is system-wide monotonic, so the worker's timestamp holds here
+                self.speech_stopped_at = value if value is not None else time.perf_counter()
+                await self._notify(self.on_speech_stopped)
+            elif event == "transcript_delta":
+                await self._notify(self.on_transcript_delta, value)
+
+    @staticmethod
+    async def _notify(callback, *args):
+        if callback is None:
+            return
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,271 @@
+import asyncio
+import binascii
+import importlib.util
+import inspect
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type, Union
+
+logger = logging.getLogger(__name__)
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+if importlib.util.find_spec("orjson") is not None:
+    import orjson
+
+    _loads = orjson.loads
+else:
+    _loads = json.loads
+
+
+class AppendEventEncoder:
+    """Builds `input_audio_buffer.append` events without JSON serialization.
+
+    The event is a fixed envelope around base64 audio, and base64 never needs JSON escaping, so
+    the envelope is written around the encoded audio in one reusable buffer: one temporary (the
+    base64 output) per chunk, instead of the bytes -> str -> dict -> JSON str -> UTF-8 copies
+    of `json.dumps`. The result is sent as a text frame, and is only valid until the next call.
+    """
+
+    PREFIX = b'{"type":"input_audio_buffer.append","audio":"'
+    SUFFIX = b'"}'
+
+    def __init__(self):
+        self._buffer = bytearray(self.PREFIX)
+
+    def encode(self, audio_chunk: Buffer) -> bytearray:
+        buffer = self._buffer
+        # Keeps the allocation, only the length changes
+        del buffer[len(self.PREFIX) :]
+        buffer += binascii.b2a_base64(audio_chunk, newline=False)
+        buffer += self.SUFFIX
+        return buffer
+
+
+# Server events of a transcription session, as routed by `RealtimeEventRouter`
+
+
+@dataclass(frozen=True)
+class SpeechStarted:
+    item_id: Optional[str]
+    audio_start_ms: Optional[int]
+
+
+@dataclass(frozen=True)
+class SpeechStopped:
+    item_id: Optional[str]
+    audio_end_ms: Optional[int]
+    # perf_counter() when the event was received, the start of turn latency
+    at: float
+
+
+@dataclass(frozen=True)
+class AudioCommitted:
+    # The conversation item the committed audio becomes
+    item_id: Optional[str]
+
+
+@dataclass(frozen=True)
+class TranscriptDelta:
+    item_id: Optional[str]
+    delta: str
+    # The turn's transcript so far, deltas included
+    transcript: str
+    # Only when a subscriber asked for logprobs
+    logprobs: Optional[List[dict]] = None
+
+
+@dataclass(frozen=True)
+class TranscriptCompleted:
+    item_id: Optional[str]
+    transcript: str
+    logprobs: Optional[List[dict]] = None
+
+
+@dataclass(frozen=True)
+class RealtimeError:
+    type: Optional[str]
+    code: Optional[str]
+    message: str
+    # The client event that caused it, if any
+    event_id: Optional[str]
+
+
+RealtimeEvent = Union[SpeechStarted, SpeechStopped, AudioCommitted, TranscriptDelta, TranscriptCompleted, RealtimeError]
+# Called with the event, may be sync or async
+EventHandler = Callable[[Any], Any]
+
+# The top-level `type` comes first in the API's events, so it is found without parsing the rest
+_TYPE_BYTES = re.compile(rb'"type"\s*:\s*"([^"]+)"')
+_TYPE_STR = re.compile(r'"type"\s*:\s*"([^"]+)"')
+_PEEK_CHARS = 128
+_END = object()
+
+
+class EventStream:
+    """Async iterator over the events a `RealtimeEventRouter.subscribe` asked for.
+
+    Events are queued in a bounded queue; a subscriber that falls `maxsize` behind loses the
+    oldest ones (counted in `dropped`) rather than holding up the receive loop. The stream ends
+    when the router closes or the subscription is closed.
+    """
+
+    def __init__(self, router: "RealtimeEventRouter", event_types: Tuple[Type, ...], maxsize: int, logprobs: bool):
+        self.router = router
+        self.event_types = event_types
+        self.logprobs = logprobs
+        self.maxsize = maxsize
+        self.dropped = 0
+        # Bounded here rather than by the queue, so the end marker never displaces an event
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def _put(self, item):
+        if item is not _END and self._queue.qsize() >= self.maxsize:
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def close(self):
+        self.router._unsubscribe(self)
+        self._put(_END)
+
+    def __aiter__(self) -> AsyncIterator[RealtimeEvent]:
+        return self
+
+    async def __anext__(self) -> RealtimeEvent:
+        item = await self._queue.get()
+        if item is _END:
+            # Again for any other reader
+            self._put(_END)
+            raise StopAsyncIteration
+        return item
+
+    async def __aenter__(self) -> "EventStream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class RealtimeEventRouter:
+    """Decodes transcription session events and dispatches them by type.
+
+    Each routed event type has a decoder in a dispatch table, which turns the message into one
+    of the event dataclasses above. Types without one (session updates, item created, ...) are
+    recognized from the first bytes of the message and skipped without parsing it. Events go to
+    the handlers registered with `on` and to every `subscribe`d stream of their type.
+
+    Logprobs are large (one object per token) and only requested from the server, see
+    `logprobs`, while some handler or stream subscribed with `logprobs=True`.
+    """
+
+    def __init__(self):
+        self._decoders: Dict[str, Callable[[dict], RealtimeEvent]] = {
+            "input_audio_buffer.speech_started": self._speech_started,
+            "input_audio_buffer.speech_stopped": self._speech_stopped,
+            "input_audio_buffer.committed": self._audio_committed,
+            "conversation.item.input_audio_transcription.delta": self._transcript_delta,
+            "conversation.item.input_audio_transcription.completed": self._transcript_completed,
+            "error": self._error,
+        }
+        self._handlers: Dict[Type, List[EventHandler]] = defaultdict(list)
+        self._streams: List[EventStream] = []
+        self._logprobs_subscribers = 0
+        self._partial_transcripts: Dict[Optional[str], str] = {}
+        self.skipped = 0
+
+    @property
+    def logprobs(self) -> bool:
+        """Whether anyone wants logprobs, read when the session is (re)configured."""
+        return self._logprobs_subscribers > 0
+
+    def on(self, event_type: Type, handler: EventHandler, logprobs: bool = False) -> Callable[[], None]:
+        """Call `handler(event)` for every event of `event_type`, returns a function removing it."""
+        self._handlers[event_type].append(handler)
+        self._logprobs_subscribers += logprobs
+
+        def remove():
+            if handler in self._handlers[event_type]:
+                self._handlers[event_type].remove(handler)
+                self._logprobs_subscribers -= logprobs
+
+        return remove
+
+    def subscribe(self, *event_types: Type, maxsize: int = 256, logprobs: bool = False) -> EventStream:
+        """A stream of the events of `event_types` (all of them if none are given)."""
+        stream = EventStream(self, event_types, maxsize, logprobs)
+        self._streams.append(stream)
+        self._logprobs_subscribers += logprobs
+        return stream
+
+    def _unsubscribe(self, stream: EventStream):
+        if stream in self._streams:
+            self._streams.remove(stream)
+            self._logprobs_subscribers -= stream.logprobs
+
+    def decode(self, message: Union[str, bytes]) -> Optional[RealtimeEvent]:
+        """The event in `message`, or None for types that aren't routed. Raises ValueError on bad JSON."""
+        if isinstance(message, str):
+            match = _TYPE_STR.search(message, 0, _PEEK_CHARS)
+            peeked = match and match.group(1)
+        else:
+            match = _TYPE_BYTES.search(message, 0, _PEEK_CHARS)
+            peeked = match and match.group(1).decode()
+        if peeked and peeked not in self._decoders:
+            self.skipped += 1
+            return None
+        data = _loads(message)
+        decoder = self._decoders.get(data.get("type"))
+        if decoder is None:
+            self.skipped += 1
+            return None
+        return decoder(data)
+
+    async def dispatch(self, event: RealtimeEvent):
+        for handler in list(self._handlers.get(type(event), ())):
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception(f"Handler for [{type(event).__name__}] failed")
+        for stream in self._streams:
+            if not stream.event_types or isinstance(event, stream.event_types):
+                stream._put(event)
+
+    def close(self):
+        """End every subscribed stream, e.g. when the connection is gone."""
+        for stream in list(self._streams):
+            stream.close()
+        self._partial_transcripts.clear()
+
+    # Decoders, one per routed event type
+
+    def _speech_started(self, data: dict) -> SpeechStarted:
+        return SpeechStarted(data.get("item_id"), data.get("audio_start_ms"))
+
+    def _speech_stopped(self, data: dict) -> SpeechStopped:
+        return SpeechStopped(data.get("item_id"), data.get("audio_end_ms"), time.perf_counter())
+
+    def _audio_committed(self, data: dict) -> AudioCommitted:
+        return AudioCommitted(data.get("item_id"))
+
+    def _transcript_delta(self, data: dict) -> TranscriptDelta:
+        item_id = data.get("item_id")
+        delta = data.get("delta", "")
+        transcript = self._partial_transcripts.get(item_id, "") + delta
+        self._partial_transcripts[item_id] = transcript
+        return TranscriptDelta(item_id, delta, transcript, data.get("logprobs") if self.logprobs else None)
+
+    def _transcript_completed(self, data: dict) -> TranscriptCompleted:
+        item_id = data.get("item_id")
+        self._partial_transcripts.pop(item_id, None)
+        return TranscriptCompleted(item_id, data.get("transcript", ""), data.get("logprobs") if self.logprobs else None)
+
+    def _error(self, data: dict) -> RealtimeError:
+        error = data.get("error") or {}
+        return RealtimeError(error.get("type"), error.get("code"), error.get("message", ""), error.get("event_id"))
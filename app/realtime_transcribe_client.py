@@ -1,43 +1,140 @@
 
 import websockets
 import json
-import base64
 from pathlib import Path
 import websockets
 from fastapi import WebSocket
+from websockets.protocol import State
 import os
+import time
+import random
+import asyncio
+import inspect
 import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Union
+
+from app import config
+from app.metrics import REGISTRY
+from app.realtime_events import (
+    AppendEventEncoder,
+    AudioCommitted,
+    Buffer,
+    RealtimeError,
+    RealtimeEventRouter,
+    SpeechStarted,
+    SpeechStopped,
+    TranscriptCompleted,
+    TranscriptDelta,
+)
 
 logger = logging.getLogger(__name__)
 
+# Checked when a client is created, so the local engines run without one
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("Missing OpenAI API key.")
 
 # Replace with your actual OpenAI API key
 API_KEY = OPENAI_API_KEY
-OPENAI_REALTIME_URI = "wss://api.openai.com/v1/realtime"
+# Overridable, e.g. to point at a local stand-in for load tests
+OPENAI_REALTIME_URI = os.getenv("OPENAI_REALTIME_URI", "wss://api.openai.com/v1/realtime")
+
+# Called without arguments, may be sync or async
+EventCallback = Callable[[], Union[None, Awaitable[None]]]
+
+REALTIME_RECONNECTS = REGISTRY.counter(
+    "voice_agent_realtime_reconnects", "Realtime transcription sockets reopened after a drop, by result", ["result"]
+)
+REALTIME_RECONNECT_SECONDS = REGISTRY.summary(
+    "voice_agent_realtime_reconnect_seconds", "From a dropped realtime socket to its audio replayed on a new one"
+)
+# Replay buffer entry where a turn was committed
+_COMMIT = None
+# Audio kept for replay while nobody speaks, covers the server VAD's prefix padding
+_IDLE_REPLAY_BYTES = 24000 * 2
 
 
 class RealtimeTranscribeClient:
     def __init__(self, api_key: str, transcribe_model: str = "gpt-4o-mini-transcribe"):
+        if not api_key:
+            raise ValueError("Missing OpenAI API key.")
         self.api_key = api_key
-        self.base_uri = "wss://api.openai.com/v1/realtime"
+        self.base_uri = OPENAI_REALTIME_URI
         self.transcribe_model = transcribe_model
         self.openai_ws = None
         self.input_audio_format = "pcm16"
+        self.connected_at = None
+        # perf_counter() of the last VAD speech_stopped, the start of turn latency
+        self.speech_stopped_at = None
+        # None when turns are detected locally and committed with `commit_audio`
+        self.turn_detection = {
+            "type": "server_vad",
+            "threshold": 0.5,
+            "prefix_padding_ms": 300,
+            "silence_duration_ms": 500,
+        }
+        # VAD hooks, e.g. to interrupt the agent when the user starts speaking
+        self.on_speech_started: Optional[EventCallback] = None
+        self.on_speech_stopped: Optional[EventCallback] = None
+        # Called with the transcript so far of the turn being transcribed
+        self.on_transcript_delta: Optional[Callable[[str], Union[None, Awaitable[None]]]] = None
+        self._append_encoder = AppendEventEncoder()
+        # Server events by type, other stages can add handlers or `subscribe` to a stream
+        self.events = RealtimeEventRouter()
+        self.events.on(SpeechStarted, self._on_speech_started)
+        self.events.on(SpeechStopped, self._on_speech_stopped)
+        self.events.on(TranscriptDelta, self._on_transcript_delta)
+        self.events.on(RealtimeError, self._on_error)
+
+        # Audio not transcribed yet, with `_COMMIT` where turns end, to replay after a reconnect
+        self.reconnect_attempts = config.REALTIME_RECONNECT_ATTEMPTS
+        self.replay_max_bytes = config.REALTIME_REPLAY_MAX_MS * 24000 * 2 // 1000
+        self._replay: Deque[Optional[bytes]] = deque()
+        self._replay_bytes = 0
+        # Entries ever buffered, so positions survive trimming from the left
+        self._replay_count = 0
+        # Commits in the buffer, and those trimmed from it whose transcript hasn't arrived
+        self._replay_commits = 0
+        self._replay_lost_commits = 0
+        # Between the server VAD's speech_started and its commit
+        self._in_speech = False
+        # Commits sent by this client, the server's `committed` events for them add no marker
+        self._own_commits = 0
+        self._reconnecting = False
+        self._closing = False
+        self.reconnects = 0
+        self.events.on(AudioCommitted, self._on_audio_committed)
+        self.events.on(TranscriptCompleted, self._on_transcript_completed)
 
     async def connect(self):
         logger.info("Connected to OpenAI Realtime API!")
+        self._closing = False
+        await self._open()
+
+    async def _open(self):
         headers = {"Authorization": f"Bearer {self.api_key}", "OpenAI-Beta": "realtime=v1"}
         url = f"{self.base_uri}?intent=transcription"  # &model=gpt-4o-realtime-preview-2024-10-01
 
-        self.openai_ws = await websockets.connect(url, additional_headers=headers)
+        self.openai_ws = await websockets.connect(
+            url, additional_headers=headers, open_timeout=config.REALTIME_CONNECT_TIMEOUT_S
+        )
+        self.connected_at = time.monotonic()
 
         # Set up default transcription session configure
         await self.setup_transcribe_session()
 
+    @property
+    def is_open(self) -> bool:
+        return self.openai_ws is not None and self.openai_ws.state is State.OPEN
+
+    async def close(self):
+        self._closing = True
+        if self.openai_ws is not None:
+            await self.openai_ws.close()
+
     async def setup_transcribe_session(self):
+        await self._update_session(self.turn_detection)
+
+    async def _update_session(self, turn_detection: Optional[dict]):
         logger.info("Setup the transcription session")
 
         session_config = {
@@ -50,64 +147,220 @@ class RealtimeTranscribeClient:
                     "prompt": "Transcribe the incoming audio in real time. language English",
                     "language": "en",
                 },
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 500,
-                },
+                "turn_detection": turn_detection,
                 "input_audio_noise_reduction": {"type": "near_field"},
-                "include": [
-                    "item.input_audio_transcription.logprobs",
-                ],
             },
         }
+        if self.events.logprobs:
+            session_config["session"]["include"] = ["item.input_audio_transcription.logprobs"]
 
         await self.openai_ws.send(json.dumps(session_config))
 
+    async def set_turn_detection(self, turn_detection: Optional[dict]):
+        """Reconfigure turn detection on the live session, None disables the server VAD."""
+        self.turn_detection = turn_detection
+        if not self._reconnecting:
+            # Otherwise applied when the new socket is set up
+            await self._send_or_defer(self.setup_transcribe_session())
+
+    async def commit_audio(self) -> None:
+        """End the current turn: the server transcribes the audio appended so far."""
+        self._buffer(_COMMIT)
+        if not self._reconnecting:
+            self._own_commits += 1
+            # Otherwise committed when the buffered audio is replayed
+            await self._send_or_defer(self.openai_ws.send(json.dumps({"type": "input_audio_buffer.commit"})))
+
     async def stream_audio(self, audio_chunk: bytes) -> None:
         """Stream raw audio data to the API."""
-        audio_b64 = base64.b64encode(audio_chunk).decode()
+        self._buffer(audio_chunk)
+        if self._reconnecting:
+            return
+        append_event = self._append_encoder.encode(audio_chunk)
+        # The event is framed (copied) before `send` yields, so the encoder's buffer can be reused
+        await self._send_or_defer(self.openai_ws.send(append_event, text=True))
+
+    async def _send_or_defer(self, send: Awaitable):
+        try:
+            await send
+        except websockets.ConnectionClosed:
+            # `receive_messages` reconnects and replays what was buffered, this included
+            if self._closing or not self.reconnect_attempts:
+                raise
+
+    def _buffer(self, entry: Optional[Buffer]):
+        if not self.reconnect_attempts:
+            # Never replayed
+            return
+        if entry is not _COMMIT and not isinstance(entry, bytes):
+            # The caller may reuse its buffer
+            entry = bytes(entry)
+        self._replay.append(entry)
+        self._replay_count += 1
+        if entry is _COMMIT:
+            self._replay_commits += 1
+        else:
+            self._replay_bytes += len(entry)
+        limit = self.replay_max_bytes
+        if self.turn_detection is not None and not self._in_speech and not self._replay_commits:
+            # Nothing said since the last turn: the server VAD only needs its prefix padding of it
+            limit = min(limit, _IDLE_REPLAY_BYTES)
+        while self._replay_bytes > limit:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        entry = self._replay.popleft()
+        if entry is _COMMIT:
+            self._replay_commits -= 1
+            self._replay_lost_commits += 1
+        else:
+            self._replay_bytes -= len(entry)
+
+    def _on_audio_committed(self, event: AudioCommitted):
+        self._in_speech = False
+        if self._own_commits:
+            self._own_commits -= 1
+        else:
+            # Committed by the server VAD: the turn ends here, give or take the audio in flight
+            self._buffer(_COMMIT)
 
-        append_event = {"type": "input_audio_buffer.append", "audio": audio_b64}
-        await self.openai_ws.send(json.dumps(append_event))
+    def _on_transcript_completed(self, event: TranscriptCompleted):
+        # The oldest committed turn is done, it needn't be replayed any more
+        if self._replay_lost_commits:
+            self._replay_lost_commits -= 1
+            return
+        if not self._replay_commits:
+            return
+        while self._replay:
+            if self._replay[0] is _COMMIT:
+                self._replay.popleft()
+                self._replay_commits -= 1
+                return
+            self._drop_oldest()
 
     async def receive_messages(self):
+        """Route server events until the connection closes, yielding the completed transcripts.
+
+        A socket that drops mid-call is reopened, see `_reconnect`, and the events go on.
+        """
         try:
-            async for message in self.openai_ws:
+            while True:
+                try:
+                    # Undecoded, routing skips most events without turning them into str or JSON
+                    message = await self.openai_ws.recv(decode=False)
+                except websockets.ConnectionClosed as e:
+                    if self._closing or not await self._reconnect(e):
+                        raise
+                    continue
                 try:
-                    data = json.loads(message)
-                    event_type = data.get("type")
+                    event = self.events.decode(message)
+                except ValueError as ex:
+                    logger.warning(f"Undecodable realtime event: {ex}")
+                    continue
+                if event is None:
+                    continue
+                await self.events.dispatch(event)
+                if isinstance(event, TranscriptCompleted):
+                    logger.info("[Transcription completed]")
+                    yield event.transcript
+        except websockets.ConnectionClosed as e:
+            logger.info(f"Realtime connection closed: {e}")
+        except Exception:
+            logger.exception("Error receiving realtime events")
+        finally:
+            self.events.close()
+
+    async def _reconnect(self, reason: Exception) -> bool:
+        """Open a new socket and replay the buffered audio, with exponential backoff between tries.
 
-                    if event_type == "error":
-                        logger.info(f"Error: {data['error']}")
-                        continue
+        Audio streamed and turns committed meanwhile are only buffered. Replayed turns are
+        committed explicitly with the server VAD off, so they end where they ended before.
+        Transcripts of turns committed but not transcribed on the old socket come from the new one.
+        """
+        self._reconnecting = True
+        dropped_at = time.perf_counter()
+        logger.warning(f"Realtime connection lost ({reason}), reconnecting")
+        try:
+            for attempt in range(self.reconnect_attempts):
+                backoff_ms = min(
+                    config.REALTIME_RECONNECT_BACKOFF_MS * 2**attempt, config.REALTIME_RECONNECT_MAX_BACKOFF_MS
+                )
+                # Jittered, so sessions dropped together don't reconnect in lockstep
+                await asyncio.sleep(backoff_ms * random.uniform(0.5, 1.0) / 1000)
+                if self._closing:
+                    return False
+                try:
+                    await self._open()
+                    await self._replay_buffered()
+                except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                    logger.warning(f"Realtime reconnect attempt [{attempt + 1}] failed: {e!r}")
+                    continue
+                self.reconnects += 1
+                REALTIME_RECONNECTS.labels(result="ok").inc()
+                REALTIME_RECONNECT_SECONDS.observe(time.perf_counter() - dropped_at)
+                logger.info(
+                    f"Realtime connection reopened after [{(time.perf_counter() - dropped_at) * 1000:.0f}]ms, "
+                    f"replayed [{self._replay_bytes * 1000 // (24000 * 2)}]ms of audio"
+                )
+                return True
+            REALTIME_RECONNECTS.labels(result="failed").inc()
+            logger.error(f"Realtime connection not reopened after [{self.reconnect_attempts}] attempts")
+            return False
+        finally:
+            self._reconnecting = False
 
-                    # Handle interruptions
-                    elif event_type == "input_audio_buffer.speech_started":
-                        logger.info("\n[Speech detected]")
+    async def _replay_buffered(self):
+        # Nothing sent on the old socket is pending on this one
+        self._own_commits = 0
+        # `_open` set the session up with the current turn detection, replayed turns are committed
+        # with it off
+        turns = self._replay_commits
+        vad_off = turns > 0 and self.turn_detection is not None
+        if vad_off:
+            await self._update_session(None)
 
-                    elif event_type == "input_audio_buffer.speech_stopped":
-                        logger.info("\n[Speech ended]")
+        position = self._replay_count - len(self._replay)
+        # More audio is buffered while this awaits, and old entries may be trimmed
+        while True:
+            first = self._replay_count - len(self._replay)
+            position = max(position, first)
+            if position >= self._replay_count:
+                break
+            entry = self._replay[position - first]
+            position += 1
+            if entry is not _COMMIT:
+                await self.openai_ws.send(self._append_encoder.encode(entry), text=True)
+                continue
+            self._own_commits += 1
+            await self.openai_ws.send(json.dumps({"type": "input_audio_buffer.commit"}))
+            turns -= 1
+            if vad_off and turns <= 0:
+                # The audio after the last turn is up to the server VAD again
+                vad_off = False
+                await self.setup_transcribe_session()
+        if vad_off:
+            await self.setup_transcribe_session()
 
-                    # Handle input audio transcription
-                    elif event_type == "conversation.item.input_audio_transcription.completed":
-                        logger.info(f"\n[Transcription completed]")
-                        transcript = data.get("transcript", "")
+    async def _on_speech_started(self, event: SpeechStarted):
+        logger.info("[Speech detected]")
+        self._in_speech = True
+        await self._notify(self.on_speech_started)
 
-                        yield transcript  # Yield the transcript here
+    async def _on_speech_stopped(self, event: SpeechStopped):
+        logger.info("[Speech ended]")
+        self.speech_stopped_at = event.at
+        await self._notify(self.on_speech_stopped)
 
-                    elif event_type == "conversation.item.input_audio_transcription.delta":
-                        logger.debug(f"\n[Transcription delta]")
-                        # delta = data.get("delta", "")
-                        # logger.info("Transcription delta: %s", delta)
-                        # final_transcription += delta
-                        pass
+    async def _on_transcript_delta(self, event: TranscriptDelta):
+        await self._notify(self.on_transcript_delta, event.transcript)
 
-                    else:
-                        pass
+    def _on_error(self, event: RealtimeError):
+        logger.warning(f"Realtime API error [{event.code or event.type}]: {event.message}")
 
-                except Exception as ex:
-                    logger.info("Error processing message: %s", ex)
-        except Exception as e:
-            logger.info("Error receiving events: %s", e)
+    @staticmethod
+    async def _notify(callback: Optional[Callable], *args):
+        if callback is None:
+            return
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import IO, Dict, List, Optional, Tuple
+
+from app import config
+from app.audio_utils import pcm_to_wave
+
+logger = logging.getLogger(__name__)
+
+# Queue operations
+_APPEND = "append"
+_CLOSE = "close"
+_SAVE_WAV = "save_wav"
+
+
+class SessionRecorder:
+    """Process-wide background writer for session recordings.
+
+    The realtime path only enqueues `(op, path, data)` items; one writer task drains the bounded
+    queue in batches and does the file work (including WAV packing) in a worker thread, so a slow
+    disk never delays audio streaming. When the queue is full, policy `"drop"` discards the item
+    (and counts it) while `"block"` waits for room.
+    """
+
+    def __init__(self, max_queue: int = 1024, policy: str = "drop", max_batch: int = 256):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown recorder policy [{policy}]")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.max_batch = max_batch
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        # Only touched from the writer thread
+        self._files: Dict[str, IO] = {}
+
+        self.dropped = 0
+        self.written_bytes = 0
+
+    def start(self):
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue(self.max_queue)
+            self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far and close open files."""
+        if self._writer is None:
+            return
+        await self._queue.put(None)
+        await self._writer
+        self._writer = None
+        await asyncio.to_thread(self._close_all)
+
+    async def record(self, path: str, data: bytes):
+        """Append `data` to `path`, the file stays open until `finish`."""
+        await self._put((_APPEND, path, bytes(data)))
+
+    async def finish(self, path: str):
+        # Never dropped, or the file handle would leak
+        await self._put((_CLOSE, path, None), block=True)
+
+    async def save_wav(self, path: str, pcm: bytes):
+        """Write `pcm` (24kHz, 16-bit, mono) as a WAV file."""
+        await self._put((_SAVE_WAV, path, bytes(pcm)))
+
+    async def _put(self, item: Tuple[str, str, Optional[bytes]], block: bool = False):
+        self.start()
+        if block or self.policy == "block":
+            await self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Recorder queue full, dropped [{self.dropped}] writes so far")
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[str, str, Optional[bytes]]] = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Recorder failed to write batch: {e!r}")
+
+    def _write_batch(self, batch: List[Tuple[str, str, Optional[bytes]]]):
+        # Coalesce consecutive appends to the same file into one write
+        pending: Dict[str, List[bytes]] = defaultdict(list)
+        for op, path, data in batch:
+            if op == _APPEND:
+                pending[path].append(data)
+                continue
+
+            self._flush(path, pending.pop(path, None))
+            if op == _CLOSE:
+                f = self._files.pop(path, None)
+                if f:
+                    f.close()
+            elif op == _SAVE_WAV:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                wav_data = pcm_to_wave(data)
+                with open(path, "wb") as f:
+                    f.write(wav_data)
+                self.written_bytes += len(wav_data)
+
+        for path, chunks in pending.items():
+            self._flush(path, chunks)
+
+    def _flush(self, path: str, chunks: Optional[List[bytes]]):
+        if not chunks:
+            return
+        f = self._files.get(path)
+        if f is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            f = self._files[path] = open(path, "wb")
+        data = b"".join(chunks)
+        f.write(data)
+        self.written_bytes += len(data)
+
+    def _close_all(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+_recorder: Optional[SessionRecorder] = None
+
+
+def get_recorder() -> SessionRecorder:
+    """The process-wide recorder."""
+    global _recorder
+    if _recorder is None:
+        _recorder = SessionRecorder(max_queue=config.RECORDER_QUEUE_SIZE, policy=config.RECORDER_POLICY)
+    return _recorder
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from app import config
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = REGISTRY.counter("voice_agent_response_cache", "Response cache lookups by result", ["result"])
+CACHE_BYTES = REGISTRY.gauge("voice_agent_response_cache_bytes", "Bytes held by the in-memory response cache")
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(text: str) -> str:
+    """Case, punctuation and whitespace insensitive form of a transcript: "Hello!" == "hello"."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+@dataclass
+class CachedResponse:
+    text: str
+    # PCM16 24kHz mono, as streamed by the speech API
+    audio: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.audio) + len(self.text.encode())
+
+
+class ResponseCache:
+    """Turn-level cache: normalized transcript -> LLM answer text and its synthesized PCM.
+
+    The memory tier is an LRU bounded by `max_bytes`; entries larger than `max_entry_bytes` are not
+    cached so one long answer can't flush everything else. With `disk_dir`, entries are also
+    written there (one file per key: a JSON header line followed by the PCM) and read back on a
+    memory miss, bounded by `disk_max_bytes` with oldest-first eviction.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 2**20,
+        max_entry_bytes: int = None,
+        disk_dir: str = None,
+        disk_max_bytes: int = 2**30,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max(1, max_bytes // 8)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._disk_sizes: Dict[str, int] = {}
+        # The disk index is updated from worker threads
+        self._disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            entries = sorted(os.scandir(disk_dir), key=lambda e: e.stat().st_mtime)
+            self._disk_sizes = {e.name: e.stat().st_size for e in entries if e.name.endswith(".pcm")}
+
+    @staticmethod
+    def make_key(transcript: str, **params) -> str:
+        """Key on the normalized transcript plus everything that changes the answer or the voice."""
+        payload = json.dumps({"transcript": normalize_transcript(transcript), **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        response = self._entries.get(key)
+        if response is not None:
+            self._entries.move_to_end(key)
+        elif self.disk_dir and f"{key}.pcm" in self._disk_sizes:
+            response = await asyncio.to_thread(self._read_disk, key)
+            if response is not None:
+                self._put_memory(key, response)
+
+        CACHE_LOOKUPS.labels(result="hit" if response is not None else "miss").inc()
+        return response
+
+    async def put(self, key: str, response: CachedResponse):
+        if response.size > self.max_entry_bytes or not response.audio:
+            return
+        self._put_memory(key, response)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, response)
+
+    def _put_memory(self, key: str, response: CachedResponse):
+        if response.size > self.max_entry_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[key] = response
+        self._bytes += response.size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+        CACHE_BYTES.set(self._bytes)
+
+    def _read_disk(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(os.path.join(self.disk_dir, f"{key}.pcm"), "rb") as f:
+                header = json.loads(f.readline())
+                return CachedResponse(text=header["text"], audio=f.read())
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to read cached response [{key}]: {e!r}")
+            with self._disk_lock:
+                self._disk_sizes.pop(f"{key}.pcm", None)
+            return None
+
+    def _write_disk(self, key: str, response: CachedResponse):
+        name = f"{key}.pcm"
+        path = os.path.join(self.disk_dir, name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"text": response.text}).encode() + b"\n")
+            f.write(response.audio)
+        os.replace(tmp_path, path)
+
+        with self._disk_lock:
+            self._disk_sizes.pop(name, None)
+            self._disk_sizes[name] = os.path.getsize(path)
+            # Dicts keep insertion order: oldest first
+            while sum(self._disk_sizes.values()) > self.disk_max_bytes and len(self._disk_sizes) > 1:
+                oldest = next(iter(self._disk_sizes))
+                self._disk_sizes.pop(oldest)
+                try:
+                    os.remove(os.path.join(self.disk_dir, oldest))
+                except OSError:
+                    pass
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The process-wide cache, or None when disabled."""
+    global _cache
+    if _cache is None and config.RESPONSE_CACHE_MAX_BYTES > 0:
+        _cache = ResponseCache(
+            max_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+            disk_dir=config.RESPONSE_CACHE_DIR,
+            disk_max_bytes=config.RESPONSE_CACHE_DISK_MAX_BYTES,
+        )
+    return _cache
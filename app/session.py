@@ -0,0 +1,378 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+from fastapi import WebSocket
+
+from app import config
+from app.admission import AdmissionRejected
+from app.audio_buffer import SessionAudioBuffer
+from app.egress import PacedWebSocket
+from app.recorder import get_recorder
+from app.frame_aggregator import FrameAggregator
+from app.metrics import TurnTimings
+from app.playback import PlaybackTracker
+from app.providers import STTSession
+from app.session_options import SessionOptions
+from app.session_registry import get_session_registry
+from app.speculation import SPECULATION_SAVED_SECONDS, SPECULATION_TOTAL, Speculation
+from app.vad import VadGate
+from app.voice_agent import VoiceAgent
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceSession:
+    """One caller: client audio -> streaming STT -> LLM -> TTS -> client audio.
+
+    client -> stream -> audio_buffer
+    async text = stt_handler(audio_buffer)
+    async text = llm_handler(text)
+    async audio = tts_handler(text)
+    audio -> stream -> client
+
+    Each reply runs as its own task so it can be cancelled when the user starts talking over it
+    (barge-in): the LLM stream and TTS response are closed, queued segments are dropped and the
+    client is told to flush its playback buffer with a `{"event": "clear"}` message.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        websocket: WebSocket,
+        agent: VoiceAgent,
+        transcribe_client: STTSession,
+        session_dir: str,
+        options: SessionOptions = None,
+    ):
+        self.session_id = session_id
+        self.options = options or SessionOptions()
+        # Replies are paced to the client, see `app.egress`
+        self.websocket = PacedWebSocket(websocket, self.options.egress)
+        self.agent = agent
+        self.transcribe_client = transcribe_client
+        self.session_dir = session_dir
+
+        self.response_task: Optional[asyncio.Task] = None
+        # Transcript the current reply answers
+        self.response_input: Optional[str] = None
+        self.playback: Optional[PlaybackTracker] = None
+        self.interruptions = []
+        # Barge-in and a new turn may both interrupt at once
+        self._interrupt_lock = asyncio.Lock()
+        # LLM answer started on a partial transcript, see `on_speech_stopped`
+        self.speculation: Optional[Speculation] = None
+        self._speculation_timer: Optional[asyncio.TimerHandle] = None
+        # The current turn's transcript so far, and whether its speech has stopped
+        self._partial = ""
+        self._speech_stopped = False
+
+        self.transcribe_client.on_speech_started = self.on_speech_started
+        if self.options.speculative:
+            self.transcribe_client.on_transcript_delta = self.on_transcript_delta
+            self.transcribe_client.on_speech_stopped = self.on_speech_stopped
+
+        # client frames -> aggregator -> [local VAD] -> transcription socket
+        upstream = self.transcribe_client.stream_audio
+        self.vad: Optional[VadGate] = None
+        if self.options.vad is not None:
+            self.vad = VadGate(upstream, commit=self.transcribe_client.commit_audio, settings=self.options.vad)
+            self.vad.on_speech_started = self.on_speech_started
+            self.vad.on_speech_stopped = self.on_local_speech_stopped
+            upstream = self.vad.process
+        self.frame_aggregator = FrameAggregator(
+            upstream,
+            target_ms=config.FRAME_AGGREGATE_MS,
+            max_latency_ms=config.FRAME_MAX_LATENCY_MS,
+        )
+
+    async def run(self):
+        await self.load_conversation()
+        if self.vad is not None and self.vad.settings.mode == "local":
+            # Turns are committed by the local VAD
+            await self.transcribe_client.set_turn_detection(None)
+
+        tasks = [
+            asyncio.create_task(self.receive_audio_stream_from_client()),
+            asyncio.create_task(self.send_audio_stream_to_client()),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # Surface errors
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.response_task is not None:
+                self.response_task.cancel()
+            self._take_speculation(None)
+            await self.websocket.stop()
+            logger.info(f"Session[{self.session_id}] egress {self.websocket.stats()}")
+
+    async def receive_audio_stream_from_client(self):
+        audio_buffer = SessionAudioBuffer(max_duration_s=config.SESSION_AUDIO_MAX_S)
+        seq = 0
+        audio_in_filepath = os.path.join(self.session_dir, "{}_{}_16_24kHZ_mono.wav".format(seq, "in"))
+
+        # TODO: use  state machine to fine control
+        while True:
+            message = await self.websocket.receive()
+            # logger.debug(f"message: {message}")
+
+            if message["type"] == "websocket.disconnect":
+                logger.info(f"Session[{self.session_id}] client disconnected")
+                await self.frame_aggregator.close()
+                if self.vad is not None:
+                    logger.info(f"Session[{self.session_id}] local VAD forwarded [{self.vad.bytes_out}/{self.vad.bytes_in}] bytes")
+                return
+
+            # TODO: Validate the message
+            if message.get("bytes") is not None:
+                audio_data = message["bytes"]
+                audio_buffer.append(audio_data)
+                # Write audio to file
+                # await audio_file.write(audio_buffer)
+                # 1. SST start here, use Realtime API to transcribe the ongoing audio, like
+                logger.debug("SST start...")
+
+                # TODO: Should We transfer all the incoming audio to the OpenAI realtime transcription?
+                await self.frame_aggregator.push(audio_data)
+                continue
+
+            if message.get("text") is not None:
+                data = json.loads(message["text"])
+
+                if data.get("event") == "end":
+                    # Don't hold back the tail of the recording
+                    await self.frame_aggregator.flush()
+
+                    # TODO: Check input audio
+
+                    # Save input audio to file, in the background
+                    pcm = audio_buffer.getvalue()
+                    if config.RECORDING_ENABLED:
+                        await get_recorder().save_wav(audio_in_filepath, pcm)
+
+                    logger.info(f"Save audio buffer size[{len(pcm)}] and audio file to [{audio_in_filepath}]")
+                    if audio_buffer.dropped_bytes:
+                        logger.warning(
+                            f"Turn longer than [{config.SESSION_AUDIO_MAX_S}]s, dropped [{audio_buffer.dropped_bytes}] bytes"
+                        )
+
+                    # Create next
+                    audio_buffer.clear()
+                    seq += 1
+                    audio_in_filepath = os.path.join(self.session_dir, "{}_{}_16_24kHZ_mono.wav".format(seq, "in"))
+
+                elif data.get("event") == "playback_cleared":
+                    # Client's own account of what it played before flushing
+                    logger.info(f"Session[{self.session_id}] client played [{data.get('played_ms')}]ms before clear")
+
+    async def send_audio_stream_to_client(self):
+        seq = 0
+
+        async for transcribed_text in self.transcribe_client.receive_messages():
+            logger.info(f"transcribed_text: {transcribed_text}")
+
+            timings = TurnTimings(self.session_id)
+            if self.transcribe_client.speech_stopped_at is not None:
+                timings.mark("speech_stopped", at=self.transcribe_client.speech_stopped_at)
+                self.transcribe_client.speech_stopped_at = None
+            timings.mark("transcription_completed")
+
+            audio_out_filepath = None
+            if config.RECORDING_ENABLED:
+                audio_out_filepath = os.path.join(self.session_dir, "{}_{}.pcm".format(seq, "out"))
+            seq += 1
+
+            # A new turn supersedes whatever is still being spoken
+            await self.interrupt()
+            speculation = self._take_speculation(transcribed_text)
+
+            # Don't wait for the reply here: keep consuming transcription events so that
+            # speech_started can interrupt it.
+            self.playback = PlaybackTracker()
+            self.websocket.begin_reply(self.playback)
+            self.response_input = transcribed_text
+            self.response_task = asyncio.create_task(
+                self.respond(transcribed_text, audio_out_filepath, self.playback, timings, speculation)
+            )
+            self.response_task.add_done_callback(self._on_response_done)
+
+    async def respond(
+        self,
+        transcribed_text: str,
+        audio_out_filepath: str,
+        playback: PlaybackTracker,
+        timings: TurnTimings,
+        speculation: Optional[Speculation] = None,
+    ) -> str:
+        try:
+            response_text = await self._respond(transcribed_text, audio_out_filepath, playback, timings, speculation)
+        except asyncio.CancelledError:
+            timings.observe("interrupted")
+            raise
+        except AdmissionRejected:
+            timings.observe("rejected")
+            raise
+        except Exception:
+            timings.observe("failed")
+            raise
+        finally:
+            # Unused on a response cache hit
+            if speculation is not None:
+                speculation.cancel()
+        timings.observe("completed")
+        if self.agent.conversation is not None:
+            self.agent.conversation.add_turn(transcribed_text, response_text)
+            # Recorded, an interruption from here on only shortens it
+            self.response_input = None
+            await self.save_conversation()
+        return response_text
+
+    async def _respond(
+        self,
+        transcribed_text: str,
+        audio_out_filepath: str,
+        playback: PlaybackTracker,
+        timings: TurnTimings,
+        speculation: Optional[Speculation] = None,
+    ) -> str:
+        # 2 LLM + 3 TTS, pipelined per sentence unless the agent says otherwise
+        logger.info("LLM -> TTS start...")
+        response_text = await self.agent.respond_websocket(
+            user_input=transcribed_text,
+            ws=self.websocket,
+            output_path=audio_out_filepath,
+            playback=playback,
+            timings=timings,
+            speculation=speculation,
+        )
+        logger.info(f"llm_response_text: {response_text}")
+        return response_text
+
+    def _on_response_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Session[{self.session_id}] reply failed: {task.exception()!r}")
+
+    def on_transcript_delta(self, partial: str):
+        self._partial = partial
+        if not self._speech_stopped:
+            # Still speaking: wait for the stop, see `on_speech_stopped`
+            return
+        # Transcribed after the stop: speculate again once this burst of deltas pauses
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+        self._speculation_timer = asyncio.get_running_loop().call_later(
+            config.SPECULATION_DEBOUNCE_MS / 1000, self._speculate, partial
+        )
+
+    async def on_speech_stopped(self):
+        """Speculate on the transcript so far, the final one is still a commit and a transcription away."""
+        self._speech_stopped = True
+        if self.options.speculative and self._partial:
+            self._speculate(self._partial)
+
+    def _speculate(self, partial: str):
+        self._speculation_timer = None
+        if self.speculation is not None:
+            if self.speculation.user_input == partial:
+                return
+            self.speculation.cancel()
+            SPECULATION_TOTAL.labels(result="restart").inc()
+        logger.info(f"Session[{self.session_id}] speculative LLM start on: {partial}")
+        self.speculation = Speculation(self.agent, partial)
+
+    def _take_speculation(self, transcript: Optional[str]) -> Optional[Speculation]:
+        """The speculation, if its answer fits the final `transcript`; cancelled otherwise."""
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        self._partial = ""
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if transcript is not None and speculation.matches(transcript, config.SPECULATION_MIN_SIMILARITY):
+            SPECULATION_TOTAL.labels(result="hit").inc()
+            SPECULATION_SAVED_SECONDS.observe(time.perf_counter() - speculation.started_at)
+            return speculation
+        speculation.cancel()
+        SPECULATION_TOTAL.labels(result="miss" if transcript is not None else "unused").inc()
+        return None
+
+    async def on_speech_started(self):
+        self._speech_stopped = False
+        await self.interrupt()
+
+    async def on_local_speech_stopped(self):
+        # Turn latency starts here when the server VAD is off
+        self.transcribe_client.speech_stopped_at = time.perf_counter()
+        await self.on_speech_stopped()
+
+    def _conversation_key(self) -> Optional[str]:
+        if self.agent.conversation is None or not self.options.conversation_id:
+            return None
+        return f"conversation:{self.options.conversation_id}"
+
+    async def load_conversation(self):
+        """Resume the requested conversation, or start one under an id issued to the client."""
+        if self.agent.conversation is None:
+            return
+        key = self._conversation_key()
+        state = await get_session_registry().get_state(key) if key is not None else None
+        if state:
+            self.agent.conversation.load(state)
+            logger.info(f"Session[{self.session_id}] resumed conversation [{self.options.conversation_id}]")
+        else:
+            # Only ids issued here are stored, so a client can't pick (or guess) another caller's
+            self.options.conversation_id = uuid.uuid4().hex
+        await self.websocket.send_text(
+            json.dumps({"event": "conversation", "conversation_id": self.options.conversation_id})
+        )
+
+    async def save_conversation(self):
+        if (key := self._conversation_key()) is not None:
+            await get_session_registry().set_state(
+                key, self.agent.conversation.to_dict(), ttl_s=config.CONVERSATION_TTL_S
+            )
+
+    async def interrupt(self):
+        """Stop the current reply, if any is still generating or playing on the client."""
+        async with self._interrupt_lock:
+            in_flight = self.response_task is not None and not self.response_task.done()
+            playing = self.playback is not None and self.playback.is_playing()
+            if not (in_flight or playing):
+                return
+
+            if in_flight:
+                self.response_task.cancel()
+                await asyncio.wait({self.response_task})
+            # The reply may have been wound down while this waited
+            if self.playback is None:
+                return
+
+            await self.websocket.send_text(json.dumps({"event": "clear"}))
+
+            playback, self.playback = self.playback, None
+            interruption = {
+                "played_ms": round(playback.played_ms),
+                "sent_ms": round(playback.sent_ms),
+                "played_text": playback.played_text(),
+            }
+            self.interruptions.append(interruption)
+            if self.agent.conversation is not None:
+                # Remember the reply only as far as the caller heard it
+                if in_flight and self.response_input is not None:
+                    self.agent.conversation.add_turn(self.response_input, playback.played_text(), interrupted=True)
+                else:
+                    self.agent.conversation.truncate_last_reply(playback.played_text())
+                await self.save_conversation()
+            logger.info(
+                f"Session[{self.session_id}] barge-in, played [{interruption['played_ms']}/{interruption['sent_ms']}]ms: "
+                f"{interruption['played_text']!r}"
+            )
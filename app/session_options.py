@@ -0,0 +1,74 @@
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+
+from app import config
+from app.codecs import CODEC_SAMPLE_RATES, CODECS, PIPELINE_SAMPLE_RATE, codec_available
+from app.egress import EgressSettings
+from app.providers import ENGINES
+from app.vad import VadSettings
+
+
+@dataclass
+class SessionOptions:
+    """Per-session settings, chosen by the client in the `/ws/audio` query string.
+
+    e.g. `/ws/audio?vad=local&vad_threshold_db=15&vad_max_silence_ms=600`,
+    `/ws/audio?engine=local`, `/ws/audio?stt=local&llm=openai&tts=openai` or
+    `/ws/audio?speculative=1&hedge=1` or `/ws/audio?codec=mulaw&codec_rate=8000`
+    """
+
+    # None keeps the server VAD only
+    vad: Optional[VadSettings] = None
+    # Backend of each stage, see `app.providers`
+    stt: str = field(default_factory=lambda: config.STT_ENGINE)
+    llm: str = field(default_factory=lambda: config.LLM_ENGINE)
+    tts: str = field(default_factory=lambda: config.TTS_ENGINE)
+    # Start the LLM on partial transcripts, see `app.speculation`
+    speculative: bool = field(default_factory=lambda: config.SPECULATIVE_LLM)
+    # Duplicate slow LLM / TTS requests, see `app.hedging`
+    hedge: bool = field(default_factory=lambda: config.HEDGE_REQUESTS)
+    # Client audio on the wire, both directions, see `app.codecs`
+    codec: str = "pcm"
+    codec_rate: int = PIPELINE_SAMPLE_RATE
+    # Pacing of reply audio, e.g. `?egress_lead_ms=300`
+    egress: EgressSettings = field(default_factory=EgressSettings)
+    # Resumes the conversation memory of an earlier session, e.g. on reconnect. Only ids the
+    # server issued (in its `conversation` event) are found, others start a new conversation.
+    conversation_id: Optional[str] = None
+
+    @classmethod
+    def from_query(cls, params: Mapping[str, str]) -> "SessionOptions":
+        options = cls()
+
+        vad_mode = params.get("vad", config.LOCAL_VAD)
+        if vad_mode in ("local", "gate"):
+            options.vad = VadSettings.from_query(params)
+            options.vad.mode = vad_mode
+        elif vad_mode != "off":
+            raise ValueError(f"Unknown vad mode [{vad_mode}]")
+
+        engine = params.get("engine")
+        for stage in ("stt", "llm", "tts"):
+            value = params.get(stage, engine or getattr(options, stage))
+            if value not in ENGINES:
+                raise ValueError(f"Unknown {stage} engine [{value}]")
+            setattr(options, stage, value)
+
+        options.codec = params.get("codec", options.codec)
+        if options.codec not in CODECS:
+            raise ValueError(f"Unknown codec [{options.codec}]")
+        if not codec_available(options.codec):
+            raise ValueError(f"Codec [{options.codec}] is not installed on this server")
+        options.codec_rate = int(params.get("codec_rate", options.codec_rate))
+        if options.codec_rate not in CODEC_SAMPLE_RATES:
+            raise ValueError(f"Unsupported codec_rate [{options.codec_rate}]")
+
+        options.egress = EgressSettings.from_query(params)
+
+        if "speculative" in params:
+            options.speculative = params["speculative"] in ("1", "true", "on")
+        if "hedge" in params:
+            options.hedge = params["hedge"] in ("1", "true", "on")
+        options.conversation_id = params.get("conversation_id") or None
+
+        return options
@@ -0,0 +1,273 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from app import config
+from app.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Identifies this serving process in the shared registry and in merged metrics
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionRegistry:
+    """Live sessions, per-key state and metrics shared by the serving processes.
+
+    A WebSocket session always stays on the process that accepted it; the registry is what the
+    processes share: session counts (for admission control), state that must outlive a process
+    (e.g. conversation memory when a caller reconnects elsewhere) and each process' metrics.
+    Every process heartbeats while it is up; sessions and metrics of processes that stopped
+    heartbeating are ignored.
+
+    This in-process implementation is used with a single worker.
+    """
+
+    shared = False
+
+    def __init__(self, heartbeat_s: float = 1.0):
+        self.heartbeat_s = heartbeat_s
+        self._sessions: Dict[str, dict] = {}
+        self._state: Dict[str, tuple] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        await self._remove_worker()
+
+    async def _run_heartbeat(self):
+        while True:
+            try:
+                await self._publish(REGISTRY.snapshot())
+            except Exception as e:
+                logger.warning(f"Session registry heartbeat failed: {e!r}")
+            await asyncio.sleep(self.heartbeat_s)
+
+    @property
+    def stale_after_s(self) -> float:
+        return 5 * self.heartbeat_s
+
+    async def register(self, session_id: str, info: dict):
+        self._sessions[session_id] = {"worker": WORKER_ID, **info}
+
+    async def unregister(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def count(self) -> int:
+        """Sessions open across all live workers."""
+        return len(self._sessions)
+
+    async def sessions(self) -> Dict[str, dict]:
+        return dict(self._sessions)
+
+    async def get_state(self, key: str):
+        value, expires_at = self._state.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            self._state.pop(key, None)
+            return None
+        return value
+
+    async def set_state(self, key: str, value, ttl_s: float = None):
+        """Store a JSON-serializable `value`, optionally expiring after `ttl_s`."""
+        self._state[key] = (value, time.time() + ttl_s if ttl_s else None)
+
+    async def delete_state(self, key: str):
+        self._state.pop(key, None)
+
+    async def metrics_snapshots(self) -> Dict[str, list]:
+        """`REGISTRY.snapshot()` of every live worker, by worker id."""
+        return {WORKER_ID: REGISTRY.snapshot()}
+
+    async def _publish(self, snapshot: list):
+        pass
+
+    async def _remove_worker(self):
+        pass
+
+
+class SQLiteSessionRegistry(SessionRegistry):
+    """Registry shared by the workers of one host through a SQLite file, a local Redis stand-in.
+
+    Point it at tmpfs (e.g. `/dev/shm`) to keep it in memory. Calls run in a thread.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, heartbeat_s: float = 1.0):
+        super().__init__(heartbeat_s)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, heartbeat REAL, metrics TEXT);
+            CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, worker TEXT, info TEXT);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT, expires_at REAL);
+            """
+        )
+
+    def _execute(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    async def _query(self, sql: str, params=()) -> list:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def register(self, session_id: str, info: dict):
+        await self._query(
+            "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, WORKER_ID, json.dumps(info))
+        )
+
+    async def unregister(self, session_id: str):
+        await self._query("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def count(self) -> int:
+        rows = await self._query(
+            "SELECT COUNT(*) FROM sessions JOIN workers USING (worker) WHERE heartbeat > ?",
+            (time.time() - self.stale_after_s,),
+        )
+        return rows[0][0]
+
+    async def sessions(self) -> Dict[str, dict]:
+        rows = await self._query(
+            "SELECT session_id, worker, info FROM sessions JOIN workers USING (worker) WHERE heartbeat > ?",
+            (time.time() - self.stale_after_s,),
+        )
+        return {session_id: {"worker": worker, **json.loads(info)} for session_id, worker, info in rows}
+
+    async def get_state(self, key: str):
+        rows = await self._query(
+            "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def set_state(self, key: str, value, ttl_s: float = None):
+        expires_at = time.time() + ttl_s if ttl_s else None
+        await self._query("INSERT OR REPLACE INTO state VALUES (?, ?, ?)", (key, json.dumps(value), expires_at))
+
+    async def delete_state(self, key: str):
+        await self._query("DELETE FROM state WHERE key = ?", (key,))
+
+    async def metrics_snapshots(self) -> Dict[str, list]:
+        rows = await self._query(
+            "SELECT worker, metrics FROM workers WHERE heartbeat > ? AND worker != ?",
+            (time.time() - self.stale_after_s, WORKER_ID),
+        )
+        snapshots = {worker: json.loads(metrics) for worker, metrics in rows}
+        # Our own, current rather than as of the last heartbeat
+        snapshots[WORKER_ID] = REGISTRY.snapshot()
+        return snapshots
+
+    async def _publish(self, snapshot: list):
+        now = time.time()
+        await self._query("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)", (WORKER_ID, now, json.dumps(snapshot)))
+        # Leftovers of crashed workers and expired state
+        await self._query("DELETE FROM workers WHERE heartbeat < ?", (now - 60,))
+        await self._query("DELETE FROM sessions WHERE worker NOT IN (SELECT worker FROM workers)")
+        await self._query("DELETE FROM state WHERE expires_at < ?", (now,))
+
+    async def _remove_worker(self):
+        await self._query("DELETE FROM sessions WHERE worker = ?", (WORKER_ID,))
+        await self._query("DELETE FROM workers WHERE worker = ?", (WORKER_ID,))
+
+
+class RedisSessionRegistry(SessionRegistry):
+    """Registry in Redis, shared by workers on any number of hosts. Needs the `redis` package."""
+
+    shared = True
+    prefix = "voice_agent:"
+
+    def __init__(self, url: str, heartbeat_s: float = 1.0):
+        import redis.asyncio as redis
+
+        super().__init__(heartbeat_s)
+        self.redis = redis.from_url(url)
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    async def _live_workers(self) -> set:
+        members = await self.redis.zrangebyscore(self._key("workers"), time.time() - self.stale_after_s, "+inf")
+        return {m.decode() for m in members}
+
+    async def register(self, session_id: str, info: dict):
+        await self.redis.hset(self._key("sessions"), session_id, json.dumps({"worker": WORKER_ID, **info}))
+
+    async def unregister(self, session_id: str):
+        await self.redis.hdel(self._key("sessions"), session_id)
+
+    async def sessions(self) -> Dict[str, dict]:
+        live = await self._live_workers()
+        sessions = {k.decode(): json.loads(v) for k, v in (await self.redis.hgetall(self._key("sessions"))).items()}
+        return {k: v for k, v in sessions.items() if v["worker"] in live}
+
+    async def count(self) -> int:
+        return len(await self.sessions())
+
+    async def get_state(self, key: str):
+        value = await self.redis.get(self._key("state", key))
+        return json.loads(value) if value is not None else None
+
+    async def set_state(self, key: str, value, ttl_s: float = None):
+        await self.redis.set(self._key("state", key), json.dumps(value), px=int(ttl_s * 1000) if ttl_s else None)
+
+    async def delete_state(self, key: str):
+        await self.redis.delete(self._key("state", key))
+
+    async def metrics_snapshots(self) -> Dict[str, list]:
+        snapshots = {}
+        for worker in await self._live_workers():
+            if worker != WORKER_ID and (metrics := await self.redis.get(self._key("metrics", worker))) is not None:
+                snapshots[worker] = json.loads(metrics)
+        snapshots[WORKER_ID] = REGISTRY.snapshot()
+        return snapshots
+
+    async def _publish(self, snapshot: list):
+        ttl_ms = int(self.stale_after_s * 1000)
+        await self.redis.set(self._key("metrics", WORKER_ID), json.dumps(snapshot), px=ttl_ms)
+        await self.redis.zadd(self._key("workers"), {WORKER_ID: time.time()})
+        await self.redis.zremrangebyscore(self._key("workers"), "-inf", time.time() - 60)
+
+    async def _remove_worker(self):
+        sessions = {k.decode(): json.loads(v) for k, v in (await self.redis.hgetall(self._key("sessions"))).items()}
+        ours = [k for k, v in sessions.items() if v["worker"] == WORKER_ID]
+        if ours:
+            await self.redis.hdel(self._key("sessions"), *ours)
+        await self.redis.zrem(self._key("workers"), WORKER_ID)
+        await self.redis.delete(self._key("metrics", WORKER_ID))
+        await self.redis.aclose()
+
+
+_registry: Optional[SessionRegistry] = None
+
+
+def get_session_registry() -> SessionRegistry:
+    """The process' registry, chosen by `VOICE_AGENT_SESSION_REGISTRY`."""
+    global _registry
+    if _registry is None:
+        url = config.SESSION_REGISTRY
+        if url.startswith("sqlite:///"):
+            # sqlite:///relative/path or sqlite:////absolute/path
+            _registry = SQLiteSessionRegistry(url[len("sqlite:///") :])
+        elif url.startswith(("redis://", "rediss://", "unix://")):
+            _registry = RedisSessionRegistry(url)
+        elif url == "local":
+            _registry = SessionRegistry()
+        else:
+            raise ValueError(f"Unknown session registry [{url}]")
+    return _registry
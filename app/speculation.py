@@ -0,0 +1,89 @@
+import asyncio
+import difflib
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+from app.metrics import REGISTRY, TurnTimings
+from app.response_cache import normalize_transcript
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_TOTAL = REGISTRY.counter(
+    "voice_agent_speculation", "Speculative LLM starts on partial transcripts by result", ["result"]
+)
+SPECULATION_SAVED_SECONDS = REGISTRY.summary(
+    "voice_agent_speculation_saved_seconds", "Head start of the LLM on speculation hits"
+)
+
+
+class Speculation:
+    """An LLM answer started on a partial transcript, before the final transcript arrives.
+
+    Deltas are buffered; if the final transcript matches (`matches`), the reply replays them and
+    continues from the live stream (`stream`), otherwise the speculation is cancelled.
+    """
+
+    def __init__(self, agent, user_input: str):
+        self.user_input = user_input
+        self.agent = agent
+        # The conversation the answer was started in, it is stale once that moves on
+        self.context = self._context()
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.done_at: Optional[float] = None
+        self.deltas: List[str] = []
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def _context(self) -> str:
+        conversation = self.agent.conversation
+        return conversation.fingerprint() if conversation is not None else ""
+
+    async def _run(self):
+        try:
+            async for delta in self.agent.stream_llm_async(self.user_input):
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.deltas.append(delta)
+                self._changed.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done_at = time.perf_counter()
+            self._changed.set()
+
+    @property
+    def done(self) -> bool:
+        return self.done_at is not None
+
+    def matches(self, transcript: str, min_similarity: float = 1.0) -> bool:
+        """Whether the answer also fits the final `transcript`, compared after normalization."""
+        if self._context() != self.context:
+            return False
+        speculated, final = normalize_transcript(self.user_input), normalize_transcript(transcript)
+        if speculated == final:
+            return True
+        return min_similarity < 1 and difflib.SequenceMatcher(None, speculated, final).ratio() >= min_similarity
+
+    async def stream(self, timings: TurnTimings = None) -> AsyncIterator[str]:
+        """The answer's deltas, buffered ones first; timings get the speculative timestamps."""
+        i = 0
+        while True:
+            while i < len(self.deltas):
+                if timings:
+                    timings.mark("llm_first_token", at=self.first_token_at)
+                yield self.deltas[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                if timings:
+                    timings.mark("llm_done", at=self.done_at)
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def cancel(self):
+        self._task.cancel()
@@ -0,0 +1,142 @@
+import binascii
+import json
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from starlette.websockets import WebSocket
+
+from app import config
+from app.audio_utils import Resampler
+from app.codecs import AUDIO_WIRE_BYTES, PIPELINE_SAMPLE_RATE, G711Codec
+from app.egress import EgressSettings
+
+logger = logging.getLogger(__name__)
+
+# Phone calls arrive over a media stream WebSocket (Twilio Media Streams style): JSON messages
+# carrying base64 µ-law 8kHz audio in both directions. `TelephonyWebSocket` makes such a socket
+# look like a `/ws/audio` browser socket, so calls go through the same `VoiceSession`.
+#
+#   <- {"event": "start", "streamSid": "...", "start": {"customParameters": {...}, ...}}
+#   <- {"event": "media", "media": {"payload": "<base64 µ-law>"}}
+#   <- {"event": "stop"}
+#   -> {"event": "media", "streamSid": "...", "media": {"payload": "<base64 µ-law>"}}
+#   -> {"event": "clear", "streamSid": "..."}
+
+TELEPHONY_SAMPLE_RATE = 8000
+
+
+class TelephonyWebSocket:
+    """A media stream socket in the shape `VoiceSession` expects from a browser socket.
+
+    Inbound µ-law is decoded and upsampled to PCM16 24kHz in batches of `inbound_batch_ms`,
+    rather than per 20ms media message. When the stream stops, the rest of the batch and an
+    `end` event are delivered before the disconnect, as a browser ends its last turn. Outbound PCM is downsampled and encoded into media
+    messages of at most `frame_ms`; pacing is left to the `PacedWebSocket` in front, see
+    `egress_settings`.
+    """
+
+    def __init__(self, websocket: WebSocket, inbound_batch_ms: int = None, frame_ms: int = None):
+        self.websocket = websocket
+        self.stream_sid: Optional[str] = None
+        self.start: Dict = {}
+        self.codec = G711Codec("mulaw", TELEPHONY_SAMPLE_RATE)
+
+        inbound_batch_ms = config.TELEPHONY_INBOUND_BATCH_MS if inbound_batch_ms is None else inbound_batch_ms
+        self.inbound_batch_bytes = TELEPHONY_SAMPLE_RATE * inbound_batch_ms // 1000
+        self._inbound = bytearray()
+        self._upsampler = Resampler(TELEPHONY_SAMPLE_RATE, PIPELINE_SAMPLE_RATE)
+        # Messages left to deliver once the stream has ended
+        self._closing: Deque[dict] = deque()
+
+        frame_ms = config.TELEPHONY_FRAME_MS if frame_ms is None else frame_ms
+        # µ-law is one byte per sample
+        self.frame_bytes = TELEPHONY_SAMPLE_RATE * frame_ms // 1000
+        self._downsampler = Resampler(PIPELINE_SAMPLE_RATE, TELEPHONY_SAMPLE_RATE)
+
+        self._bytes_in = AUDIO_WIRE_BYTES.labels(direction="in", codec="telephony")
+        self._bytes_out = AUDIO_WIRE_BYTES.labels(direction="out", codec="telephony")
+
+    async def wait_start(self) -> Dict:
+        """Consume messages up to the stream's `start`, returns its parameters."""
+        while self.stream_sid is None:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise ConnectionError("media stream closed before start")
+            if message.get("text") is not None:
+                self._on_event(json.loads(message["text"]))
+        return self.start
+
+    async def receive(self) -> dict:
+        if self._closing:
+            return self._closing.popleft()
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return self._close(message)
+            if message.get("text") is None:
+                continue
+            data = json.loads(message["text"])
+            event = data.get("event")
+            if event == "media":
+                ulaw = binascii.a2b_base64(data["media"]["payload"])
+                self._bytes_in.inc(len(ulaw))
+                self._inbound += ulaw
+                if len(self._inbound) >= self.inbound_batch_bytes:
+                    return {"type": "websocket.receive", "bytes": self._take_inbound()}
+            elif event == "stop":
+                logger.info(f"Media stream [{self.stream_sid}] stopped")
+                return self._close({"type": "websocket.disconnect", "code": 1000})
+            else:
+                self._on_event(data)
+
+    def _close(self, disconnect: dict) -> dict:
+        if self._inbound:
+            self._closing.append({"type": "websocket.receive", "bytes": self._take_inbound()})
+        self._closing.append({"type": "websocket.receive", "text": json.dumps({"event": "end"})})
+        self._closing.append(disconnect)
+        return self._closing.popleft()
+
+    def _take_inbound(self) -> bytes:
+        ulaw, self._inbound = bytes(self._inbound), bytearray()
+        return self._upsampler.process(self.codec.decode(ulaw))
+
+    def _on_event(self, data: dict):
+        event = data.get("event")
+        if event == "start":
+            self.start = data.get("start", {})
+            self.stream_sid = data.get("streamSid") or self.start.get("streamSid")
+            logger.info(f"Media stream [{self.stream_sid}] started, call [{self.start.get('callSid')}]")
+        elif event == "mark":
+            logger.debug(f"Media stream [{self.stream_sid}] played up to mark [{data.get('mark', {}).get('name')}]")
+        elif event not in ("connected", "dtmf"):
+            logger.debug(f"Media stream [{self.stream_sid}] ignored event [{event}]")
+
+    async def send_bytes(self, data: bytes):
+        pcm = self._downsampler.process(data)
+        for ulaw in self.codec.encode(pcm):
+            self._bytes_out.inc(len(ulaw))
+            for offset in range(0, len(ulaw), self.frame_bytes):
+                payload = binascii.b2a_base64(ulaw[offset : offset + self.frame_bytes], newline=False).decode()
+                await self.websocket.send_text(
+                    json.dumps({"event": "media", "streamSid": self.stream_sid, "media": {"payload": payload}})
+                )
+
+    async def send_text(self, text: str):
+        # The session's control messages, only `clear` has a media stream equivalent
+        if json.loads(text).get("event") == "clear":
+            self._downsampler.reset()
+            await self.websocket.send_text(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+
+    @staticmethod
+    def egress_settings() -> EgressSettings:
+        """Real-time pacing in fixed `TELEPHONY_FRAME_MS` frames, media streams have no round trip probe."""
+        return EgressSettings(
+            lead_ms=config.TELEPHONY_PLAYOUT_LEAD_MS,
+            max_lead_ms=config.TELEPHONY_PLAYOUT_LEAD_MS,
+            min_chunk_ms=config.TELEPHONY_FRAME_MS,
+            max_chunk_ms=config.TELEPHONY_FRAME_MS,
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
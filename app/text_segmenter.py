@@ -0,0 +1,76 @@
+import re
+from typing import List, Optional
+
+
+# Sentence enders, optionally followed by closing quotes/brackets.
+_SENTENCE_END = re.compile(r"[.!?…。！？]+[\"'”’)\]]*(?=\s)")
+_CLAUSE_END = re.compile(r"[,;:—–][\"'”’)\]]*(?=\s)")
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "vs.", "etc.", "e.g.", "i.e.", "a.m.", "p.m."}
+
+
+class SentenceSegmenter:
+    """Split a stream of LLM text deltas into speakable segments for TTS.
+
+    A boundary is only accepted once the character after it has arrived, so "3.5" or "e.g." are
+    not cut mid-token. Clause boundaries (``,;:``) are used when the pending text is long enough to
+    sound natural on its own, and ``max_chars`` forces a cut at the last whitespace so one run-on
+    sentence cannot hold back the audio. The first segment uses a smaller minimum to get the first
+    audio out as early as possible.
+    """
+
+    def __init__(self, min_chars: int = 20, first_min_chars: int = 8, clause_min_chars: int = 60, max_chars: int = 250):
+        self.min_chars = min_chars
+        self.first_min_chars = first_min_chars
+        self.clause_min_chars = clause_min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+        self._emitted = 0
+
+    def push(self, delta: str) -> List[str]:
+        """Feed a text delta, return the segments that are complete now."""
+        self._buffer += delta
+        segments = []
+        while (segment := self._next_segment()) is not None:
+            segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """Return whatever is left once the LLM stream is done."""
+        segment = self._buffer.strip()
+        self._buffer = ""
+        if not segment:
+            return None
+        self._emitted += 1
+        return segment
+
+    def _next_segment(self) -> Optional[str]:
+        min_chars = self.first_min_chars if self._emitted == 0 else self.min_chars
+
+        cut = self._find_boundary(_SENTENCE_END, min_chars, skip_abbreviations=True)
+        if cut is None and len(self._buffer) >= self.clause_min_chars:
+            cut = self._find_boundary(_CLAUSE_END, self.clause_min_chars)
+        if cut is None and len(self._buffer) > self.max_chars:
+            cut = self._buffer.rfind(" ", 0, self.max_chars)
+            if cut <= 0:
+                cut = self.max_chars
+
+        if cut is None:
+            return None
+
+        segment, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:].lstrip()
+        if not segment:
+            return None
+        self._emitted += 1
+        return segment
+
+    def _find_boundary(self, pattern: re.Pattern, min_chars: int, skip_abbreviations: bool = False) -> Optional[int]:
+        for match in pattern.finditer(self._buffer):
+            end = match.end()
+            if len(self._buffer[:end].strip()) < min_chars:
+                continue
+            if skip_abbreviations:
+                last_word = self._buffer[:end].rsplit(None, 1)[-1].lower()
+                if last_word in _ABBREVIATIONS:
+                    continue
+            return end
+        return None
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+
+from app import config
+from app.realtime_transcribe_client import RealtimeTranscribeClient
+
+logger = logging.getLogger(__name__)
+
+
+class RealtimeTranscribePool:
+    """Keep `size` connected and configured transcription sessions ready for new callers.
+
+    `acquire` hands out an idle session (falling back to connecting on demand when the pool is
+    empty) and wakes the maintainer, which refills the pool in the background. Idle sessions are
+    pinged every `ping_interval_s` and recycled once older than `max_age_s`, so a caller never
+    gets a socket the server has quietly dropped. Acquired sessions are not returned to the pool:
+    they carry the previous caller's audio buffer and conversation items.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], RealtimeTranscribeClient],
+        size: int = 2,
+        max_age_s: float = 300,
+        ping_interval_s: float = 15,
+        ping_timeout_s: float = 5,
+    ):
+        self.client_factory = client_factory
+        self.size = size
+        self.max_age_s = max_age_s
+        self.ping_interval_s = ping_interval_s
+        self.ping_timeout_s = ping_timeout_s
+
+        self._idle: Deque[RealtimeTranscribeClient] = deque()
+        self._connecting = 0
+        self._wakeup = asyncio.Event()
+        self._maintainer: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self):
+        if self.size > 0 and self._maintainer is None:
+            self._maintainer = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            await asyncio.gather(self._maintainer, return_exceptions=True)
+            self._maintainer = None
+        while self._idle:
+            await self._discard(self._idle.popleft())
+
+    async def acquire(self) -> RealtimeTranscribeClient:
+        while self._idle:
+            client = self._idle.popleft()
+            if self._is_healthy(client):
+                self.hits += 1
+                self._wakeup.set()
+                return client
+            await self._discard(client)
+
+        self.misses += 1
+        self._wakeup.set()
+        client = self.client_factory()
+        await client.connect()
+        return client
+
+    def _is_healthy(self, client: RealtimeTranscribeClient) -> bool:
+        return client.is_open and time.monotonic() - client.connected_at < self.max_age_s
+
+    async def _maintain(self):
+        while True:
+            try:
+                await self._check_idle()
+                await self._refill()
+            except Exception as e:
+                logger.warning(f"Transcribe pool maintenance failed: {e!r}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.ping_interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check_idle(self):
+        for client in list(self._idle):
+            healthy = self._is_healthy(client)
+            if healthy:
+                try:
+                    pong = await client.openai_ws.ping()
+                    await asyncio.wait_for(pong, timeout=self.ping_timeout_s)
+                except Exception:
+                    healthy = False
+            if not healthy and client in self._idle:
+                self._idle.remove(client)
+                await self._discard(client)
+
+    async def _refill(self):
+        missing = self.size - len(self._idle) - self._connecting
+        if missing <= 0:
+            return
+
+        self._connecting += missing
+        try:
+            results = await asyncio.gather(*(self._connect() for _ in range(missing)), return_exceptions=True)
+        finally:
+            self._connecting -= missing
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Transcribe pool failed to connect: {result!r}")
+            else:
+                self._idle.append(result)
+
+    async def _connect(self) -> RealtimeTranscribeClient:
+        client = self.client_factory()
+        await client.connect()
+        return client
+
+    @staticmethod
+    async def _discard(client: RealtimeTranscribeClient):
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[RealtimeTranscribePool] = None
+
+
+def get_transcribe_pool(api_key: str = None) -> RealtimeTranscribePool:
+    """The process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        _pool = RealtimeTranscribePool(
+            lambda: RealtimeTranscribeClient(api_key=api_key),
+            size=config.TRANSCRIBE_POOL_SIZE,
+            max_age_s=config.TRANSCRIBE_POOL_MAX_AGE_S,
+            ping_interval_s=config.TRANSCRIBE_POOL_PING_INTERVAL_S,
+        )
+    return _pool
+
+
+async def close_transcribe_pool():
+    """Stop the process-wide pool, if anything created it."""
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
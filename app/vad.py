@@ -0,0 +1,204 @@
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class VadSettings:
+    # "local": detect speech and endpoint here, commit the audio buffer ourselves
+    # "gate": keep the server VAD, but stop sending silence once it has had enough to endpoint
+    mode: str = "local"
+    # Speech if a 10 ms frame is this far above the tracked noise floor...
+    threshold_db: float = 12
+    # ...and above this absolute level
+    min_level_dbfs: float = -50
+    # Zero crossings per sample above which a quiet-ish frame is treated as noise (fricatives are
+    # still caught by the energy test when they are loud enough)
+    max_zcr: float = 0.35
+    # Speech must last this long before it counts, filters clicks
+    min_speech_ms: float = 60
+    # Audio kept from before the speech onset
+    prefix_padding_ms: float = 300
+    # Endpointing: silence needed to end the turn adapts to the caller's pauses within this range
+    min_silence_ms: float = 250
+    max_silence_ms: float = 800
+    initial_silence_ms: float = 450
+    # "gate" mode: silence still forwarded after speech, must exceed the server's silence_duration_ms
+    gate_tail_ms: float = 700
+
+    @classmethod
+    def from_query(cls, params) -> "VadSettings":
+        settings = cls()
+        for name, value in params.items():
+            if name.startswith("vad_") and hasattr(settings, name[4:]):
+                field = name[4:]
+                setattr(settings, field, type(getattr(settings, field))(value))
+        return settings
+
+
+class VadGate:
+    """Model-free VAD in front of the realtime transcription socket.
+
+    Works on 10 ms frames with NumPy: frame RMS (dBFS) against an adaptive noise floor, plus a
+    zero-crossing-rate test to reject hiss. Silence is not forwarded upstream, except the
+    `prefix_padding_ms` before an onset (so the first phoneme isn't clipped) and, in "gate" mode,
+    enough trailing silence for the server VAD to endpoint.
+
+    In "local" mode the gate also ends the turn: once the silence after speech exceeds the
+    adaptive endpoint it calls `commit`, which makes the server transcribe immediately instead of
+    waiting for its own fixed silence window. The endpoint is 1.5x the 90th percentile of the
+    caller's recent mid-utterance pauses, clamped to `[min_silence_ms, max_silence_ms]`.
+    """
+
+    frame_ms = 10
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Awaitable[None]],
+        commit: Optional[Callable[[], Awaitable[None]]] = None,
+        settings: VadSettings = None,
+        sample_rate: int = 24000,
+    ):
+        self.send = send
+        self.commit = commit
+        self.settings = settings or VadSettings()
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * self.frame_ms // 1000
+
+        self.on_speech_started: Optional[Callable[[], Awaitable[None]]] = None
+        self.on_speech_stopped: Optional[Callable[[], Awaitable[None]]] = None
+
+        self.speaking = False
+        self.noise_floor_db = -60.0
+        self._remainder = b""
+        self._speech_run_ms = 0.0
+        self._silence_run_ms = 0.0
+        # Nothing to endpoint yet
+        self._tail_sent_ms = self.settings.gate_tail_ms
+        # Recent frames, replayed at the onset
+        self._padding: Deque[bytes] = deque(maxlen=max(1, int(self.settings.prefix_padding_ms / self.frame_ms)))
+        self._pauses: Deque[float] = deque(maxlen=50)
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def endpoint_ms(self) -> float:
+        s = self.settings
+        if len(self._pauses) < 3:
+            return s.initial_silence_ms
+        p90 = float(np.percentile(np.fromiter(self._pauses, dtype=np.float64), 90))
+        return min(s.max_silence_ms, max(s.min_silence_ms, 1.5 * p90))
+
+    async def process(self, pcm: bytes):
+        """Feed PCM16 mono audio of any length."""
+        self.bytes_in += len(pcm)
+        data = self._remainder + pcm if self._remainder else pcm
+        frame_bytes = self.frame_samples * 2
+        usable = len(data) - len(data) % frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return
+
+        frames = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, self.frame_samples)
+        floats = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(floats * floats, axis=1))
+        level_db = 20 * np.log10(np.maximum(rms, 1e-6))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_samples
+
+        # Forward runs of frames in one send, but flush before VAD events so that a commit
+        # always covers all the speech sent before it
+        pending = []
+        for i in range(len(frames)):
+            frame = data[i * frame_bytes : (i + 1) * frame_bytes]
+            forward, event = self._step(frame, float(level_db[i]), float(zcr[i]))
+            if event == "started":
+                await self._flush(pending)
+                if self.settings.mode == "local" and self.on_speech_started:
+                    await self.on_speech_started()
+            if forward:
+                pending.append(forward)
+            if event == "stopped":
+                await self._flush(pending)
+                logger.debug(f"Local VAD endpoint after [{self._silence_run_ms:.0f}]ms silence")
+                if self.settings.mode == "local":
+                    if self.on_speech_stopped:
+                        await self.on_speech_stopped()
+                    if self.commit:
+                        await self.commit()
+        await self._flush(pending)
+
+    def _is_speech(self, level_db: float, zcr: float) -> bool:
+        s = self.settings
+        above_floor = level_db - self.noise_floor_db
+        if level_db < s.min_level_dbfs or above_floor < s.threshold_db:
+            return False
+        return zcr <= s.max_zcr or above_floor >= 2 * s.threshold_db
+
+    def _step(self, frame: bytes, level_db: float, zcr: float) -> Tuple[Optional[bytes], Optional[str]]:
+        """Advance the state machine by one frame.
+
+        Returns the audio to forward for it and the VAD event it caused, "started" or "stopped".
+        """
+        s = self.settings
+        speech = self._is_speech(level_db, zcr)
+        # The noise floor follows quiet frames quickly down and slowly up; during speech it creeps
+        # up very slowly, so a lasting louder background is eventually absorbed
+        if not speech:
+            rate = 0.2 if level_db < self.noise_floor_db else 0.02
+        else:
+            rate = 0.001
+        self.noise_floor_db += rate * (level_db - self.noise_floor_db)
+
+        if not self.speaking:
+            if speech:
+                self._speech_run_ms += self.frame_ms
+                if self._speech_run_ms >= s.min_speech_ms:
+                    return self._start_speech(frame), "started"
+            else:
+                self._speech_run_ms = 0
+            if self._tail_sent_ms < s.gate_tail_ms:
+                # Trailing silence for the server VAD ("gate" mode only)
+                self._tail_sent_ms += self.frame_ms
+                return frame, None
+            # Held back, replayed if this turns out to be the onset
+            self._padding.append(frame)
+            return None, None
+
+        if speech:
+            if self._silence_run_ms >= 100:
+                # A mid-utterance pause, used to adapt the endpoint
+                self._pauses.append(self._silence_run_ms)
+            self._silence_run_ms = 0
+            return frame, None
+
+        self._silence_run_ms += self.frame_ms
+        if self._silence_run_ms >= self.endpoint_ms:
+            self.speaking = False
+            self._tail_sent_ms = 0 if s.mode == "gate" else s.gate_tail_ms
+            return frame, "stopped"
+        return frame, None
+
+    def _start_speech(self, frame: bytes) -> bytes:
+        self.speaking = True
+        self._silence_run_ms = 0
+        self._speech_run_ms = 0
+        self._tail_sent_ms = self.settings.gate_tail_ms
+        padding = b"".join(self._padding)
+        self._padding.clear()
+        return padding + frame
+
+    async def _flush(self, pending: list):
+        if pending:
+            await self._forward(b"".join(pending))
+            pending.clear()
+
+    async def _forward(self, data: bytes):
+        self.bytes_out += len(data)
+        await self.send(data)
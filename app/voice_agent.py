@@ -1,24 +1,286 @@
 from openai import AsyncOpenAI
 from fastapi import WebSocket
-from typing import Union, IO
+from typing import AsyncIterator, Optional, Union, IO
+import contextlib
+from contextlib import aclosing
+import asyncio
 import logging
 import aiofiles
 import io
-import logging
+from app.admission import AdmissionController
+from app.clients import get_openai_client
+from app.conversation import Conversation
+from app.hedging import HedgedLLM, HedgedTTS
+from app.metrics import TurnTimings
+from app.playback import PlaybackTracker
+from app.providers import LLMProvider, OpenAILLM, OpenAITTS, TTSProvider
+from app.recorder import get_recorder
+from app.response_cache import CachedResponse, ResponseCache
+from app.speculation import Speculation
+from app.text_segmenter import SentenceSegmenter
 
 logger = logging.getLogger(__name__)
 
 
-class VoiceAgentOpenAI:
-    """Voice Agent using OpenAI APIs
+class VoiceAgent:
+    """Voice Agent over pluggable LLM and TTS providers, see `app.providers`
     | Chunk Size     | Latency | Network Overhead | Use Case                     |
     | -------------- | ------- | ---------------- | ---------------------------- |
     | 200 bytes      | \~4 ms  | High             | Ultra-low-latency (gaming)   |
     | 500-1500 bytes | \~21 ms | Low/Moderate     | ✅ Good balance (voice agent) |
     | 4000 bytes     | \~85 ms | Low              | Buffered playback (music)    |
 
+    `chunk_size` is the read size from the TTS provider; what the client receives is re-chunked
+    and paced by the session's `PacedWebSocket`, see `app.egress`.
     """
 
+    def __init__(
+        self,
+        llm: LLMProvider,
+        tts: TTSProvider,
+        chunk_size: int = 500,
+        system_prompt: str = "You’re a helpful assistant. You reply with only one word.",
+        stream_llm_to_tts: bool = True,
+        response_cache: Optional[ResponseCache] = None,
+        admission: Optional[AdmissionController] = None,
+        memory_tokens: int = 0,
+    ):
+        self.llm = llm
+        self.tts = tts
+        self.chunk_size = chunk_size
+        self.system_prompt = system_prompt
+        self.stream_llm_to_tts = stream_llm_to_tts
+        self.recorder = get_recorder()
+        self.response_cache = response_cache
+        self.admission = admission
+        # Earlier turns sent as context, up to `memory_tokens`; 0 answers each turn on its own
+        self.conversation = Conversation(system_prompt, max_tokens=memory_tokens) if memory_tokens > 0 else None
+
+    def _stage_slot(self, stage: str):
+        """One of the process' in-flight `stage` request slots, if admission control is on."""
+        if self.admission is None:
+            return contextlib.nullcontext()
+        return self.admission.stage(stage)
+
+    async def text_to_speech_streaming_websocket(
+        self,
+        text: str,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+        audio_chunks: list = None,
+    ):
+        try:
+            if playback:
+                playback.on_segment(text)
+            await self._stream_speech_to_websocket(text, ws, output_path, playback, timings, audio_chunks)
+        finally:
+            if output_path:
+                await self.recorder.finish(output_path)
+
+    async def _stream_speech_to_websocket(
+        self,
+        text: str,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+        audio_chunks: list = None,
+    ):
+        # Closes the provider's HTTP response (or stops synthesis) when cancelled on barge-in
+        async with self._stage_slot("tts"), aclosing(self.tts.stream_speech(text, self.chunk_size)) as audio:
+            async for data in audio:
+                if timings:
+                    timings.mark("tts_first_byte")
+                await self._send_audio(data, ws, output_path, playback, timings)
+                if audio_chunks is not None:
+                    # Kept for the response cache
+                    audio_chunks.append(data)
+
+    async def _send_audio(
+        self,
+        data: bytes,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+    ):
+        # Stream to ws
+        logger.debug(f"Streaming speech to client, data size[{len(data)}]")
+        await ws.send_bytes(data)
+        if timings:
+            timings.mark("first_byte_sent")
+            timings.mark("last_byte_sent")
+        if playback:
+            # Sent, and counted as such, by the session's egress pacer
+            playback.on_audio_queued(len(data))
+        if output_path:
+            # Stream to file, in the background
+            await self.recorder.record(output_path, data)
+
+    def response_cache_key(self, user_input: str) -> str:
+        return ResponseCache.make_key(
+            user_input,
+            llm=self.llm.name,
+            llm_model=self.llm.model,
+            system_prompt=self.system_prompt,
+            tts=self.tts.name,
+            tts_model=self.tts.model,
+            voice=self.tts.voice,
+            tts_instructions=self.tts.instructions,
+            # Answers depend on the earlier turns too; first turns are shared across sessions
+            context=self.conversation.fingerprint() if self.conversation else "",
+        )
+
+    async def respond_websocket(
+        self,
+        user_input: str,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+        speculation: Speculation = None,
+    ) -> str:
+        """Answer `user_input` with speech streamed to `ws`, returns the answer text.
+
+        Served from the response cache when the same question was answered before, otherwise
+        generated (pipelined per sentence when `stream_llm_to_tts`) and cached once it has been
+        spoken in full. A matching `speculation` supplies the LLM answer already under way.
+        """
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache_key(user_input)
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit: {cached.text}")
+                await self._send_cached_response(cached, ws, output_path, playback, timings)
+                return cached.text
+
+        audio_chunks = [] if cache_key else None
+        if self.stream_llm_to_tts:
+            response_text = await self.respond_streaming_websocket(
+                user_input, ws, output_path, playback, timings, audio_chunks, speculation
+            )
+        else:
+            response_text = await self.call_llm_async(user_input, timings, speculation)
+            logger.info(f"llm_response_text: {response_text}")
+            await self.text_to_speech_streaming_websocket(
+                response_text, ws, output_path, playback, timings, audio_chunks
+            )
+
+        # Only reached when the reply wasn't interrupted
+        if cache_key:
+            await self.response_cache.put(cache_key, CachedResponse(response_text, b"".join(audio_chunks)))
+        return response_text
+
+    async def _send_cached_response(
+        self,
+        cached: CachedResponse,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+    ):
+        if timings:
+            timings.mark("llm_first_token")
+            timings.mark("llm_done")
+        if playback:
+            playback.on_segment(cached.text)
+        try:
+            audio = memoryview(cached.audio)
+            for offset in range(0, len(audio), self.chunk_size):
+                if timings:
+                    timings.mark("tts_first_byte")
+                await self._send_audio(bytes(audio[offset : offset + self.chunk_size]), ws, output_path, playback, timings)
+        finally:
+            if output_path:
+                await self.recorder.finish(output_path)
+
+    async def respond_streaming_websocket(
+        self,
+        user_input: str,
+        ws: WebSocket,
+        output_path: str = None,
+        playback: PlaybackTracker = None,
+        timings: TurnTimings = None,
+        audio_chunks: list = None,
+        speculation: Speculation = None,
+    ) -> str:
+        """LLM -> TTS pipeline: speak each sentence as soon as the LLM has finished it.
+
+        LLM deltas are split by `SentenceSegmenter` and queued; a single consumer synthesizes the
+        segments one after another, so audio reaches the client in order while the LLM keeps
+        generating. Returns the full response text.
+        """
+        segments: asyncio.Queue = asyncio.Queue()
+        answer = ""
+
+        async def produce_segments():
+            nonlocal answer
+            segmenter = SentenceSegmenter()
+            try:
+                async for delta in self._llm_stream(user_input, timings, speculation):
+                    answer += delta
+                    for segment in segmenter.push(delta):
+                        logger.info(f"LLM segment ready: {segment}")
+                        await segments.put(segment)
+                if (segment := segmenter.flush()) is not None:
+                    logger.info(f"LLM segment ready: {segment}")
+                    await segments.put(segment)
+            finally:
+                await segments.put(None)
+
+        producer = asyncio.create_task(produce_segments())
+        try:
+            while (segment := await segments.get()) is not None:
+                if playback:
+                    playback.on_segment(segment)
+                await self._stream_speech_to_websocket(segment, ws, output_path, playback, timings, audio_chunks)
+            # Surface LLM errors
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            if output_path:
+                await self.recorder.finish(output_path)
+
+        return answer
+
+    async def stream_llm_async(self, user_input: str, timings: TurnTimings = None) -> AsyncIterator[str]:
+        if self.conversation is not None:
+            messages = self.conversation.messages(user_input)
+        else:
+            messages = [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": user_input}]
+
+        # Release the provider's stream when the consumer stops early, e.g. on barge-in
+        async with self._stage_slot("llm"), aclosing(self.llm.stream_chat(messages)) as stream:
+            async for content in stream:
+                if timings:
+                    timings.mark("llm_first_token")
+                logger.debug(content)
+                yield content
+        if timings:
+            timings.mark("llm_done")
+
+    def _llm_stream(self, user_input: str, timings: TurnTimings = None, speculation: Speculation = None):
+        if speculation is not None:
+            return speculation.stream(timings)
+        return self.stream_llm_async(user_input, timings)
+
+    async def call_llm_async(
+        self, user_input: str, timings: TurnTimings = None, speculation: Speculation = None
+    ) -> str:
+        answer = ""
+        async for content in self._llm_stream(user_input, timings, speculation):
+            answer += content
+
+        return answer
+
+
+class VoiceAgentOpenAI(VoiceAgent):
+    """Voice Agent using OpenAI APIs for every stage"""
+
     def __init__(
         self,
         stt_model: str = "gpt-4o-mini-transcribe",
@@ -26,15 +288,35 @@ class VoiceAgentOpenAI:
         llm_model: str = "gpt-4.1-mini",
         voice: str = "coral",
         chunk_size: int = 500,
+        system_prompt: str = "You’re a helpful assistant. You reply with only one word.",
+        tts_instructions: str = "Speak in a cheerful and positive tone. language English",
+        stream_llm_to_tts: bool = True,
+        client: AsyncOpenAI = None,
+        response_cache: Optional[ResponseCache] = None,
+        hedge: bool = False,
     ):
+        # Shared across sessions, so connections are pooled
+        self.client = client or get_openai_client()
+        llm = OpenAILLM(llm_model, client=self.client)
+        tts = OpenAITTS(tts_model, voice=voice, instructions=tts_instructions, client=self.client)
+        if hedge:
+            # A duplicate request when the first is slow to start, see `app.hedging`
+            llm, tts = HedgedLLM(llm), HedgedTTS(tts)
+        super().__init__(
+            llm=llm,
+            tts=tts,
+            chunk_size=chunk_size,
+            system_prompt=system_prompt,
+            stream_llm_to_tts=stream_llm_to_tts,
+            response_cache=response_cache,
+        )
         self.stt_model = stt_model
         self.tts_model = tts_model
         self.llm_model = llm_model
         self.voice = voice
         self.audio_format = "wav"
         self.audio_codec = "pcm"
-        self.chunk_size = chunk_size
-        self.client = AsyncOpenAI()
+        self.tts_instructions = tts_instructions
 
     async def speech_to_text_transcribe_async(self, audio: Union[str, IO]) -> str:
         is_filepath = isinstance(audio, str)
@@ -75,52 +357,9 @@ class VoiceAgentOpenAI:
             model=self.tts_model,
             voice=self.voice,
             input=text,
-            instructions="Speak in a cheerful and positive tone. language English",
+            instructions=self.tts_instructions,
             response_format=self.audio_codec,
         ) as response:
             # await LocalAudioPlayer().play(response)
             await response.stream_to_file(output_path)
             logger.info(f"Saved audio to {output_path}")
-
-    async def text_to_speech_streaming_websocket(self, text: str, ws: WebSocket, output_path: str = None):
-        async with self.client.audio.speech.with_streaming_response.create(
-            model=self.tts_model,
-            voice=self.voice,
-            input=text,
-            instructions="Speak in a cheerful and positive tone. language English",
-            response_format=self.audio_codec,
-        ) as response:
-            # Save into file
-            audio_file = None
-            if output_path:
-                audio_file = await aiofiles.open(output_path, "wb")
-
-            async for data in response.iter_bytes(self.chunk_size):
-                # Stream to ws
-                logger.debug(f"Streaming speech to client, data size[{len(data)}]")
-                await ws.send_bytes(data)
-                if audio_file:
-                    # Stream to file
-                    await audio_file.write(data)
-
-            if audio_file:
-                await audio_file.close()
-
-    async def call_llm_async(self, user_input: str) -> str:
-        answer = ""
-        # system_prompt = "You’re a helpful assistant. You reply with only one thousands word."
-        system_prompt = "You’re a helpful assistant. You reply with only one word."
-
-        stream = await self.client.chat.completions.create(
-            model=self.llm_model,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_input}],
-            stream=True,
-        )
-
-        async for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content is not None:
-                answer += content
-                logger.debug(content, end="", flush=True)
-
-        return answer
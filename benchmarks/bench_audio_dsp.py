@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of the audio DSP helpers in `app.audio_utils` and the G.711 codecs.
+
+Each operation runs over a stream of `--chunk-ms` chunks, as the transport would feed it, and is
+reported as a real-time factor: seconds of audio processed per second of CPU on one core. At a
+factor of 1000, one core keeps up with that operation for 1000 concurrent calls.
+
+```sh
+python -m benchmarks.bench_audio_dsp --seconds 30 --chunk-ms 20
+```
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from app.audio_utils import Resampler, apply_gain, downmix, float32_to_pcm16, levels, pcm16_to_float32
+from app.codecs import create_codec
+
+
+def _speechlike(seconds: float, sample_rate: int, num_channels: int = 1) -> bytes:
+    """Band-limited noise with a syllable-rate envelope, so no operation sees trivial input."""
+    rng = np.random.default_rng(0)
+    num_samples = int(seconds * sample_rate)
+    t = np.arange(num_samples) / sample_rate
+    noise = np.convolve(rng.standard_normal(num_samples), np.ones(4) / 4, mode="same")
+    audio = 0.3 * noise * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+    return float32_to_pcm16(np.repeat(audio.astype(np.float32), num_channels))
+
+
+def _chunks(pcm: bytes, chunk_bytes: int) -> List[memoryview]:
+    view = memoryview(pcm)
+    return [view[offset : offset + chunk_bytes] for offset in range(0, len(view), chunk_bytes)]
+
+
+def _measure(name: str, audio_seconds: float, chunks: List, operation: Callable):
+    started = time.process_time()
+    for chunk in chunks:
+        operation(chunk)
+    cpu = max(time.process_time() - started, 1e-9)
+    per_chunk_us = cpu / len(chunks) * 1e6
+    print(f"  {name:<30}{audio_seconds / cpu:>12,.0f}x{per_chunk_us:>12.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30, help="audio per operation")
+    parser.add_argument("--chunk-ms", type=float, default=20, help="chunk size the operations see")
+    args = parser.parse_args()
+
+    def chunked(pcm: bytes, sample_rate: int, num_channels: int = 1) -> List[memoryview]:
+        chunk_bytes = int(sample_rate * args.chunk_ms / 1000) * 2 * num_channels
+        return _chunks(pcm, chunk_bytes)
+
+    seconds = args.seconds
+    pcm24 = _speechlike(seconds, 24000)
+    pcm16 = _speechlike(seconds, 16000)
+    pcm8 = _speechlike(seconds, 8000)
+    pcm44 = _speechlike(seconds, 44100)
+    stereo = _speechlike(seconds, 24000, num_channels=2)
+    floats = [pcm16_to_float32(chunk) for chunk in chunked(pcm24, 24000)]
+
+    print(f"{seconds:.0f}s of audio per operation, {args.chunk_ms:.0f}ms chunks")
+    print(f"  {'operation':<30}{'real-time':>13}{'per chunk':>14}")
+
+    _measure("int16 -> float32 (24kHz)", seconds, chunked(pcm24, 24000), pcm16_to_float32)
+    _measure("float32 -> int16 (24kHz)", seconds, floats, float32_to_pcm16)
+    _measure("downmix stereo (24kHz)", seconds, chunked(stereo, 24000, 2), lambda chunk: downmix(chunk, 2))
+    _measure("gain -6dB (24kHz)", seconds, chunked(pcm24, 24000), lambda chunk: apply_gain(chunk, -6))
+    _measure("RMS/peak meter (24kHz)", seconds, chunked(pcm24, 24000), levels)
+
+    for source, from_rate, to_rate in (
+        (pcm8, 8000, 24000),
+        (pcm16, 16000, 24000),
+        (pcm24, 24000, 8000),
+        (pcm24, 24000, 16000),
+        (pcm44, 44100, 24000),
+    ):
+        resampler = Resampler(from_rate, to_rate)
+        _measure(
+            f"resample {from_rate // 1000}k -> {to_rate // 1000}k", seconds, chunked(source, from_rate), resampler.process
+        )
+
+    for name in ("mulaw", "alaw"):
+        codec = create_codec(name, 8000)
+        encoded = b"".join(codec.encode(pcm8))
+        _measure(f"{name} encode (8kHz)", seconds, chunked(pcm8, 8000), codec.encode)
+        _measure(f"{name} decode (8kHz)", seconds, _chunks(encoded, int(8000 * args.chunk_ms / 1000)), codec.decode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the `input_audio_buffer.append` encoders for the realtime transcription socket.
+
+Each encoder turns `--chunk-ms` PCM16 24kHz chunks into the event sent upstream. Reported are
+messages per second on one core and the peak memory a single encode holds on top of its result,
+which counts the intermediate copies (base64 bytes, str, dict, JSON str, UTF-8 bytes).
+
+```sh
+python -m benchmarks.bench_realtime_encode --chunk-ms 40 --messages 50000
+```
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from app.realtime_events import AppendEventEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(chunk: bytes):
+    # The encoding `RealtimeTranscribeClient.stream_audio` used before `AppendEventEncoder`
+    return json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk).decode()})
+
+
+def _orjson_dumps(chunk: bytes):
+    return orjson.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk).decode()})
+
+
+def _join(chunk: bytes):
+    return b"".join((AppendEventEncoder.PREFIX, binascii.b2a_base64(chunk, newline=False), AppendEventEncoder.SUFFIX))
+
+
+def _peak_bytes(operation: Callable, chunk: bytes) -> int:
+    """Peak allocation of one call, less the result it returns (a reused buffer counts as 0)."""
+    operation(chunk)
+    tracemalloc.start()
+    try:
+        result = operation(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return max(0, peak - retained)
+
+
+def _measure(name: str, operation: Callable, chunk: bytes, messages: int, reference: bytes):
+    assert json.loads(operation(chunk)) == json.loads(reference), name
+
+    started = time.perf_counter()
+    for _ in range(messages):
+        operation(chunk)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"  {name:<24}{messages / elapsed:>12,.0f}{elapsed / messages * 1e6:>10.2f}us{_peak_bytes(operation, chunk):>12,}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunk-ms", type=float, default=40, help="audio per append event")
+    parser.add_argument("--messages", type=int, default=50000, help="events per encoder")
+    args = parser.parse_args()
+
+    chunk = bytes(range(256)) * (int(24000 * args.chunk_ms / 1000) * 2 // 256 + 1)
+    chunk = chunk[: int(24000 * args.chunk_ms / 1000) * 2]
+    reference = _json_dumps(chunk).encode()
+
+    print(f"{len(chunk):,} byte chunks ({args.chunk_ms:.0f}ms PCM16 24kHz), {len(reference):,} byte events")
+    print(f"  {'encoder':<24}{'msgs/s':>12}{'per msg':>12}{'peak bytes':>12}")
+    _measure("json.dumps", _json_dumps, chunk, args.messages, reference)
+    if orjson is not None:
+        _measure("orjson.dumps", _orjson_dumps, chunk, args.messages, reference)
+    else:
+        print(f"  {'orjson.dumps':<24}{'not installed':>12}")
+    _measure("bytes join", _join, chunk, args.messages, reference)
+    _measure("AppendEventEncoder", AppendEventEncoder().encode, chunk, args.messages, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+Concurrent load test of `/ws/audio` against local OpenAI stand-ins.
+
+Launches `benchmarks.mock_openai` and the FastAPI app as subprocesses, then drives simulated
+browser clients: each one streams a tone "utterance" followed by silence, in real time, and
+waits for the spoken reply before the next turn. Reports throughput, client-side
+end-of-speech -> first-audio latency, the app's per-stage quantiles from `/metrics`, and the
+app process' CPU and memory per session.
+
+```sh
+python -m benchmarks.load_test --clients 200 --turns 3 --ramp-s 10
+```
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import websockets
+
+from app.codecs import create_codec
+
+SAMPLE_RATE = 24000
+ROOT = Path(__file__).parent.parent
+
+
+@dataclass
+class ClientResult:
+    turns: int = 0
+    # End of the caller's speech -> first reply audio byte
+    first_audio_latencies: List[float] = field(default_factory=list)
+    reply_bytes: int = 0
+    # Audio bytes on the wire, both directions, in the session's codec
+    wire_bytes: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _tone_frame(num_samples: int, frequency: float = 330, amplitude: int = 6000, sample_rate: int = SAMPLE_RATE) -> bytes:
+    import array
+
+    return array.array(
+        "h", (int(amplitude * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(num_samples))
+    ).tobytes()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return math.nan
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class ProcessStats:
+    """CPU time and RSS of a process and its children (web and stage workers) from /proc (Linux)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.peak_rss = 0
+
+    def pids(self) -> List[int]:
+        pids, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pending += [int(child) for child in f.read().split()]
+            except OSError:
+                pass
+        return pids
+
+    def cpu_seconds(self) -> float:
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    # Fields after the command name, which may contain spaces
+                    stat = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            total += int(stat[11]) + int(stat[12])
+        return total / self.ticks
+
+    def rss(self) -> int:
+        total = 0
+        for pid in self.pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+                            break
+            except OSError:
+                continue
+        self.peak_rss = max(self.peak_rss, total)
+        return total
+
+
+class MediaStreamClient:
+    """A phone call's media stream (see `app.telephony`) with the browser socket's send/recv."""
+
+    def __init__(self, ws, stream_sid: str):
+        self.ws = ws
+        self.stream_sid = stream_sid
+
+    async def start(self):
+        await self.ws.send(json.dumps({"event": "connected", "protocol": "Call"}))
+        await self.ws.send(
+            json.dumps(
+                {
+                    "event": "start",
+                    "streamSid": self.stream_sid,
+                    "start": {"streamSid": self.stream_sid, "callSid": f"CA-{self.stream_sid}", "customParameters": {}},
+                }
+            )
+        )
+
+    async def send(self, message):
+        if isinstance(message, bytes):
+            payload = base64.b64encode(message).decode()
+            await self.ws.send(json.dumps({"event": "media", "streamSid": self.stream_sid, "media": {"payload": payload}}))
+        elif json.loads(message).get("event") == "end":
+            await self.ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid}))
+
+    async def recv(self):
+        message = json.loads(await self.ws.recv())
+        if message.get("event") == "media":
+            return base64.b64decode(message["media"]["payload"])
+        return json.dumps(message)
+
+
+async def simulated_client(
+    url: str, args: argparse.Namespace, result: ClientResult, start_delay: float, active: Dict[str, int]
+):
+    await asyncio.sleep(start_delay)
+    # Frames are encoded once, like a client with a steady mic signal
+    codec = create_codec(args.codec, args.codec_rate)
+    frame_samples = int(args.codec_rate * args.frame_ms / 1000)
+    speech_frame = b"".join(codec.encode(_tone_frame(frame_samples, sample_rate=args.codec_rate)))
+    silence_frame = b"".join(codec.encode(bytes(frame_samples * 2)))
+    frame_s = args.frame_ms / 1000
+
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=args.timeout_s) as ws:
+            if args.telephony:
+                ws = MediaStreamClient(ws, f"MZ{id(result):x}")
+                await ws.start()
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                await ws.send('{"event": "start"}')
+                for _ in range(args.turns):
+                    await _run_turn(ws, args, result, codec, speech_frame, silence_frame, frame_s)
+                await ws.send('{"event": "end"}')
+            finally:
+                active["now"] -= 1
+    except Exception as e:
+        result.errors.append(repr(e))
+
+
+async def _run_turn(
+    ws, args, result: ClientResult, codec, speech_frame: bytes, silence_frame: bytes, frame_s: float
+):
+    # Frames are paced against an absolute clock so a slow loop doesn't stretch the audio
+    started = time.perf_counter()
+    sent = 0
+    speech_frames = int(args.speech_ms / args.frame_ms)
+    for _ in range(speech_frames):
+        await ws.send(speech_frame)
+        result.wire_bytes += len(speech_frame)
+        sent += 1
+        await asyncio.sleep(max(0.0, started + sent * frame_s - time.perf_counter()))
+    speech_end = time.perf_counter()
+
+    # Keep streaming silence, like an open mic, until the reply has been received
+    first_audio: Optional[float] = None
+    last_audio = None
+    deadline = speech_end + args.timeout_s
+    while time.perf_counter() < deadline:
+        await ws.send(silence_frame)
+        result.wire_bytes += len(silence_frame)
+        sent += 1
+        # Drain whatever the server pushed meanwhile
+        while True:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.0, started + sent * frame_s - time.perf_counter()))
+            except asyncio.TimeoutError:
+                break
+            if isinstance(message, str):
+                event = json.loads(message)
+                if event.get("event") == "ping":
+                    await ws.send(json.dumps({"event": "pong", "t": event["t"]}))
+                continue
+            if isinstance(message, bytes):
+                now = time.perf_counter()
+                if first_audio is None:
+                    first_audio = now
+                last_audio = now
+                result.wire_bytes += len(message)
+                # In pipeline PCM terms, whatever the codec
+                result.reply_bytes += len(codec.decode(message)) * SAMPLE_RATE // args.codec_rate
+        if last_audio is not None and time.perf_counter() - last_audio > args.reply_idle_ms / 1000:
+            break
+
+    if first_audio is None:
+        result.errors.append("no reply audio before timeout")
+        return
+    result.turns += 1
+    result.first_audio_latencies.append(first_audio - speech_end)
+
+
+def _wait_http(url: str, timeout_s: float):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"[{url}] did not come up in {timeout_s}s")
+
+
+def _scrape_stage_quantiles(metrics_url: str) -> Dict[str, Dict[str, float]]:
+    with urllib.request.urlopen(metrics_url, timeout=5) as response:
+        text = response.read().decode()
+    stages: Dict[str, Dict[str, float]] = {}
+    # Several serving processes report one series each (`worker` label), keep the worst
+    pattern = re.compile(r'voice_agent_turn_stage_seconds\{stage="([^"]+)",quantile="([^"]+)"[^}]*\} (\S+)')
+    for stage, quantile, value in pattern.findall(text):
+        quantiles = stages.setdefault(stage, {})
+        if value != "NaN":
+            quantiles[quantile] = max(quantiles.get(quantile, 0.0), float(value))
+    return stages
+
+
+def _scrape_egress(metrics_url: str) -> Dict[str, float]:
+    """Reply pacing: underruns, and medians of client buffer, chunk and round trip (worst worker)."""
+    with urllib.request.urlopen(metrics_url, timeout=5) as response:
+        text = response.read().decode()
+    egress: Dict[str, float] = {}
+    for name, value in re.findall(r'voice_agent_egress_(underruns_total|\w+_seconds\{quantile="0.5")[^ ]* (\S+)', text):
+        if value != "NaN":
+            key = name.split("{")[0]
+            egress[key] = egress.get(key, 0.0) + float(value) if key == "underruns_total" else max(egress.get(key, 0.0), float(value))
+    return egress
+
+
+def _scrape_reconnects(metrics_url: str) -> Dict[str, float]:
+    """Realtime socket reconnections by result, and their median duration (worst worker)."""
+    with urllib.request.urlopen(metrics_url, timeout=5) as response:
+        text = response.read().decode()
+    reconnects: Dict[str, float] = {}
+    for result, value in re.findall(r'voice_agent_realtime_reconnects_total\{result="(\w+)"[^ ]* (\S+)', text):
+        reconnects[result] = reconnects.get(result, 0.0) + float(value)
+    for value in re.findall(r'voice_agent_realtime_reconnect_seconds\{quantile="0.5"[^ ]* (\S+)', text):
+        if value != "NaN":
+            reconnects["median_seconds"] = max(reconnects.get("median_seconds", 0.0), float(value))
+    return reconnects
+
+
+def _start_processes(args: argparse.Namespace):
+    mock_port, app_port = _free_port(), _free_port()
+    output = open(args.log, "w") if args.log else subprocess.DEVNULL
+    mock_env = dict(
+        os.environ,
+        MOCK_REALTIME_DROP_AFTER_S=str(args.realtime_drop_s),
+        MOCK_REALTIME_REFUSE_RATE=str(args.realtime_refuse_rate),
+    )
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_openai", "--port", str(mock_port)],
+        cwd=ROOT,
+        env=mock_env,
+        stdout=output,
+        stderr=output,
+    )
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="mock",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        OPENAI_REALTIME_URI=f"ws://127.0.0.1:{mock_port}/v1/realtime",
+        VOICE_AGENT_RECORDING="1" if args.record else "0",
+        VOICE_AGENT_WEB_WORKERS=str(args.web_workers),
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api:app", "--port", str(app_port), "--log-level", "warning"]
+        + ["--workers", str(args.web_workers)] * (args.web_workers > 1),
+        cwd=ROOT,
+        env=env,
+        stdout=output,
+        stderr=output,
+    )
+    _wait_http(f"http://127.0.0.1:{mock_port}/v1/models", 30)
+    _wait_http(f"http://127.0.0.1:{app_port}/metrics", 30)
+    return mock, app, app_port
+
+
+async def run(args: argparse.Namespace):
+    processes = []
+    if args.app_url:
+        base_url = args.app_url.rstrip("/")
+        stats = None
+    else:
+        mock, app, app_port = _start_processes(args)
+        processes = [mock, app]
+        base_url = f"http://127.0.0.1:{app_port}"
+        stats = ProcessStats(app.pid)
+
+    if args.telephony:
+        # Media streams are always µ-law 8kHz
+        args.codec, args.codec_rate = "mulaw", 8000
+        ws_url = base_url.replace("http", "ws", 1) + "/ws/telephony?"
+    else:
+        ws_url = base_url.replace("http", "ws", 1) + f"/ws/audio?codec={args.codec}&codec_rate={args.codec_rate}&"
+    if args.query:
+        ws_url += args.query
+    try:
+        baseline_rss = stats.rss() if stats else 0
+        cpu_before = stats.cpu_seconds() if stats else 0
+
+        results = [ClientResult() for _ in range(args.clients)]
+        active = {"now": 0, "peak": 0}
+        started = time.perf_counter()
+        clients = asyncio.gather(
+            *(
+                simulated_client(ws_url, args, result, args.ramp_s * i / max(1, args.clients), active)
+                for i, result in enumerate(results)
+            )
+        )
+
+        async def sample_rss():
+            while stats:
+                stats.rss()
+                await asyncio.sleep(0.5)
+
+        sampler = asyncio.create_task(sample_rss())
+        await clients
+        sampler.cancel()
+        elapsed = time.perf_counter() - started
+
+        cpu = stats.cpu_seconds() - cpu_before if stats else math.nan
+        stages = _scrape_stage_quantiles(base_url + "/metrics")
+        egress = _scrape_egress(base_url + "/metrics")
+        reconnects = _scrape_reconnects(base_url + "/metrics")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(10)
+
+    _report(args, results, elapsed, active["peak"], cpu, stats, baseline_rss, stages, egress, reconnects)
+
+
+def _report(
+    args,
+    results: List[ClientResult],
+    elapsed: float,
+    peak_sessions: int,
+    cpu: float,
+    stats,
+    baseline_rss,
+    stages,
+    egress,
+    reconnects,
+):
+    turns = sum(r.turns for r in results)
+    latencies = [latency for r in results for latency in r.first_audio_latencies]
+    errors = [error for r in results for error in r.errors]
+
+    print(f"\nClients: {args.clients}, turns/client: {args.turns}, peak concurrent sessions: {peak_sessions}")
+    print(f"Elapsed: {elapsed:.1f}s, completed turns: {turns}, throughput: {turns / elapsed:.2f} turns/s")
+    print(f"Errors: {len(errors)}" + (f" (first: {errors[0]})" if errors else ""))
+    print(f"Reply audio received: {sum(r.reply_bytes for r in results) / 2 / SAMPLE_RATE:.1f}s")
+    wire_bytes = sum(r.wire_bytes for r in results)
+    print(
+        f"Audio on the wire ({args.codec}@{args.codec_rate}): {wire_bytes / 2**20:.1f}MiB, "
+        f"{wire_bytes / max(1, args.clients) / elapsed / 1000:.1f}KB/s per session both directions"
+    )
+
+    print("\nClient end of speech -> first audio (includes the VAD silence window):")
+    print(
+        "  p50 {:.0f}ms  p95 {:.0f}ms  p99 {:.0f}ms".format(
+            *(_percentile(latencies, q) * 1000 for q in (0.5, 0.95, 0.99))
+        )
+    )
+
+    if stages:
+        print("\nServer stage latency from speech_stopped (from /metrics):")
+        print(f"  {'stage':<26}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for stage, quantiles in stages.items():
+            values = "".join(f"{quantiles.get(q, math.nan) * 1000:>7.0f}ms" for q in ("0.5", "0.95", "0.99"))
+            print(f"  {stage:<26}{values}")
+
+    if egress:
+        print("\nReply pacing (from /metrics):")
+        print(
+            f"  underruns: {egress.get('underruns_total', 0):.0f}, median client buffer "
+            f"{egress.get('buffered_seconds', math.nan) * 1000:.0f}ms, chunk {egress.get('chunk_seconds', math.nan) * 1000:.0f}ms, "
+            f"round trip {egress.get('rtt_seconds', math.nan) * 1000:.1f}ms"
+        )
+
+    if reconnects:
+        print("\nRealtime transcription sockets (from /metrics):")
+        print(
+            f"  reconnected: {reconnects.get('ok', 0):.0f}, failed: {reconnects.get('failed', 0):.0f}, "
+            f"median time to resume {reconnects.get('median_seconds', math.nan) * 1000:.0f}ms"
+        )
+
+    if stats:
+        sessions = max(1, args.clients)
+        print("\nApp process:")
+        print(f"  CPU: {cpu:.2f}s total, {cpu / sessions * 1000:.1f}ms per session, {cpu / elapsed * 100:.0f}% of a core")
+        print(
+            f"  RSS: baseline {baseline_rss / 2**20:.1f}MiB, peak {stats.peak_rss / 2**20:.1f}MiB, "
+            f"{(stats.peak_rss - baseline_rss) / max(1, peak_sessions) / 2**10:.0f}KiB per concurrent session"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3, help="turns per client")
+    parser.add_argument("--ramp-s", type=float, default=5, help="spread client starts over this many seconds")
+    parser.add_argument("--speech-ms", type=float, default=1500, help="length of each simulated utterance")
+    parser.add_argument(
+        "--frame-ms", type=float, default=20, help="client frame size; the browser worklet sends ~5.3ms frames"
+    )
+    parser.add_argument("--reply-idle-ms", type=float, default=1500, help="reply is over after this much quiet")
+    parser.add_argument("--timeout-s", type=float, default=30)
+    parser.add_argument("--app-url", help="test an already running app instead of launching one with the mocks")
+    parser.add_argument("--web-workers", type=int, default=1, help="serving processes of the launched app")
+    parser.add_argument("--query", help='session options, e.g. "engine=local" or "vad=local"')
+    parser.add_argument("--codec", default="pcm", help="client audio codec: pcm, mulaw, alaw or opus")
+    parser.add_argument("--codec-rate", type=int, default=SAMPLE_RATE, help="client audio sample rate")
+    parser.add_argument("--telephony", action="store_true", help="call /ws/telephony as media streams instead")
+    parser.add_argument("--record", action="store_true", help="keep session recordings enabled")
+    parser.add_argument(
+        "--realtime-drop-s", type=float, default=0, help="mock drops realtime sockets about this long after opening"
+    )
+    parser.add_argument("--realtime-refuse-rate", type=float, default=0, help="mock refuses this fraction of them")
+    parser.add_argument("--log", help="write mock and app output to this file")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
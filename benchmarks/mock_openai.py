@@ -0,0 +1,275 @@
+"""
+Local stand-ins for the OpenAI APIs the voice agent uses, for load tests without a key.
+
+- `GET  /v1/models`: connection warmup
+- `POST /v1/chat/completions`: streamed completion of a fixed reply, one word per chunk
+- `POST /v1/audio/speech`: streamed PCM16 24kHz tone, length proportional to the input text
+- `WS   /v1/realtime`: transcription session with an energy VAD over the appended audio, emitting
+  `speech_started`, `speech_stopped` and `...transcription.delta/completed` events
+
+```sh
+python -m benchmarks.mock_openai --port 9000
+OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_REALTIME_URI=ws://127.0.0.1:9000/v1/realtime \
+    OPENAI_API_KEY=mock uvicorn app.api:app
+```
+
+Delays are set with `MOCK_*` environment variables, see `MockSettings`.
+"""
+
+import argparse
+import array
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass, fields
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SAMPLE_RATE = 24000
+
+
+@dataclass
+class MockSettings:
+    # Chat completions
+    llm_first_token_ms: float = 300
+    llm_token_ms: float = 15
+    llm_reply: str = "Sure. Our store opens at nine in the morning, and closes at six in the evening."
+    # Speech
+    tts_first_byte_ms: float = 400
+    tts_ms_per_char: float = 60
+    # Audio is produced this many times faster than real time
+    tts_speedup: float = 4
+    tts_chunk_bytes: int = 4800
+    # A fraction of chat and speech requests stall this much longer before their first byte
+    slow_rate: float = 0
+    slow_ms: float = 2000
+    # Realtime transcription
+    vad_threshold: int = 500
+    vad_silence_ms: float = 500
+    transcribe_ms: float = 600
+    # Gap between transcript deltas, and from the last delta to the completed transcript
+    transcribe_delta_ms: float = 0
+    transcribe_final_ms: float = 0
+    transcript: str = "What are your opening hours?"
+    # Flaky realtime sockets: closed with 1011 about this long after they open (0 never), and a
+    # fraction of new connections refused
+    realtime_drop_after_s: float = 0
+    realtime_refuse_rate: float = 0
+    # Random +/- fraction applied to every delay
+    jitter: float = 0.2
+
+    @classmethod
+    def from_env(cls) -> "MockSettings":
+        settings = cls()
+        for field in fields(cls):
+            value = os.getenv(f"MOCK_{field.name.upper()}")
+            if value is not None:
+                setattr(settings, field.name, field.type(value) if field.type is not str else value)
+        return settings
+
+
+settings = MockSettings.from_env()
+app = FastAPI()
+
+
+def _delay(ms: float) -> float:
+    return max(0.0, ms * (1 + random.uniform(-settings.jitter, settings.jitter))) / 1000
+
+
+def _first_byte_delay(ms: float) -> float:
+    stall = settings.slow_ms if random.random() < settings.slow_rate else 0
+    return _delay(ms + stall)
+
+
+def _tone(num_samples: int, offset: int = 0, frequency: float = 220) -> bytes:
+    samples = array.array(
+        "h", (int(8000 * math.sin(2 * math.pi * frequency * (offset + i) / SAMPLE_RATE)) for i in range(num_samples))
+    )
+    return samples.tobytes()
+
+
+# Two seconds of tone: any chunk up to one second long can be sliced from the first second
+_TONE = _tone(2 * SAMPLE_RATE)
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4.1-mini", "object": "model", "created": 0, "owned_by": "mock"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def stream():
+        await asyncio.sleep(_first_byte_delay(settings.llm_first_token_ms))
+        yield chunk({"role": "assistant", "content": ""})
+        for i, word in enumerate(settings.llm_reply.split(" ")):
+            if i:
+                await asyncio.sleep(_delay(settings.llm_token_ms))
+            yield chunk({"content": word if i == 0 else f" {word}"})
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    body = await request.json()
+    total = int(len(body.get("input", "")) * settings.tts_ms_per_char * SAMPLE_RATE / 1000) * 2
+    chunk_bytes = min(settings.tts_chunk_bytes, 2 * SAMPLE_RATE)
+    chunk_seconds = chunk_bytes / 2 / SAMPLE_RATE / settings.tts_speedup
+
+    async def stream():
+        await asyncio.sleep(_first_byte_delay(settings.tts_first_byte_ms))
+        sent = 0
+        while sent < total:
+            size = min(chunk_bytes, total - sent)
+            start = sent % (2 * SAMPLE_RATE)
+            yield _TONE[start : start + size]
+            sent += size
+            await asyncio.sleep(chunk_seconds)
+
+    return StreamingResponse(stream(), media_type="audio/pcm")
+
+
+class _EnergyVad:
+    """Good enough to find a simulated caller's tone bursts in the appended audio."""
+
+    def __init__(self):
+        self.speaking = False
+        self.silence_ms = 0.0
+
+    def feed(self, pcm: bytes):
+        """Return "started", "stopped" or None."""
+        samples = array.array("h", pcm[: len(pcm) - len(pcm) % 2])
+        if not samples:
+            return None
+        loud = max(abs(min(samples)), max(samples)) >= settings.vad_threshold
+        duration_ms = len(samples) * 1000 / SAMPLE_RATE
+        if loud:
+            self.silence_ms = 0
+            if not self.speaking:
+                self.speaking = True
+                return "started"
+        elif self.speaking:
+            self.silence_ms += duration_ms
+            if self.silence_ms >= settings.vad_silence_ms:
+                self.speaking = False
+                return "stopped"
+        return None
+
+
+@app.websocket("/v1/realtime")
+async def realtime(websocket: WebSocket):
+    if random.random() < settings.realtime_refuse_rate:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    drop_at = time.monotonic() + _delay(settings.realtime_drop_after_s * 1000) if settings.realtime_drop_after_s else math.inf
+    await websocket.send_text(json.dumps({"type": "transcription_session.created", "session": {}}))
+    vad = _EnergyVad()
+    pending = set()
+    server_vad = True
+
+    async def transcribe(item_id: str):
+        await asyncio.sleep(_delay(settings.transcribe_ms))
+        words = settings.transcript.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else f" {word}"
+            if i:
+                await asyncio.sleep(_delay(settings.transcribe_delta_ms))
+            await websocket.send_text(
+                json.dumps({"type": "conversation.item.input_audio_transcription.delta", "item_id": item_id, "delta": delta})
+            )
+        await asyncio.sleep(_delay(settings.transcribe_final_ms))
+        await websocket.send_text(
+            json.dumps(
+                {
+                    "type": "conversation.item.input_audio_transcription.completed",
+                    "item_id": item_id,
+                    "content_index": 0,
+                    "transcript": settings.transcript,
+                }
+            )
+        )
+
+    def commit():
+        item_id = f"item_{uuid.uuid4().hex[:12]}"
+        task = asyncio.create_task(transcribe(item_id))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        return item_id
+
+    try:
+        while True:
+            event = json.loads(await websocket.receive_text())
+            event_type = event.get("type")
+            if time.monotonic() > drop_at:
+                # Pending transcriptions are lost with the socket
+                await websocket.close(code=1011)
+                return
+
+            if event_type == "transcription_session.update":
+                server_vad = (event.get("session") or {}).get("turn_detection", {"type": "server_vad"}) is not None
+                await websocket.send_text(json.dumps({"type": "transcription_session.updated", "session": event["session"]}))
+
+            elif event_type == "input_audio_buffer.append":
+                if not server_vad:
+                    continue
+                transition = vad.feed(base64.b64decode(event["audio"]))
+                if transition == "started":
+                    await websocket.send_text(json.dumps({"type": "input_audio_buffer.speech_started", "audio_start_ms": 0}))
+                elif transition == "stopped":
+                    await websocket.send_text(json.dumps({"type": "input_audio_buffer.speech_stopped", "audio_end_ms": 0}))
+                    item_id = commit()
+                    await websocket.send_text(json.dumps({"type": "input_audio_buffer.committed", "item_id": item_id}))
+
+            elif event_type == "input_audio_buffer.commit":
+                item_id = commit()
+                await websocket.send_text(json.dumps({"type": "input_audio_buffer.committed", "item_id": item_id}))
+
+            elif event_type == "input_audio_buffer.clear":
+                await websocket.send_text(json.dumps({"type": "input_audio_buffer.cleared"}))
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+@app.exception_handler(Exception)
+async def _error(request: Request, exc: Exception):
+    return JSONResponse({"error": {"message": str(exc), "type": "mock_error"}}, status_code=500)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", ws_max_size=16 * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    main()
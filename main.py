@@ -1,6 +1,14 @@
+import os
+
 import uvicorn
-from app.api import app
 
 if __name__ == "__main__":
     # Run directly with `python main.py` instead of using uvicorn CLI
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("VOICE_AGENT_WEB_WORKERS", "1"))
+    if workers > 1:
+        # Workers are separate processes: the app is imported by each of them, by name
+        uvicorn.run("app.api:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        from app.api import app
+
+        uvicorn.run(app, host="0.0.0.0", port=8000)